@@ -1,13 +1,17 @@
 # funciones.py - Funciones auxiliares para gráficos de inclinometría
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import timedelta
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 from matplotlib.ticker import AutoMinorLocator
 import io
 import base64
 
+from utils.indice_temporal import TimelineIndex
+from utils.tubo_array import TuboArray
+from utils.umbrales_compilados import umbrales_campana
+
 
 def calcular_fechas_seleccionadas(data, fecha_inicial, fecha_final, total_camp, ultimas_camp, cadencia_dias):
     """
@@ -27,39 +31,23 @@ def calcular_fechas_seleccionadas(data, fecha_inicial, fecha_final, total_camp,
     if not data:
         return []
 
-    # Obtener todas las fechas disponibles (excluyendo claves especiales)
-    # NOTA: Excluimos claves que pueden venir del data_source pero no son fechas ISO
-    claves_especiales = {"info", "umbrales", "fecha_seleccionada", "ultimas_camp", 
-                         "fecha_inicial", "fecha_final", "total_camp", "cadencia_dias",
-                         "eje", "orden", "color_scheme", "escala_desplazamiento", 
-                         "escala_incremento", "sensor", "nombre_sensor", "leyenda_umbrales",
-                         "valor_positivo_desplazamiento", "valor_negativo_desplazamiento",
-                         "valor_positivo_incremento", "valor_negativo_incremento",
-                         "escala_temporal", "valor_positivo_temporal", "valor_negativo_temporal"}
-    fechas = [fecha for fecha in data.keys() if fecha not in claves_especiales]
-
-    if not fechas:
-        return []
-
-    try:
-        # Convertir fechas a objetos datetime y ordenar
-        fechas_dt = sorted([datetime.fromisoformat(fecha) for fecha in fechas])
-    except ValueError as e:
-        print(f"Error al convertir fechas: {e}")
+    # Fechas ordenadas del índice temporal del tubo (ignora las claves que no son fechas ISO)
+    indice = TimelineIndex.de_tubo(data)
+    if not len(indice):
         return []
 
     # Si se proporcionaron fechas de inicio y fin, filtrar por rango
     if fecha_inicial and fecha_final:
         try:
-            fecha_inicio_dt = datetime.fromisoformat(fecha_inicial)
-            fecha_fin_dt = datetime.fromisoformat(fecha_final)
-            fechas_dt = [fecha for fecha in fechas_dt if fecha_inicio_dt <= fecha <= fecha_fin_dt]
+            fechas = indice.entre(fecha_inicial, fecha_final)
         except ValueError as e:
             print(f"Error al procesar rango de fechas: {e}")
             return []
+    else:
+        fechas = list(indice.fechas)
 
-    # Convertir de nuevo a formato ISO y ordenar de más reciente a más antigua
-    fechas = [fecha.isoformat() for fecha in reversed(fechas_dt)]
+    # Ordenar de más reciente a más antigua
+    fechas.reverse()
 
     # Seleccionar fechas basadas en parámetros
     fechas_seleccionadas = []
@@ -71,10 +59,10 @@ def calcular_fechas_seleccionadas(data, fecha_inicial, fecha_final, total_camp,
     # Añadir campañas adicionales basadas en cadencia
     if cadencia_dias > 0 and len(fechas_seleccionadas) < total_camp and len(fechas) > ultimas_camp:
         try:
-            ultima_fecha = datetime.fromisoformat(fechas_seleccionadas[-1])
+            ultima_fecha = indice.fecha_dt(fechas_seleccionadas[-1])
 
             for fecha in fechas[ultimas_camp:]:
-                fecha_actual = datetime.fromisoformat(fecha)
+                fecha_actual = indice.fecha_dt(fecha)
                 diferencia_dias = (ultima_fecha - fecha_actual).days
 
                 if diferencia_dias >= cadencia_dias:
@@ -251,17 +239,21 @@ def extraer_datos_fecha(fecha, data, eje):
     if not fecha or not data or fecha not in data or "calc" not in data[fecha]:
         return None
 
-    calc_data = data[fecha]["calc"]
+    tubo_array = TuboArray.de_tubo(data)
 
-    if not calc_data or not isinstance(calc_data, list):
+    if not tubo_array.tiene_bloque(fecha, "calc"):
         return None
 
     try:
+        # Perfiles de la campaña: vistas del array columnar del tubo (sin copiar)
+        perfil = lambda variable: tubo_array.perfil(fecha, variable, defecto=0)
+
         # Si el eje es "depth", construimos la lista según la lógica especificada
         # esto es debido a que puede haber recrecimientos del tubo, "depth" sólo vale dentro de las campañas de la misma ref
         if eje == "depth":
-            # Extraer todos los valores de cota_abs
-            cota_abs = [punto["cota_abs"] for punto in calc_data if "cota_abs" in punto]
+            # Valores de cota_abs
+            cota_abs = tubo_array.perfil(fecha, "cota_abs")
+            cota_abs = cota_abs[~np.isnan(cota_abs)]
 
             if len(cota_abs) < 2:
                 # Si no hay suficientes puntos, usar paso por defecto
@@ -272,34 +264,29 @@ def extraer_datos_fecha(fecha, data, eje):
                 if paso == 0:  # Evitar división por cero
                     paso = 1.0
 
-            # Construir la lista eje_Y como profundidades
-            eje_Y = [paso * i for i in range(len(cota_abs))]
+            # Construir eje_Y como profundidades
+            eje_Y = paso * np.arange(len(cota_abs))
         else:
             # Si no es "depth", extraer directamente los valores del eje especificado
-            eje_Y = [punto[eje] for punto in calc_data if eje in punto]
+            eje_Y = tubo_array.perfil(fecha, eje)
+            eje_Y = eje_Y[~np.isnan(eje_Y)]
 
         # Crear y devolver diccionario con todos los datos extraídos
-        desp_a = [punto.get("desp_a", 0) for punto in calc_data]
-        desp_b = [punto.get("desp_b", 0) for punto in calc_data]
-        desp_total = [((a ** 2 + b ** 2) ** 0.5) for a, b in zip(desp_a, desp_b)]
-        incr_dev_abs_a = [punto.get("incr_dev_abs_a", 0) for punto in calc_data]
-        incr_dev_abs_b = [punto.get("incr_dev_abs_b", 0) for punto in calc_data]
-        checksum_a = [punto.get("checksum_a", 0) for punto in calc_data]
-        checksum_b = [punto.get("checksum_b", 0) for punto in calc_data]
-        incr_checksum_a = [punto.get("incr_checksum_a", 0) for punto in calc_data]
-        incr_checksum_b = [punto.get("incr_checksum_b", 0) for punto in calc_data]
+        desp_a = perfil("desp_a")
+        desp_b = perfil("desp_b")
+        desp_total = np.sqrt(desp_a ** 2 + desp_b ** 2)
 
         return {
             'eje_Y': eje_Y,
             'desp_a': desp_a,
             'desp_b': desp_b,
             'desp_total': desp_total,
-            'incr_dev_abs_a': incr_dev_abs_a,
-            'incr_dev_abs_b': incr_dev_abs_b,
-            'checksum_a': checksum_a,
-            'checksum_b': checksum_b,
-            'incr_checksum_a': incr_checksum_a,
-            'incr_checksum_b': incr_checksum_b
+            'incr_dev_abs_a': perfil("incr_dev_abs_a"),
+            'incr_dev_abs_b': perfil("incr_dev_abs_b"),
+            'checksum_a': perfil("checksum_a"),
+            'checksum_b': perfil("checksum_b"),
+            'incr_checksum_a': perfil("incr_checksum_a"),
+            'incr_checksum_b': perfil("incr_checksum_b")
         }
     except (KeyError, TypeError, ValueError) as e:
         print(f"Error al extraer datos de fecha {fecha}: {e}")
@@ -420,16 +407,15 @@ def agregar_umbrales(ax, data, leyenda_umbrales, eje, sensor, fecha_slider, incl
 
             # Definir eje_X y eje_Y aquí, antes de usarlos
             if eje == "depth" or eje == "index":
-                # Interpolar para index o depth
                 cota_tubo = [punto["cota_abs"] for punto in data[fecha_slider]['calc'] if "cota_abs" in punto]
                 if not cota_tubo:
                     continue
 
-                cota_umbral = df['cota_abs'].to_list()
-                def_umbral = df[deformada].to_list()
-                eje_X = interpolar_def_tubo(cota_tubo, cota_umbral, def_umbral)
-                if not eje_X:
+                # umbral en los puntos de la campaña, remuestreado una sola vez por tubo y umbrales
+                eje_X = umbrales_campana(data, fecha_slider).get(deformada)
+                if eje_X is None or not eje_X.size:
                     continue
+                eje_X = eje_X.tolist()
             else:
                 # Caso de "cota_abs"
                 eje_X = df[deformada].to_list()
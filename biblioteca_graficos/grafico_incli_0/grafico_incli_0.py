@@ -11,6 +11,8 @@ from matplotlib.ticker import AutoMinorLocator
 import io
 import base64
 
+from utils.render_vectorial import figura_a_drawing
+
 # Importar funciones desde el archivo funciones.py
 from funciones import (
     calcular_fechas_seleccionadas,
@@ -55,6 +57,7 @@ def grafico_incli_0(data, parametros):
 
     Returns:
         str: Imagen del gráfico en formato PNG codificada en base64 (data URL).
+        bytes: La imagen sin codificar si parametros['salida'] == 'bytes' (generación del PDF).
     """
     try:
         # PASO 1: Extraer parámetros con valores por defecto si no están presentes
@@ -201,6 +204,12 @@ def grafico_incli_0(data, parametros):
         # PASO 15: Guardar como imagen en el formato especificado SIN gap
         buffer = io.BytesIO()
 
+        # PDF vectorial: la figura como Drawing de ReportLab, sin rasterizar ni pasar por SVG
+        if formato.lower() == 'vectorial':
+            drawing = figura_a_drawing(fig, bbox_inches='tight', pad_inches=0)
+            plt.close(fig)
+            return drawing
+
         # Usar el formato especificado sin padding para eliminar gaps
         if formato.lower() == 'svg':
             plt.savefig(buffer, format='svg', bbox_inches='tight', pad_inches=0)
@@ -209,6 +218,11 @@ def grafico_incli_0(data, parametros):
 
         buffer.seek(0)
 
+        # El PDF pide la imagen sin codificar en base64
+        if parametros.get('salida') == 'bytes':
+            plt.close(fig)
+            return buffer.getvalue()
+
         # PASO 16: Codificar en base64 para enviar a través de HTTP
         imagen_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
         plt.close(fig)
@@ -10,6 +10,8 @@ from scipy import stats
 import io
 import base64
 
+from utils.indice_temporal import TimelineIndex
+
 
 def calcular_fechas_seleccionadas(data, fecha_inicial, fecha_final, total_camp=None, ultimas_camp=None,
                                   cadencia_dias=None):
@@ -33,16 +35,9 @@ def calcular_fechas_seleccionadas(data, fecha_inicial, fecha_final, total_camp=N
         print("DEBUG: calcular_fechas_seleccionadas - No hay datos disponibles")
         return []
 
-    # Obtener todas las fechas disponibles (excluyendo claves especiales)
-    # NOTA: Excluimos claves que pueden venir del data_source pero no son fechas ISO
-    claves_especiales = {"info", "umbrales", "fecha_seleccionada", "ultimas_camp", 
-                         "fecha_inicial", "fecha_final", "total_camp", "cadencia_dias",
-                         "eje", "orden", "color_scheme", "escala_desplazamiento", 
-                         "escala_incremento", "sensor", "nombre_sensor", "leyenda_umbrales",
-                         "valor_positivo_desplazamiento", "valor_negativo_desplazamiento",
-                         "valor_positivo_incremento", "valor_negativo_incremento",
-                         "escala_temporal", "valor_positivo_temporal", "valor_negativo_temporal"}
-    fechas_disponibles = [fecha for fecha in data.keys() if fecha not in claves_especiales]
+    # Fechas ordenadas del índice temporal del tubo (ignora las claves que no son fechas ISO)
+    indice = TimelineIndex.de_tubo(data)
+    fechas_disponibles = indice.fechas
 
     if not fechas_disponibles:
         print("DEBUG: calcular_fechas_seleccionadas - No se encontraron fechas en los datos")
@@ -51,110 +46,41 @@ def calcular_fechas_seleccionadas(data, fecha_inicial, fecha_final, total_camp=N
     print(f"DEBUG: calcular_fechas_seleccionadas - {len(fechas_disponibles)} fechas disponibles en total")
 
     try:
-        # Intentar filtrar fechas activas primero, pero con fallback tolerante
-        fechas_activas = []
-        fechas_con_campaign_info = 0
-        fechas_con_calc = 0
-
-        for fecha in fechas_disponibles:
-            try:
-                # Verificar que la fecha tenga la estructura esperada
-                if fecha in data and isinstance(data[fecha], dict):
-
-                    # Contar fechas con datos de cálculo (requisito mínimo)
-                    if 'calc' in data[fecha]:
-                        fechas_con_calc += 1
-
-                    # Verificar si existe campaign_info
-                    if 'campaign_info' in data[fecha] and isinstance(data[fecha]['campaign_info'], dict):
-                        fechas_con_campaign_info += 1
-                        # Verificar si está activa
-                        if data[fecha]['campaign_info'].get('active', False) == True:
-                            fechas_activas.append(fecha)
-                    else:
-                        # Si no hay campaign_info pero hay calc, incluir como válida (FALLBACK)
-                        if 'calc' in data[fecha]:
-                            fechas_activas.append(fecha)
-
-            except Exception as e:
-                print(f"DEBUG: Error procesando fecha {fecha}: {e}")
-                continue
+        # Fechas activas. Si no hay campaign_info pero hay calc, se incluye como válida (FALLBACK)
+        fechas_activas = [
+            fecha for fecha, con_info, activa in zip(indice.fechas, indice.con_info, indice.activa)
+            if activa or (not con_info and 'calc' in data[fecha])
+        ]
 
-        print(f"DEBUG: calcular_fechas_seleccionadas - {fechas_con_calc} fechas con 'calc'")
-        print(f"DEBUG: calcular_fechas_seleccionadas - {fechas_con_campaign_info} fechas con 'campaign_info'")
         print(f"DEBUG: calcular_fechas_seleccionadas - {len(fechas_activas)} fechas consideradas válidas")
 
         # Si no hay fechas válidas, usar todas las que tengan 'calc' como último fallback
         if not fechas_activas:
             print(
                 "DEBUG: calcular_fechas_seleccionadas - No hay fechas válidas, usando fallback con fechas que tengan 'calc'")
-            fechas_activas = [f for f in fechas_disponibles if
-                              f in data and isinstance(data[f], dict) and 'calc' in data[f]]
+            fechas_activas = [f for f in fechas_disponibles if 'calc' in data[f]]
 
         if not fechas_activas:
             print("DEBUG: calcular_fechas_seleccionadas - CRÍTICO: No hay fechas con datos de cálculo")
             return []
 
-        # Convertir fechas a objetos datetime
-        fechas_dt_validas = []
-        for fecha in fechas_activas:
-            try:
-                # Manejar diferentes formatos de fecha
-                if fecha.endswith('Z'):
-                    fecha_dt = datetime.fromisoformat(fecha.replace('Z', '+00:00'))
-                elif 'T' in fecha:
-                    fecha_dt = datetime.fromisoformat(fecha)
-                else:
-                    fecha_dt = datetime.strptime(fecha, '%Y-%m-%d')
-
-                fechas_dt_validas.append((fecha_dt, fecha))
-            except ValueError:
-                try:
-                    # Intentar otros formatos comunes
-                    if len(fecha) == 10:  # YYYY-MM-DD
-                        fecha_dt = datetime.strptime(fecha, '%Y-%m-%d')
-                    else:  # Formato ISO con tiempo
-                        fecha_dt = datetime.fromisoformat(fecha.split('+')[0])  # Quitar timezone si existe
-                    fechas_dt_validas.append((fecha_dt, fecha))
-                except ValueError:
-                    print(f"Warning: No se pudo convertir la fecha {fecha}")
-                    continue
-
-        if not fechas_dt_validas:
-            print("ERROR: calcular_fechas_seleccionadas - No se pudieron convertir ninguna fecha")
-            return []
-
-        print(f"DEBUG: calcular_fechas_seleccionadas - {len(fechas_dt_validas)} fechas convertidas correctamente")
+        fechas_dt_validas = [(indice.fecha_dt(fecha), fecha) for fecha in fechas_activas]
 
         # Filtrar por rango de fechas si se especificaron
         fechas_filtradas = fechas_dt_validas
 
         if fecha_inicial and fecha_final:
             try:
-                # Manejar diferentes formatos de fecha para los parámetros
-                if fecha_inicial.endswith('Z'):
-                    fecha_inicio_dt = datetime.fromisoformat(fecha_inicial.replace('Z', '+00:00'))
-                elif 'T' in fecha_inicial:
-                    fecha_inicio_dt = datetime.fromisoformat(fecha_inicial)
-                else:
-                    fecha_inicio_dt = datetime.strptime(fecha_inicial, '%Y-%m-%d')
-
-                if fecha_final.endswith('Z'):
-                    fecha_fin_dt = datetime.fromisoformat(fecha_final.replace('Z', '+00:00'))
-                elif 'T' in fecha_final:
-                    fecha_fin_dt = datetime.fromisoformat(fecha_final)
-                else:
-                    fecha_fin_dt = datetime.strptime(fecha_final, '%Y-%m-%d')
-
+                en_rango = set(indice.entre(fecha_inicial, fecha_final))
                 fechas_filtradas = [
                     (fecha_dt, fecha_str) for fecha_dt, fecha_str in fechas_dt_validas
-                    if fecha_inicio_dt <= fecha_dt <= fecha_fin_dt
+                    if fecha_str in en_rango
                 ]
 
                 print(
                     f"DEBUG: calcular_fechas_seleccionadas - {len(fechas_filtradas)} fechas en el rango {fecha_inicial} - {fecha_final}")
 
-            except ValueError as e:
+            except (ValueError, TypeError) as e:
                 print(f"Warning: Error al procesar rango de fechas: {e}")
                 print("DEBUG: calcular_fechas_seleccionadas - Usando todas las fechas válidas sin filtro de rango")
                 fechas_filtradas = fechas_dt_validas
@@ -185,8 +111,7 @@ def calcular_fechas_seleccionadas(data, fecha_inicial, fecha_final, total_camp=N
 
         # Fallback extremo: devolver las fechas que tengan 'calc'
         print("DEBUG: calcular_fechas_seleccionadas - Usando fallback extremo")
-        fechas_con_calc = [f for f in fechas_disponibles if
-                           f in data and isinstance(data[f], dict) and 'calc' in data[f]]
+        fechas_con_calc = [f for f in fechas_disponibles if 'calc' in data[f]]
         return fechas_con_calc[:10] if len(fechas_con_calc) > 10 else fechas_con_calc
 
 
@@ -16,6 +16,8 @@ import sys
 import os
 import importlib.util
 
+from utils.render_vectorial import figura_a_drawing
+
 
 # Función para cargar el módulo funciones local de forma más robusta
 def load_local_funciones():
@@ -236,6 +238,7 @@ def grafico_incli_evo_std_chk(data, parametros):
 
     Returns:
         str: Imagen del gráfico en formato PNG/SVG codificada en base64.
+        bytes: La imagen sin codificar si parametros['salida'] == 'bytes' (generación del PDF).
     """
     try:
         print("DEBUG: Iniciando generación del gráfico de estadísticos del checksum")
@@ -494,11 +497,22 @@ def grafico_incli_evo_std_chk(data, parametros):
         buffer = io.BytesIO()
         formato = parametros.get('formato', 'png').lower()
 
+        # PDF vectorial: la figura como Drawing de ReportLab, sin rasterizar ni pasar por SVG
+        if formato == 'vectorial':
+            drawing = figura_a_drawing(fig, bbox_inches=None, pad_inches=0, facecolor='white')
+            plt.close(fig)
+            return drawing
+
         if formato == 'svg':
             plt.savefig(buffer, format='svg', bbox_inches=None, pad_inches=0, facecolor='white')
         else:
             plt.savefig(buffer, format='png', dpi=dpi, bbox_inches=None, pad_inches=0, facecolor='white')
 
+        # El PDF pide la imagen sin codificar en base64
+        if parametros.get('salida') == 'bytes':
+            plt.close(fig)
+            return buffer.getvalue()
+
         buffer.seek(0)
         imagen_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
         plt.close(fig)
@@ -9,6 +9,9 @@ from matplotlib.ticker import AutoMinorLocator
 import io
 import base64
 
+from utils.indice_temporal import TimelineIndex
+from utils.cubo_temporal import CuboTemporal
+
 
 def calcular_fechas_seleccionadas(data, fecha_inicial, fecha_final, total_camp, ultimas_camp, cadencia_dias):
     """
@@ -28,39 +31,22 @@ def calcular_fechas_seleccionadas(data, fecha_inicial, fecha_final, total_camp,
     if not data:
         return []
 
-    # Obtener todas las fechas disponibles (excluyendo claves especiales)
-    # NOTA: Excluimos claves que pueden venir del data_source pero no son fechas ISO
-    claves_especiales = {"info", "umbrales", "fecha_seleccionada", "ultimas_camp", 
-                         "fecha_inicial", "fecha_final", "total_camp", "cadencia_dias",
-                         "eje", "orden", "color_scheme", "escala_desplazamiento", 
-                         "escala_incremento", "sensor", "nombre_sensor", "leyenda_umbrales",
-                         "valor_positivo_desplazamiento", "valor_negativo_desplazamiento",
-                         "valor_positivo_incremento", "valor_negativo_incremento",
-                         "escala_temporal", "valor_positivo_temporal", "valor_negativo_temporal"}
-    fechas = [fecha for fecha in data.keys() if fecha not in claves_especiales]
-
-    if not fechas:
-        return []
-
-    try:
-        # Convertir fechas a objetos datetime y ordenar
-        fechas_dt = sorted([datetime.fromisoformat(fecha) for fecha in fechas])
-    except ValueError as e:
-        print(f"Error al convertir fechas: {e}")
+    # Fechas ordenadas del índice temporal del tubo (ignora las claves que no son fechas ISO)
+    indice = TimelineIndex.de_tubo(data)
+    if not len(indice):
         return []
 
     # Si se proporcionaron fechas de inicio y fin, filtrar por rango
     if fecha_inicial and fecha_final:
         try:
-            fecha_inicio_dt = datetime.fromisoformat(fecha_inicial)
-            fecha_fin_dt = datetime.fromisoformat(fecha_final)
-            fechas_dt = [fecha for fecha in fechas_dt if fecha_inicio_dt <= fecha <= fecha_fin_dt]
+            fechas = indice.entre(fecha_inicial, fecha_final)
         except ValueError as e:
             print(f"Error al procesar rango de fechas: {e}")
             return []
+    else:
+        fechas = list(indice.fechas)
 
-    # Convertir de nuevo a formato ISO y ordenar cronológicamente (más antigua a más reciente)
-    fechas = [fecha.isoformat() for fecha in fechas_dt]
+    # Se mantienen en orden cronológico (más antigua a más reciente)
 
     # Seleccionar fechas basadas en parámetros
     fechas_seleccionadas = []
@@ -72,10 +58,10 @@ def calcular_fechas_seleccionadas(data, fecha_inicial, fecha_final, total_camp,
     # Añadir campañas adicionales basadas en cadencia
     if cadencia_dias > 0 and len(fechas_seleccionadas) < total_camp and len(fechas) > ultimas_camp:
         try:
-            ultima_fecha = datetime.fromisoformat(fechas_seleccionadas[-1])
+            ultima_fecha = indice.fecha_dt(fechas_seleccionadas[-1])
 
             for fecha in fechas[ultimas_camp:]:
-                fecha_actual = datetime.fromisoformat(fecha)
+                fecha_actual = indice.fecha_dt(fecha)
                 diferencia_dias = (ultima_fecha - fecha_actual).days
 
                 if diferencia_dias >= cadencia_dias:
@@ -443,36 +429,14 @@ def extraer_datos_temporales_profundidades(data, fechas_seleccionadas, profundid
         return {}
 
     try:
-        datos_temporales = {}
-
-        # Inicializar listas para cada profundidad
-        for profundidad in profundidades:
-            datos_temporales[profundidad] = []
-
         # Procesar cada fecha en orden cronológico
         fechas_ordenadas = sorted(fechas_seleccionadas, key=lambda x: datetime.fromisoformat(x))
 
-        for fecha in fechas_ordenadas:
-            if fecha not in data or "calc" not in data[fecha]:
-                # Si no hay datos para esta fecha, añadir None para todas las profundidades
-                for profundidad in profundidades:
-                    datos_temporales[profundidad].append(None)
-                continue
-
-            calc_data = data[fecha]["calc"]
-
-            # Para cada profundidad, buscar el valor correspondiente
-            for profundidad in profundidades:
-                valor_encontrado = None
-
-                for punto in calc_data:
-                    if eje in punto and punto[eje] == profundidad:
-                        # Encontramos la profundidad, extraer el dato solicitado
-                        if tipo_dato in punto:
-                            valor_encontrado = punto[tipo_dato]
-                        break
-
-                datos_temporales[profundidad].append(valor_encontrado)
+        # Series del cubo temporal del tubo (None si la fecha no tiene datos o no tiene esa profundidad)
+        series = CuboTemporal.de_tubo(data, eje).series([tipo_dato], profundidades, fechas_ordenadas)[:, :, 0]
+        datos_temporales = {}
+        for k, profundidad in enumerate(profundidades):
+            datos_temporales[profundidad] = [None if np.isnan(valor) else valor for valor in series[:, k].tolist()]
 
         # Verificar que todas las series tienen la misma longitud
         longitud_esperada = len(fechas_ordenadas)
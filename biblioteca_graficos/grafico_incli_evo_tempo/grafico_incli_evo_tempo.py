@@ -15,6 +15,8 @@ import sys
 import os
 import importlib.util
 
+from utils.render_vectorial import figura_a_drawing
+
 
 # Función para cargar el módulo funciones local de forma más robusta
 def load_local_funciones():
@@ -205,6 +207,7 @@ def grafico_incli_evo_tempo(data, parametros):
 
     Returns:
         str: Imagen del gráfico en formato PNG codificada en base64 (data URL).
+        bytes: La imagen sin codificar si parametros['salida'] == 'bytes' (generación del PDF).
     """
     try:
         print("DEBUG: Iniciando generación del gráfico temporal")
@@ -374,6 +377,12 @@ def grafico_incli_evo_tempo(data, parametros):
         # PASO 12: Guardar como imagen en el formato especificado
         buffer = io.BytesIO()
 
+        # PDF vectorial: la figura como Drawing de ReportLab, sin rasterizar ni pasar por SVG
+        if formato.lower() == 'vectorial':
+            drawing = figura_a_drawing(fig, bbox_inches=None, pad_inches=0, facecolor='white')
+            plt.close(fig)
+            return drawing
+
         # Usar el formato especificado con configuración precisa
         if formato.lower() == 'svg':
             plt.savefig(buffer, format='svg',
@@ -388,6 +397,11 @@ def grafico_incli_evo_tempo(data, parametros):
 
         buffer.seek(0)
 
+        # El PDF pide la imagen sin codificar en base64
+        if parametros.get('salida') == 'bytes':
+            plt.close(fig)
+            return buffer.getvalue()
+
         # PASO 13: Codificar en base64 para enviar a través de HTTP
         imagen_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
         plt.close(fig)
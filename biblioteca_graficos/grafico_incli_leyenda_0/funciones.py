@@ -4,9 +4,12 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 from matplotlib.ticker import AutoMinorLocator
-from datetime import datetime, timedelta
+from datetime import timedelta
 import re
 
+from utils.indice_temporal import TimelineIndex
+from utils.umbrales_compilados import umbrales_campana
+
 
 def calcular_fechas_seleccionadas(data, fecha_inicial, fecha_final, total_camp, ultimas_camp, cadencia_dias):
     """
@@ -23,28 +26,17 @@ def calcular_fechas_seleccionadas(data, fecha_inicial, fecha_final, total_camp,
     Returns:
         list: Lista de fechas seleccionadas.
     """
-    # Obtener todas las fechas disponibles (excluyendo claves especiales)
-    # NOTA: Excluimos claves que pueden venir del data_source pero no son fechas ISO
-    claves_especiales = {"info", "umbrales", "fecha_seleccionada", "ultimas_camp", 
-                         "fecha_inicial", "fecha_final", "total_camp", "cadencia_dias",
-                         "eje", "orden", "color_scheme", "escala_desplazamiento", 
-                         "escala_incremento", "sensor", "nombre_sensor", "leyenda_umbrales",
-                         "valor_positivo_desplazamiento", "valor_negativo_desplazamiento",
-                         "valor_positivo_incremento", "valor_negativo_incremento",
-                         "escala_temporal", "valor_positivo_temporal", "valor_negativo_temporal"}
-    fechas = [fecha for fecha in data.keys() if fecha not in claves_especiales]
-
-    # Convertir fechas a objetos datetime y ordenar
-    fechas_dt = sorted([datetime.fromisoformat(fecha) for fecha in fechas])
+    # Fechas ordenadas del índice temporal del tubo (ignora las claves que no son fechas ISO)
+    indice = TimelineIndex.de_tubo(data)
 
     # Si se proporcionaron fechas de inicio y fin, filtrar por rango
     if fecha_inicial and fecha_final:
-        fecha_inicio_dt = datetime.fromisoformat(fecha_inicial)
-        fecha_fin_dt = datetime.fromisoformat(fecha_final)
-        fechas_dt = [fecha for fecha in fechas_dt if fecha_inicio_dt <= fecha <= fecha_fin_dt]
+        fechas = indice.entre(fecha_inicial, fecha_final)
+    else:
+        fechas = list(indice.fechas)
 
-    # Convertir de nuevo a formato ISO y ordenar de más reciente a más antigua
-    fechas = [fecha.isoformat() for fecha in reversed(fechas_dt)]
+    # Ordenar de más reciente a más antigua
+    fechas.reverse()
 
     # Seleccionar fechas basadas en parámetros
     fechas_seleccionadas = []
@@ -55,10 +47,10 @@ def calcular_fechas_seleccionadas(data, fecha_inicial, fecha_final, total_camp,
 
     # Añadir campañas adicionales basadas en cadencia
     if cadencia_dias > 0 and len(fechas_seleccionadas) < total_camp and len(fechas) > ultimas_camp:
-        ultima_fecha = datetime.fromisoformat(fechas_seleccionadas[-1])
+        ultima_fecha = indice.fecha_dt(fechas_seleccionadas[-1])
 
         for fecha in fechas[ultimas_camp:]:
-            fecha_actual = datetime.fromisoformat(fecha)
+            fecha_actual = indice.fecha_dt(fecha)
             diferencia_dias = (ultima_fecha - fecha_actual).days
 
             if diferencia_dias >= cadencia_dias:
@@ -350,6 +342,8 @@ def agregar_umbrales(ax, data, leyenda_umbrales, eje, sensor, fecha_slider):
 
     # Procesar y añadir cada umbral
     if deformada_filtro and fecha_slider in data and "calc" in data[fecha_slider]:
+        # umbrales en los puntos de la campaña, remuestreados una sola vez por tubo y umbrales
+        umbrales_slider = umbrales_campana(data, fecha_slider) if eje in ("depth", "index") else {}
         for deformada in deformada_filtro:
             # Obtener el color desde la leyenda
             color_espanol = leyenda_umbrales.get(deformada, "gray")
@@ -363,9 +357,11 @@ def agregar_umbrales(ax, data, leyenda_umbrales, eje, sensor, fecha_slider):
 
             # Procesamiento según el tipo de eje
             if eje == "depth" or eje == "index":
-                # Interpolar valores para el caso de index o depth
+                # Umbral en los puntos de la campaña para el caso de index o depth
                 cota_tubo = [punto["cota_abs"] for punto in data[fecha_slider]['calc']]
-                eje_X = interpolar_def_tubo(cota_tubo, cota_umbral, def_umbral)
+                if deformada not in umbrales_slider:
+                    continue
+                eje_X = umbrales_slider[deformada].tolist()
 
                 # Seleccionar eje Y según el tipo de eje
                 if eje == "depth":
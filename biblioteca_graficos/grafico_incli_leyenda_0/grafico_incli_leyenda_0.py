@@ -4,6 +4,8 @@ import matplotlib.patches as mpatches
 import io
 import base64
 
+from utils.render_vectorial import figura_a_drawing
+
 # Importar función necesaria
 from funciones import obtener_leyenda_umbrales
 
@@ -24,6 +26,7 @@ def grafico_incli_leyenda_0(data, parametros):
 
     Returns:
         str: Data URL de la imagen generada
+        bytes: La imagen sin codificar si parametros['salida'] == 'bytes' (generación del PDF).
     """
 
     # EXTRAER PARÁMETROS
@@ -104,6 +107,10 @@ def grafico_incli_leyenda_0(data, parametros):
             'facecolor': 'none', 'edgecolor': 'none'
         }
 
+        # PDF vectorial: la figura como Drawing de ReportLab, sin rasterizar ni pasar por SVG
+        if formato == 'vectorial':
+            return figura_a_drawing(fig, **save_params)
+
         if formato == 'svg':
             plt.savefig(buffer, format='svg', **save_params)
             mime_type = 'image/svg+xml'
@@ -111,6 +118,10 @@ def grafico_incli_leyenda_0(data, parametros):
             plt.savefig(buffer, format='png', dpi=dpi, **save_params)
             mime_type = 'image/png'
 
+        # El PDF pide la imagen sin codificar en base64
+        if parametros.get('salida') == 'bytes':
+            return buffer.getvalue()
+
         buffer.seek(0)
         imagen_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
 
@@ -4,6 +4,8 @@ import matplotlib.patches as mpatches
 import io
 import base64
 
+from utils.render_vectorial import figura_a_drawing
+
 import matplotlib.font_manager as fm
 fuentes_disponibles = [f.name for f in fm.fontManager.ttflist]
 print("Aptos disponible:", "Arial" in fuentes_disponibles)
@@ -38,6 +40,7 @@ def grafico_incli_series_0(data, parametros):
 
     Returns:
         str: Data URL de la imagen generada
+        bytes: La imagen sin codificar si parametros['salida'] == 'bytes' (generación del PDF).
     """
 
     # Configurar fuente global para toda la figura
@@ -136,6 +139,10 @@ def grafico_incli_series_0(data, parametros):
             'facecolor': 'none', 'edgecolor': 'none'
         }
 
+        # PDF vectorial: la figura como Drawing de ReportLab, sin rasterizar ni pasar por SVG
+        if formato == 'vectorial':
+            return figura_a_drawing(fig, **save_params)
+
         if formato == 'svg':
             plt.savefig(buffer, format='svg', **save_params)
             mime_type = 'image/svg+xml'
@@ -143,6 +150,10 @@ def grafico_incli_series_0(data, parametros):
             plt.savefig(buffer, format='png', dpi=dpi, **save_params)
             mime_type = 'image/png'
 
+        # El PDF pide la imagen sin codificar en base64
+        if parametros.get('salida') == 'bytes':
+            return buffer.getvalue()
+
         buffer.seek(0)
         imagen_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
 
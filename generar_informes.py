@@ -0,0 +1,78 @@
+# generar_informes.py
+
+# Generación de informes PDF en lote, sin la aplicación: una plantilla para muchos tubos.
+# python generar_informes.py Incli_L9_BCN "*.json" -o informes -j 4
+# python generar_informes.py biblioteca_plantillas/Incli_L9_BCN/Incli_L9_BCN.json data/tubo1.json data/tubo2.json
+# python generar_informes.py Incli_L9_BCN "*.json" --valor ultimas_camp=10 --valor color_scheme=multicromo
+
+
+import argparse
+import json
+import sys
+import time
+
+from utils.informes import cargar_plantilla, expandir_rutas_tubos, generar_informes_lote
+
+
+def _valor_actual(texto):
+    """clave=valor de --valor; el valor se interpreta como JSON si se puede (números, true/false...)."""
+    clave, separador, valor = texto.partition("=")
+    if not separador or not clave:
+        raise argparse.ArgumentTypeError(f"'{texto}' no tiene la forma clave=valor")
+    try:
+        return clave, json.loads(valor)
+    except json.JSONDecodeError:
+        return clave, valor
+
+
+def _mostrar_resultado(resultado):
+    if resultado["error"]:
+        print(f"ERROR {resultado['segundos']:7.2f} s  {resultado['tubo']}: {resultado['error']}", flush=True)
+    elif resultado["avisos"]:
+        print(f"AVISO {resultado['segundos']:7.2f} s  {resultado['tubo']} -> {resultado['pdf']} "
+              f"({len(resultado['avisos'])} elementos con error)", flush=True)
+        for aviso in resultado["avisos"]:
+            print(f"        {aviso}", flush=True)
+    else:
+        print(f"OK    {resultado['segundos']:7.2f} s  {resultado['tubo']} -> {resultado['pdf']}", flush=True)
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Genera el informe PDF de varios tubos con una misma plantilla.")
+    parser.add_argument("plantilla", help="nombre de la plantilla en biblioteca_plantillas o ruta a su JSON")
+    parser.add_argument("tubos", nargs="+", help="rutas o patrones glob de los tubos (relativos a data/ si no existen)")
+    parser.add_argument("-o", "--salida", default="informes", help="carpeta de los PDF (por defecto: informes)")
+    parser.add_argument("-j", "--procesos", type=int, default=None,
+                        help="procesos en paralelo (por defecto los núcleos del equipo)")
+    parser.add_argument("--valor", type=_valor_actual, action="append", default=[], metavar="CLAVE=VALOR",
+                        help="valor para los parámetros $CURRENT (se puede repetir)")
+    parser.add_argument("--detalle", action="store_true", help="mostrar la salida de los scripts de gráficos y tablas")
+    args = parser.parse_args(argumentos)
+
+    try:
+        plantilla = cargar_plantilla(args.plantilla)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"No se pudo cargar la plantilla {args.plantilla}: {e}")
+        return 2
+    rutas = expandir_rutas_tubos(args.tubos)
+    if not rutas:
+        print("No se ha encontrado ningún tubo")
+        return 2
+
+    print(f"Generando {len(rutas)} informes en {args.salida}")
+    inicio = time.perf_counter()
+    resultados = generar_informes_lote(plantilla, rutas, args.salida, procesos=args.procesos,
+                                       valores=dict(args.valor), detalle=args.detalle,
+                                       al_terminar=_mostrar_resultado)
+
+    fallidos = [resultado for resultado in resultados if resultado["error"]]
+    con_avisos = sum(1 for resultado in resultados if not resultado["error"] and resultado["avisos"])
+    print(f"\n{len(resultados) - len(fallidos)} informes generados ({con_avisos} con avisos), "
+          f"{len(fallidos)} con error, en {time.perf_counter() - inicio:.2f} s")
+    for resultado in fallidos:
+        print(f"  {resultado['tubo']}: {resultado['error']}")
+    return 1 if fallidos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,9 +18,12 @@ import math
 
 
 #from TD_medias.vol_td.main import height
-from utils.funciones_comunes import get_color_for_index, buscar_referencia, calcular_incrementos, df_to_excel, debug_funcion, camp_independiente
+from utils.funciones_comunes import get_color_for_index, buscar_referencia, calcular_incrementos, df_to_excel, debug_funcion, camp_independiente, \
+    recalcular_tubo
 from utils.funciones_correcciones import grafico_violines, dict_a_df, creacion_df_bias, calculos_bias, calculos_bias_1, tabla_del_json, std
 from utils.funciones_importar import valores_calc_directos
+from utils.tubo_binario import cargar_tubo, cargar_tubo_bytes, guardar_campanas, guardar_tubo
+from utils.tubo_array import invalidar_tubo
 
 
 # Layout function
@@ -35,7 +38,7 @@ def layout():
                         dcc.Upload(
                             id='archivo-uploader',
                             multiple=False,
-                            accept='.json',
+                            accept='.json,.tubo',
                             children=['Drag and Drop o seleccionar archivo'],
                             style={
                                 'width': '100%', 'height': '60px', 'lineHeight': '60px', 'borderWidth': '2px',
@@ -839,7 +842,7 @@ def register_callbacks(app):
             content_type, content_string = contents.split(',')
             decoded = base64.b64decode(content_string)
             try:
-                data = json.loads(decoded)
+                data = cargar_tubo_bytes(decoded, filename)  # JSON (con su diario) o binario (.tubo)
                 corregir_tubo_data = data
                 informacion_archivo = html.Span([
                     html.B("Inclinómetro: "),
@@ -1062,6 +1065,7 @@ def register_callbacks(app):
                 }
 
             # Ejecuto las acciones, recorriendo todas las campañas de antiguas a nuevas
+            primera_recalculada = None  # desde esta fecha se recalcula el tubo en una sola pasada
             for fila in range(len(df_tabla_json) - 1, -1, -1):
                 # fecha
                 fecha = df_original.iloc[fila]['Fecha']
@@ -1083,7 +1087,6 @@ def register_callbacks(app):
 
                     # Cambios 2/3. Recalculo si procede
                     if acciones[fecha]['recalcular']:
-                        fecha_referencia = acciones[fecha]['ref_cambio']
                         # hay que meter en 'calc' los valores de a0-b180 calculados desde raw
                         calc_entries = []
                         # constante de conversión
@@ -1096,8 +1099,8 @@ def register_callbacks(app):
                             calc_entries.append(entry)
                         # inserto el nuevo 'calc' en el archivo del tubo
                         corregir_tubo[fecha]['calc'] = calc_entries
-                        # se obtienen los valores calculados en función de la referencia. Ojo correcciones es todo el tubo
-                        corregir_tubo = calcular_incrementos(corregir_tubo, fecha, fecha_referencia)  # función externa utils/funciones_comunes.py
+                        if primera_recalculada is None:
+                            primera_recalculada = fecha
                     # Cambios 3/3. Limpio las correcciones si se elige limpiar o hay que recalcular
                     if acciones[fecha]['cambios_camp']['limpiar']:
                         # borro todas las correcciones.
@@ -1107,7 +1110,12 @@ def register_callbacks(app):
                     # no hay cambios
                     pass
 
-
+            # se obtienen los valores calculados en función de la referencia, desde la primera campaña
+            # recalculada hasta la última. Ojo correcciones es todo el tubo
+            if primera_recalculada is not None:
+                recalcular_tubo(corregir_tubo, desde=primera_recalculada)  # función externa utils/funciones_comunes.py
+            else:
+                invalidar_tubo(corregir_tubo)  # campaign_info modificado en el sitio (el TuboArray guarda sus metadatos)
 
             # GUARDO LOS CAMBIOS EN EL ARCHIVO JSON. OJO, EN ESTE CASO LO REESCRIBO ENTERO
             # AL PASARLO A TD ESTO HAY QUE VER CÓMO SE HACE
@@ -1119,10 +1127,8 @@ def register_callbacks(app):
             # Nombre del archivo JSON
             ruta_json = ruta_data / nombre_archivo
 
-            # Sobrescribir completamente el archivo JSON
-            with open(ruta_json, "w", encoding="utf-8") as f:
-                json.dump(corregir_tubo, f, ensure_ascii=False, indent=4,
-                          default=lambda o: o.item() if hasattr(o, 'item') else o)
+            # Sobrescribir completamente el archivo (JSON o binario, según el archivo)
+            guardar_tubo(corregir_tubo, ruta_json)
 
 
             return (corregir_tubo, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update,dash.no_update, True, "Guardados los cambios")
@@ -2701,13 +2707,11 @@ def register_callbacks(app):
                     ]
                 }
             }
-            # busco referencia
-            fecha_referencia = buscar_referencia(corregir_tubo, fecha_seleccionada)
-            data_new = {
-                fecha_referencia: {"calc": corregir_tubo[fecha_referencia]['calc']},
-                fecha_seleccionada: {"calc":  nuevo_calc[fecha_seleccionada]['calc']}
-            }
-            resultado = calcular_incrementos(data_new, fecha_seleccionada, fecha_referencia)
+            # inserto la campaña corregida y recalculo en una pasada desde ella: las campañas posteriores
+            # que dependen de esta (si es referencia o la anterior a una referencia) quedan al día.
+            # recalcular_tubo sólo devuelve las campañas cuyo calc ha cambiado: sólo esas van al diario
+            corregir_tubo[fecha_seleccionada]['calc'] = nuevo_calc[fecha_seleccionada]['calc']
+            fechas_recalculadas = recalcular_tubo(corregir_tubo, desde=fecha_seleccionada)
 
             # Ruta del script - FUNCIONAMIENTO EN LOCAL
             ruta_script = Path(__file__).resolve().parent.parent  # Sube un nivel desde 'pages'
@@ -2715,24 +2719,22 @@ def register_callbacks(app):
 
             # Nombre del archivo JSON
             ruta_json = ruta_data / nombre_archivo
-            # Abrir el archivo en modo lectura/escritura sin sobrescribir todo
-            with open(ruta_json, "r+", encoding="utf-8") as f:
-                data = json.load(f)  # Cargar el JSON existente
-
-                # Modificar solo la clave necesaria
-                if fecha_seleccionada in data:
-                    data[fecha_seleccionada]['calc'] = resultado[fecha_seleccionada]['calc'] # campaña con mod y recalculada
-                    data[fecha_seleccionada]['bias'] = bias_seleccionado # lo añado aunque esté vacío
-                    data[fecha_seleccionada]['spike'] = spikes_seleccionado # lo añado aunque esté vacío
-                else:
-                    print(f"⚠️ La fecha {fecha_seleccionada} no existe en el archivo JSON.")
-                    raise ValueError(f"La fecha {fecha_seleccionada} no se encuentra en el JSON.")
-
-                # Volver a escribir SOLO la parte modificada
-                f.seek(0)  # Mover el puntero al inicio para sobrescribir correctamente
-                json.dump(data, f, ensure_ascii=False, indent=4)
-                f.truncate()  # Elimina cualquier contenido sobrante
-                print(f"🛠️ Editando el archivo: {ruta_json}")
+            data = cargar_tubo(ruta_json)  # JSON o binario (.tubo)
+
+            # Modificar solo las claves necesarias
+            if fecha_seleccionada in data:
+                for fecha in fechas_recalculadas:
+                    if fecha in data:
+                        data[fecha]['calc'] = corregir_tubo[fecha]['calc']  # campañas recalculadas
+                data[fecha_seleccionada]['bias'] = bias_seleccionado # lo añado aunque esté vacío
+                data[fecha_seleccionada]['spike'] = spikes_seleccionado # lo añado aunque esté vacío
+            else:
+                print(f"⚠️ La fecha {fecha_seleccionada} no existe en el archivo JSON.")
+                raise ValueError(f"La fecha {fecha_seleccionada} no se encuentra en el JSON.")
+
+            # Volver a escribir SOLO las campañas modificadas (en binario no se reescribe el resto)
+            guardar_campanas(ruta_json, data, set(fechas_recalculadas) | {fecha_seleccionada})
+            print(f"🛠️ Editando el archivo: {ruta_json}")
             print(f"Archivo actualizado con bias en {ruta_json}")
 
             # Construye el mensaje de guardado
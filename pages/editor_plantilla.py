@@ -1607,7 +1607,8 @@ def layout():
                                     id="graph-format",
                                     data=[
                                         {"value": "svg", "label": "SVG"},
-                                        {"value": "png", "label": "PNG"}
+                                        {"value": "png", "label": "PNG"},
+                                        {"value": "vectorial", "label": "Vectorial (ReportLab)"}
                                     ],
                                     value="svg",
                                     clearable=False,
@@ -1,7 +1,7 @@
 # pages/graficar.py
 import dash
 import pandas as pd
-from dash import html, dcc, callback_context, ctx
+from dash import html, dcc, callback_context, ctx, Patch
 import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output, State, ALL, MATCH
 import dash_mantine_components as dmc
@@ -16,18 +16,23 @@ from dash_iconify import DashIconify
 import os
 import copy
 
-import importlib
-import importlib.util
 import sys
 from pathlib import Path
 
 # Importar funciones del archivo externo
 from utils.diccionarios import colores_basicos, colores_ingles
 from utils.funciones_comunes import get_color_for_index, asignar_colores
-from utils.funciones_graficar import (obtener_fecha_desde_slider, obtener_color_para_fecha, extraer_datos_fecha, add_traza, interpolar_def_tubo,
+from utils.funciones_graficar import (obtener_fecha_desde_slider, obtener_color_para_fecha, trazas_tubo, traza_lineas,
                                       load_module_dynamically, cargar_valores_actuales, obtener_parametros_por_defecto,
                                       generar_seccion_grafico, generar_campos_parametros,
-                                      spanish_to_plotly_dash, hex_to_spanish_color)
+                                      spanish_to_plotly_dash)
+from utils.tubo_binario import cargar_tubo, cargar_tubo_bytes, DIRECTORIO_DATA
+from utils.cache_tubos import guardar_tubo_en_cache, obtener_tubo, registrar_recarga
+from utils.repositorio_tubos import sincronizar_repositorio, listar_tubos, cargar_tubo_repositorio
+from utils.cubo_temporal import CuboTemporal
+from utils.umbrales_compilados import umbrales_campana
+from utils.cargador_plugins import cargar_plugin
+from utils.informes import leyenda_umbrales_tubo, aplicar_valores_actuales, datos_informe
 #from utils.grafico_incli_0 import grafico_incli_0
 
 # Definición de constantes y variables
@@ -41,6 +46,62 @@ datos_tubo = {
 }
 
 
+# claves de calc que usan los gráficos
+CLAVES_CALC_GRAFICAR = ["index", "cota_abs", "depth", "incr_dev_a", "incr_dev_b", "checksum_a", "checksum_b",
+                        "incr_checksum_a", "incr_checksum_b", "incr_dev_abs_a", "incr_dev_abs_b", "desp_a", "desp_b"]
+
+
+def opciones_tubos_proyecto():
+    """Tubos de data/ para el selector, desde el repositorio SQLite (sólo se leen los archivos que han cambiado)."""
+    try:
+        sincronizar_repositorio()
+        return [{"label": tubo["nombre"], "value": tubo["nombre"]} for tubo in listar_tubos()]
+    except Exception as e:
+        print(f"No se pudo leer el repositorio de tubos: {e}")
+        return []
+
+
+def tubo_graficar_proyecto(origen):
+    """Tubo para graficar desde el repositorio SQLite: sólo campañas activas y las claves de calc de los gráficos."""
+    data = cargar_tubo_repositorio(origen["nombre"], solo_activas=True, claves_calc=CLAVES_CALC_GRAFICAR)
+    if data is None:
+        return None
+    data.setdefault("umbrales", {})
+    for clave, valor in data.items():
+        if clave not in ("info", "umbrales"):
+            valor["calc"] = [item for item in valor.get("calc", []) if "index" in item]
+    return data
+
+
+def tubo_graficar(data):
+    """Tubo para graficar a partir del tubo completo: info, umbrales y el 'calc' de las campañas activas."""
+    nuevo_diccionario = {
+        "info": data["info"],
+        "umbrales": data.get("umbrales", {})  # Si no existe, devuelve {}
+    }
+    # Recorrer las claves del diccionario original y guardo sólo 'calc' de las campañas 'Active'
+    for clave, valor in data.items():
+        if clave != "info" and clave != "umbrales" and "calc" in valor and valor.get("campaign_info", {}).get("active") == True:
+            nuevo_diccionario[clave] = {
+                "calc": [
+                    {clave_calc: item[clave_calc] for clave_calc in CLAVES_CALC_GRAFICAR}
+                    for item in valor["calc"] if isinstance(item, dict) and "index" in item
+                ],
+            }
+    return nuevo_diccionario
+
+
+def tubo_graficar_archivo(origen):
+    """Tubo para graficar desde el archivo de data/ con el nombre del subido (None si no existe)."""
+    ruta = os.path.join(DIRECTORIO_DATA, os.path.basename(origen["archivo"]))
+    return tubo_graficar(cargar_tubo(ruta)) if os.path.isfile(ruta) else None
+
+
+# si el tubo se expulsa de la caché del servidor se reconstruye desde el repositorio o desde data/
+registrar_recarga("graficar-proyecto", tubo_graficar_proyecto)
+registrar_recarga("graficar-archivo", tubo_graficar_archivo)
+
+
 def layout():
     return html.Div([
             html.Div(style={'height': '50px'}),  # Espacio al comienzo de la página
@@ -60,7 +121,7 @@ def layout():
                             dcc.Upload(
                                 id='graficar-uploader',
                                 multiple=False,
-                                accept='.json',  # Solo acepta archivos JSON
+                                accept='.json,.tubo',  # Tubos en JSON o en binario
                                 children=['Drag and Drop o seleccionar sensores'],
                                 style={
                                     'width': '100%',
@@ -78,7 +139,17 @@ def layout():
                                     'color': 'red'
                                 }
                             ),
-                            dcc.Store(id='graficar-tubo', storage_type='memory'),  # lee el json y lo deja en la memoria
+                            dmc.Select(
+                                id='graficar-tubo-proyecto',
+                                data=opciones_tubos_proyecto(),
+                                placeholder="o seleccionar un tubo de data/",
+                                searchable=True,
+                                clearable=True,
+                                style={'width': '100%'},
+                            ),
+                            dcc.Store(id='graficar-tubo', storage_type='memory'),  # referencia del tubo en la caché del servidor (utils/cache_tubos.py)
+                            dmc.Text(id='graficar-tubo-aviso', c='red', size='sm'),  # el tubo ha caducado en la caché
+                            dcc.Store(id='fecha_resaltada', storage_type='memory'),  # campaña dibujada como la del slider en los gráficos
                             dmc.HoverCard(
                                 withArrow=True,
                                 position="bottom",
@@ -704,52 +775,53 @@ def register_callbacks(app):
     @app.callback(
         [Output("info-hovercard", "children"),
          Output("graficar-tubo", "data")],
-        [Input("graficar-uploader", "contents")],
+        [Input("graficar-uploader", "contents"),
+         Input("graficar-tubo-proyecto", "value")],
         [State("graficar-uploader", "filename")]
     )
-    def update_hovercard_and_store(contents, filename):
+    def update_hovercard_and_store(contents, nombre_proyecto, filename):
+        if ctx.triggered_id == "graficar-tubo-proyecto":
+            if not nombre_proyecto:
+                return "", None
+            try:
+                # desde el repositorio SQLite, sin leer el archivo del tubo
+                origen = {"tipo": "graficar-proyecto", "nombre": nombre_proyecto}
+                data = tubo_graficar_proyecto(origen)
+                if data is None:
+                    return f"\t{nombre_proyecto}", None
+                return f"\t{nombre_proyecto}", guardar_tubo_en_cache(data, origen)
+            except Exception as e:
+                ic(e)
+                return f"\t{nombre_proyecto}", None
+
         if contents and filename:
             content_type, content_string = contents.split(',')
             decoded = base64.b64decode(content_string)
             try:
-                data = json.loads(decoded)
-
-                # Crear el nuevo diccionario
-                nuevo_diccionario = {
-                    "info": data["info"],
-                    "umbrales": data.get("umbrales", {})  # Si no existe, devuelve {}
-                }
-
-                # Recorrer las claves del diccionario original y guardo sólo 'calc' de las campañas 'Active'
-                for index, (clave, valor) in enumerate(data.items()):
-                    if clave != "info" and clave != "umbrales" and "calc" in valor and valor.get("campaign_info", {}).get("active") == True:
-                        nuevo_diccionario[clave] = {
-                            "calc": [
-                                {
-                                    "index": item["index"],
-                                    "cota_abs": item["cota_abs"],
-                                    "depth": item["depth"],
-                                    "incr_dev_a": item["incr_dev_a"],
-                                    "incr_dev_b": item["incr_dev_b"],
-                                    "checksum_a": item["checksum_a"],
-                                    "checksum_b": item["checksum_b"],
-                                    "incr_checksum_a": item["incr_checksum_a"],  # ← AÑADIR ESTA LÍNEA
-                                    "incr_checksum_b": item["incr_checksum_b"],  # ← AÑADIR ESTA LÍNEA
-                                    "incr_dev_abs_a": item["incr_dev_abs_a"],
-                                    "incr_dev_abs_b": item["incr_dev_abs_b"],
-                                    "desp_a": item["desp_a"],
-                                    "desp_b": item["desp_b"]
-                                }
-                                for item in valor["calc"] if isinstance(item, dict) and "index" in item
-                            ],
-                        }
-
-                return f"\t{filename}", nuevo_diccionario
+                data = cargar_tubo_bytes(decoded, filename)  # JSON (con su diario) o binario (.tubo)
+                # El tubo se queda en la caché del servidor; a la Store sólo va su referencia
+                origen = {"tipo": "graficar-archivo", "archivo": filename}
+                return f"\t{filename}", guardar_tubo_en_cache(tubo_graficar(data), origen)
             except Exception as e:
                 ic(e)  # Añadido para mostrar el error en caso de fallo
                 return f"\t{filename}", None
         return "", None
     """
+    - Avisa si el tubo ya no está en la caché del servidor y no se ha podido reconstruir desde su origen
+      (los gráficos se quedarían vacíos sin explicación).
+    """
+    @app.callback(
+        Output("graficar-tubo-aviso", "children"),
+        [Input("graficar-tubo", "data"),
+         Input("fechas_multiselect", "value"),
+         Input("profundidades_multiselect", "value")]
+    )
+    def aviso_tubo_caducado(clave_tubo, fechas, profundidades):
+        if clave_tubo and obtener_tubo(clave_tubo) is None:
+            return "El tubo ha caducado en la memoria del servidor: vuelve a cargarlo"
+        return ""
+
+    """
     - Actualiza las fechas por defecto en el selector de fechas según los datos del archivo subido.
     - **Inputs**:
     - `data`: datos cargados del archivo JSON.
@@ -759,7 +831,8 @@ def register_callbacks(app):
          Output("date_range_picker", "end_date")],
         Input("graficar-tubo", "data")
     )
-    def pordefecto_data_picker(data):
+    def pordefecto_data_picker(clave_tubo):
+        data = obtener_tubo(clave_tubo)  # la Store sólo guarda la referencia del tubo
         if not data:
             return None, None
 
@@ -796,7 +869,7 @@ def register_callbacks(app):
         Output("leyenda_umbrales", "data"),
         Input("graficar-tubo", "data"),
     )
-    def inicializar_leyenda(tubo):
+    def inicializar_leyenda(clave_tubo):
         """
         Inicializa la leyenda de umbrales basada en los datos del tubo.
         MODIFICADO: Ahora usa los colores y tipos de línea del JSON por defecto.
@@ -808,6 +881,7 @@ def register_callbacks(app):
             dict: Leyenda con colores y tipos de línea
         """
         # Verificar si tubo es None o no es un diccionario
+        tubo = obtener_tubo(clave_tubo)  # la Store sólo guarda la referencia del tubo
         if tubo is None:
             print("ADVERTENCIA: Los datos del tubo son None (inicializar_leyenda)")
             return {}
@@ -836,31 +910,7 @@ def register_callbacks(app):
 
         # NUEVA LÓGICA: Extraer colores y tipos de línea del JSON
         try:
-            nueva_leyenda = {}
-
-            for nombre_deformada, propiedades in umbrales_deformadas.items():
-                if isinstance(propiedades, dict):
-                    # Extraer color del JSON (hex) y convertir a nombre de color español si es necesario
-                    color_hex = propiedades.get('color', '#3B82F6')  # Azul por defecto
-                    tipo_linea = propiedades.get('tipo_linea', 'dashed')  # Discontinua por defecto
-
-                    # Convertir color hex a nombre español para compatibilidad con el sistema existente
-                    color_espanol = hex_to_spanish_color(color_hex)
-
-                    nueva_leyenda[nombre_deformada] = {
-                        'color': color_espanol,
-                        'color_hex': color_hex,  # Mantener el hex original
-                        'tipo_linea': tipo_linea
-                    }
-                else:
-                    # Fallback para formato antiguo
-                    print(f"ADVERTENCIA: Formato inesperado para deformada {nombre_deformada}")
-                    nueva_leyenda[nombre_deformada] = {
-                        'color': 'azul',
-                        'color_hex': '#3B82F6',
-                        'tipo_linea': 'dashed'
-                    }
-
+            nueva_leyenda = leyenda_umbrales_tubo(umbrales_deformadas)
             print(f"Nueva leyenda creada con colores del JSON: {nueva_leyenda}")
             return nueva_leyenda
 
@@ -882,10 +932,11 @@ def register_callbacks(app):
         [Input("graficar-tubo", "data"),
          Input("leyenda_umbrales", "data")]
     )
-    def actualizar_drawer(tubo, leyenda_actual):
+    def actualizar_drawer(clave_tubo, leyenda_actual):
         """
         MODIFICADO: Ahora incluye selectores para tipos de línea además de colores.
         """
+        tubo = obtener_tubo(clave_tubo)  # la Store sólo guarda la referencia del tubo
         if tubo is None:
             print("ADVERTENCIA: Los datos del tubo son None (actualizar_drawer)")
             return []
@@ -977,7 +1028,8 @@ def register_callbacks(app):
          Input("date_range_picker", "end_date"),
          Input("color_scheme_selector", "value")]
     )
-    def update_fechas_multiselect(data, total_camp, ultimas_camp, cadencia_dias, start_date, end_date, color_scheme):
+    def update_fechas_multiselect(clave_tubo, total_camp, ultimas_camp, cadencia_dias, start_date, end_date, color_scheme):
+        data = obtener_tubo(clave_tubo)  # la Store sólo guarda la referencia del tubo
         if not data:
             return [], []
 
@@ -1052,7 +1104,8 @@ def register_callbacks(app):
         [Input("graficar-tubo", "data"),
          Input("unidades_eje","value")]
     )
-    def update_profundidades_multiselect(data, eje):
+    def update_profundidades_multiselect(clave_tubo, eje):
+        data = obtener_tubo(clave_tubo)  # la Store sólo guarda la referencia del tubo
         if not data:
             return [], []
 
@@ -1085,7 +1138,8 @@ def register_callbacks(app):
          Output("grafico_incli_chk_b", "figure"),
          Output("grafico_incli_3_a", "figure"),
          Output("grafico_incli_3_b", "figure"),
-         Output("grafico_incli_3_total", "figure")],
+         Output("grafico_incli_3_total", "figure"),
+         Output("fecha_resaltada", "data")],
         [Input("fechas_multiselect", "value"),
          #Input("fechas_multiselect", "data"),
          Input("slider_fechas", "value"),  # CORREGIDO: Usar slider directamente en vez del tooltip para evitar bucle
@@ -1100,7 +1154,8 @@ def register_callbacks(app):
          Input("valor_negativo_incremento", "value"),
          Input("leyenda_umbrales", "data"),
          Input("unidades_eje","value"),
-         Input("orden", "value")]
+         Input("orden", "value")],
+        [State("fecha_resaltada", "data")]
     )
     #def actualizar_graficos(fechas_seleccionadas, fechas_colores, slider_value, data, alto_graficos, color_scheme,
     #                        escala_desplazamiento, escala_incremento,
@@ -1108,12 +1163,13 @@ def register_callbacks(app):
     #                        valor_positivo_incremento, valor_negativo_incremento, leyenda_umbrales,
     #                        eje, orden):
 
-    def actualizar_graficos(fechas_seleccionadas, slider_value, data, alto_graficos, color_scheme,
+    def actualizar_graficos(fechas_seleccionadas, slider_value, clave_tubo, alto_graficos, color_scheme,
                             escala_desplazamiento, escala_incremento,
                             valor_positivo_desplazamiento, valor_negativo_desplazamiento,
                             valor_positivo_incremento, valor_negativo_incremento, leyenda_umbrales,
-                            eje, orden):
+                            eje, orden, fecha_resaltada):
 
+        data = obtener_tubo(clave_tubo)  # la Store sólo guarda la referencia del tubo
         if not fechas_seleccionadas or not data:
             # CRÍTICO: Las figuras vacías deben tener autosize=False para evitar crecimiento infinito
             fig_vacia = go.Figure()
@@ -1122,7 +1178,7 @@ def register_callbacks(app):
                 height=alto_graficos,
                 uirevision='constant'
             )
-            return [fig_vacia for _ in range(9)]
+            return [fig_vacia for _ in range(9)] + [None]
 
         # RECONSTRUIR fechas_colores internamente en lugar de recibirlo como parámetro
         total_colors = len(fechas_seleccionadas)
@@ -1136,16 +1192,6 @@ def register_callbacks(app):
                 "style": {"color": color_hex}
             })
 
-        fig1_a = go.Figure()
-        fig1_b = go.Figure()
-        fig2_a = go.Figure()
-        fig2_b = go.Figure()
-        fig_chk_a = go.Figure()
-        fig_chk_b = go.Figure()
-        fig3_a = go.Figure()
-        fig3_b = go.Figure()
-        fig3_total = go.Figure()
-
         # Obtener la fecha seleccionada en el slider
         # CORREGIDO: Ahora slider_value es el valor numérico del slider, no el texto del tooltip
         # Necesitamos convertirlo a fecha usando la misma lógica que update_slider_tooltip
@@ -1166,100 +1212,34 @@ def register_callbacks(app):
                 print(f"Error calculando fecha_slider: {e}")
                 fecha_slider = fechas_seleccionadas[-1] if fechas_seleccionadas else None
 
-        # BLOQUE 1: Primero agregar todas las series no seleccionadas
-        for fecha in fechas_seleccionadas:
-            if fecha in data and "calc" in data[fecha] and fecha != fecha_slider:
-                # Obtener color y datos
-                color = obtener_color_para_fecha(fecha, fechas_colores)
-                datos = extraer_datos_fecha(fecha, data, eje)
-                if not datos:
-                    continue
-
-                # Normalizar eje Y a float (evitar eje categórico)
-                eje_y_num = []
-                for v in datos['eje_Y']:
-                    try:
-                        eje_y_num.append(float(v) if v is not None else None)
-                    except Exception:
-                        eje_y_num.append(None)
-
-                # Parámetros para series no seleccionadas
-                grosor = 2
-                opacidad = 0.7
-
-                # Añadir trazas a cada figura individualmente
-                # Gráfico 1: Desplazamientos
-                add_traza(fig1_a, datos['desp_a'], eje_y_num,
-                             f"{fecha} - Desp A", color, grosor, opacidad, fecha)
-                add_traza(fig1_b, datos['desp_b'], eje_y_num,
-                             f"{fecha} - Desp B", color, grosor, opacidad, fecha)
-
-                # Gráfico 2: Incrementales
-                add_traza(fig2_a, datos['incr_dev_abs_a'], eje_y_num,
-                             f"{fecha} - Incr Dev A", color, grosor, opacidad, fecha)
-                add_traza(fig2_b, datos['incr_dev_abs_b'], eje_y_num,
-                             f"{fecha} - Incr Dev B", color, grosor, opacidad, fecha)
-
-                # Gráfico checksum
-                add_traza(fig_chk_a, datos['checksum_a'], eje_y_num,
-                             f"{fecha} - Checksum A", color, grosor, opacidad, fecha)
-                add_traza(fig_chk_b, datos['checksum_b'], eje_y_num,
-                             f"{fecha} - Checksum B", color, grosor, opacidad, fecha)
-
-                # Gráfico 3: Desplazamientos Compuestos
-                add_traza(fig3_a, datos['desp_a'], eje_y_num,
-                             f"{fecha} - Desp A", color, grosor, opacidad, fecha)
-                add_traza(fig3_b, datos['desp_b'], eje_y_num,
-                             f"{fecha} - Desp B", color, grosor, opacidad, fecha)
-                add_traza(fig3_total, datos['desp_total'], eje_y_num,
-                             f"{fecha} - Desp Total", color, grosor, opacidad, fecha)
-
-        # BLOQUE 2: Luego agregar la serie seleccionada para que quede encima
-        if fecha_slider in fechas_seleccionadas and fecha_slider in data and "calc" in data[fecha_slider]:
-            # Obtener datos para la fecha seleccionada
-            datos = extraer_datos_fecha(fecha_slider, data, eje)
-            if datos:
-                # Normalizar eje Y a float (evitar eje categórico)
-                eje_y_num = []
-                for v in datos['eje_Y']:
-                    try:
-                        eje_y_num.append(float(v) if v is not None else None)
-                    except Exception:
-                        eje_y_num.append(None)
-                # Parámetros para la serie seleccionada
-                color = 'darkblue'
-                grosor = 4
-                opacidad = 1.0
-
-                # Añadir trazas a cada figura individualmente
-                # Gráfico 1: Desplazamientos
-                add_traza(fig1_a, datos['desp_a'], eje_y_num,
-                             f"{fecha_slider} - Desp A", color, grosor, opacidad, fecha_slider)
-                add_traza(fig1_b, datos['desp_b'], eje_y_num,
-                             f"{fecha_slider} - Desp B", color, grosor, opacidad, fecha_slider)
-
-                # Gráfico 2: Incrementales
-                add_traza(fig2_a, datos['incr_dev_abs_a'], eje_y_num,
-                             f"{fecha_slider} - Incr Dev A", color, grosor, opacidad, fecha_slider)
-                add_traza(fig2_b, datos['incr_dev_abs_b'], eje_y_num,
-                             f"{fecha_slider} - Incr Dev B", color, grosor, opacidad, fecha_slider)
-
-                # Gráfico checksum
-                add_traza(fig_chk_a, datos['checksum_a'], eje_y_num,
-                             f"{fecha_slider} - Checksum A", color, grosor, opacidad, fecha_slider)
-                add_traza(fig_chk_b, datos['checksum_b'], eje_y_num,
-                             f"{fecha_slider} - Checksum B", color, grosor, opacidad, fecha_slider)
-
-                # Gráfico 3: Desplazamientos Compuestos
-                add_traza(fig3_a, datos['desp_a'], eje_y_num,
-                             f"{fecha_slider} - Desp A", color, grosor, opacidad, fecha_slider)
-                add_traza(fig3_b, datos['desp_b'], eje_y_num,
-                             f"{fecha_slider} - Desp B", color, grosor, opacidad, fecha_slider)
-                add_traza(fig3_total, datos['desp_total'], eje_y_num,
-                             f"{fecha_slider} - Desp Total", color, grosor, opacidad, fecha_slider)
-
-        # Añade los umbrales
-        if leyenda_umbrales:
+        # Series de cada figura (variable de las trazas y etiqueta), en el orden en que se devuelven
+        series = [('desp_a', 'Desp A'), ('desp_b', 'Desp B'),  # Gráfico 1: Desplazamientos
+                  ('incr_dev_abs_a', 'Incr Dev A'), ('incr_dev_abs_b', 'Incr Dev B'),  # Gráfico 2: Incrementales
+                  ('checksum_a', 'Checksum A'), ('checksum_b', 'Checksum B'),  # Gráfico checksum
+                  ('desp_a', 'Desp A'), ('desp_b', 'Desp B'), ('desp_total', 'Desp Total')]  # Gráfico 3: Compuestos
+
+        # Arrays precalculados de todas las campañas del tubo (eje Y ya numérico, sin eje categórico)
+        trazas = trazas_tubo(data, eje)
+        fechas_trazadas = [fecha for fecha in fechas_seleccionadas if fecha in trazas]
+        posicion = {fecha: k for k, fecha in enumerate(fechas_trazadas)}  # índice de la traza en cada figura
+
+        def estilo_campana(fecha):
+            # La serie del slider va en azul oscuro, más gruesa y encima del resto (zorder). Las trazas
+            # mantienen siempre el orden de las fechas, así que al mover el slider sólo cambian estos estilos
+            if fecha == fecha_slider:
+                return dict(line=dict(color='darkblue', width=4), opacity=1.0, zorder=1)
+            return dict(line=dict(color=obtener_color_para_fecha(fecha, fechas_colores), width=2), opacity=0.7, zorder=0)
+
+        # Sólo se ha movido el slider: en lugar de volver a enviar las nueve figuras, se cambia el estilo de
+        # la traza que estaba resaltada y de la nueva (y las deformadas, si dependen de la campaña del slider)
+        solo_slider = set(ctx.triggered_prop_ids) == {"slider_fechas.value"} and fecha_resaltada is not None
+        if solo_slider and fecha_slider == fecha_resaltada:
+            return [dash.no_update] * 10
+
+        # Deformadas de umbrales de fig1_a y fig1_b (van detrás de las trazas de las campañas)
+        umbrales_figuras = [[], []]
+        grosor = 4
+        if leyenda_umbrales and not (solo_slider and eje == "cota_abs"):
             # hay umbrales a pintar
             # Extraer los datos
             valores = data['umbrales']['valores']
@@ -1268,14 +1248,15 @@ def register_callbacks(app):
             deformadas = list(data['umbrales']['deformadas'].keys())
 
             df = pd.DataFrame(valores)
+            umbrales_slider = umbrales_campana(data, fecha_slider) if eje in ("depth", "index") else {}
 
             # Para cada deformada, añadir una traza en la figura correspondiente
             for deformada in deformadas:
                 # Determinar en qué figura debe ir la deformada
                 if deformada.endswith("_a"):
-                    fig = fig1_a
+                    trazas_umbral = umbrales_figuras[0]
                 elif deformada.endswith("_b"):
-                    fig = fig1_b
+                    trazas_umbral = umbrales_figuras[1]
                 else:
                     continue  # Si no termina en _a o _b, no se grafica
 
@@ -1301,11 +1282,12 @@ def register_callbacks(app):
                 dash_pattern = spanish_to_plotly_dash(tipo_linea)
 
                 if eje == "depth" or eje == "index":
-                    # Hay que interpolar las deformadas al caso de index o depth
+                    # Deformadas en los puntos de la campaña del slider, del remuestreo en la rejilla del
+                    # tubo que se hace una sola vez por tubo y umbrales
                     cota_tubo = [punto["cota_abs"] for punto in data[fecha_slider]['calc']]
-                    cota_umbral = df['cota_abs'].to_list()
-                    def_umbral = df[deformada].to_list()
-                    eje_X = interpolar_def_tubo(cota_tubo, cota_umbral, def_umbral)
+                    if deformada not in umbrales_slider:
+                        continue
+                    eje_X = umbrales_slider[deformada].tolist()
                 else:
                     # caso de "cota_abs"
                     eje_X = df[deformada]
@@ -1337,7 +1319,8 @@ def register_callbacks(app):
                     pass
 
                 # MODIFICADO: Agregar la traza con tipo de línea personalizado
-                fig.add_trace(go.Scatter(
+                trazas_umbral.append(dict(
+                    type="scatter",
                     y=eje_Y,
                     x=eje_X,
                     mode="lines",
@@ -1347,46 +1330,30 @@ def register_callbacks(app):
                         width=grosor,
                         dash=dash_pattern  # NUEVO: Aplicar patrón de línea
                     ),
-                    legendgroup=fecha,
+                    legendgroup=fechas_seleccionadas[-1],
                     opacity=opacity
                 ))
 
-        # Configurar ejes y quitar leyendas, ajustar altura de gráficos
-        for fig in [fig1_a, fig1_b, fig3_a, fig3_b, fig3_total]:
-            if escala_desplazamiento == "manual":
-                fig.update_xaxes(range=[valor_negativo_desplazamiento, valor_positivo_desplazamiento])
-
-        # escala automática/manual
-        for fig in [fig2_a, fig2_b]:
-            if escala_incremento == "manual":
-                fig.update_xaxes(range=[valor_negativo_incremento, valor_positivo_incremento])
-
-        # La escala de checksum va automática
-        for fig in [fig_chk_a, fig_chk_b]:
-            fig.update_layout(
-                xaxis=dict(
-                    range=[-1, 1],  # Establece el rango mínimo a ±1
-                    tickmode='linear',  # Modo de ticks lineal
-                    dtick=0.5,  # Espacio entre ticks (0.5 para divisiones intermedias)
-                    autorange=False,  # CORREGIDO: No autorange si ya hay un rango fijo (evita conflicto)
-                    tick0=0,  # Empezar en 0
-                    constrain='domain'  # Mantener la restricción en el dominio
-                )
-            )
+        if solo_slider:
+            figuras = [Patch() for _ in series]
+            for fecha in (fecha_resaltada, fecha_slider):
+                if fecha not in posicion:
+                    continue
+                estilo = estilo_campana(fecha)
+                for figura in figuras:
+                    traza = figura['data'][posicion[fecha]]
+                    for propiedad, valor in estilo.items():
+                        traza[propiedad] = valor
+            if eje != "cota_abs":  # las deformadas se interpolan sobre la campaña del slider
+                for figura, trazas_umbral in zip(figuras, umbrales_figuras):
+                    for k, traza_umbral in enumerate(trazas_umbral):
+                        figura['data'][len(fechas_trazadas) + k]['x'] = traza_umbral['x']
+                        figura['data'][len(fechas_trazadas) + k]['y'] = traza_umbral['y']
+            return figuras + [fecha_slider]
 
         # Definición de gráficos y rejilla y título ejeY
-        for fig in [fig1_a, fig1_b, fig2_a, fig2_b, fig_chk_a, fig_chk_b, fig3_a, fig3_b, fig3_total]:
-            # Solo mostrar título si la figura es una de las de la izquierda (fig1_a, fig2_a, fig_chk_a, fig3_a)
-            if fig in [fig1_a, fig2_a, fig_chk_a, fig3_a]:
-                if eje == "index":
-                    titulo_eje_y = "Índice"
-                elif eje == "cota_abs":
-                    titulo_eje_y = "Cota (m.s.n.m.)"
-                elif eje == "depth":
-                    titulo_eje_y = "Profundidad (m)"
-            else:
-                titulo_eje_y = ""
-            fig.update_layout(
+        def layout_figura(titulo_eje_y):
+            return dict(
                 uirevision=f'constant_{orden}_{eje}',  # CAMBIADO: Forzar reset UI al cambiar orden o eje
                 yaxis=dict(
                     type='linear',
@@ -1414,7 +1381,50 @@ def register_callbacks(app):
                 autosize=False  # CRÍTICO: Desactivar para evitar bucle de crecimiento infinito
             )
 
-        return [fig1_a, fig1_b, fig2_a, fig2_b,fig_chk_a, fig_chk_b, fig3_a, fig3_b, fig3_total]
+        # Solo mostrar título si la figura es una de las de la izquierda (fig1_a, fig2_a, fig_chk_a, fig3_a)
+        titulo_eje_y = {"index": "Índice", "cota_abs": "Cota (m.s.n.m.)", "depth": "Profundidad (m)"}.get(eje, "")
+        izquierda = [True, False, True, False, True, False, True, False, False]
+
+        trazas_figuras = [[] for _ in series]
+        for fecha in fechas_trazadas:
+            datos = trazas[fecha]
+            estilo = estilo_campana(fecha)
+            for trazas_figura, (variable, etiqueta) in zip(trazas_figuras, series):
+                traza = traza_lineas(datos[variable], datos['eje_Y'], f"{fecha} - {etiqueta}",
+                                     estilo['line']['color'], estilo['line']['width'], estilo['opacity'], fecha)
+                traza['zorder'] = estilo['zorder']
+                trazas_figura.append(traza)
+        for trazas_figura, trazas_umbral in zip(trazas_figuras, umbrales_figuras):
+            trazas_figura.extend(trazas_umbral)
+
+        # Las figuras se devuelven como dicts de Plotly: construir un go.Scatter por traza (con o sin
+        # validación) es lo que más tarda con muchas campañas, y dcc.Graph acepta el dict directamente
+        (fig1_a, fig1_b, fig2_a, fig2_b, fig_chk_a, fig_chk_b,
+         fig3_a, fig3_b, fig3_total) = [dict(data=trazas_figura, layout=layout_figura(titulo_eje_y if es_izquierda else ""))
+                                        for trazas_figura, es_izquierda in zip(trazas_figuras, izquierda)]
+
+        # Configurar ejes y quitar leyendas, ajustar altura de gráficos
+        for fig in [fig1_a, fig1_b, fig3_a, fig3_b, fig3_total]:
+            if escala_desplazamiento == "manual":
+                fig['layout']['xaxis']['range'] = [valor_negativo_desplazamiento, valor_positivo_desplazamiento]
+
+        # escala automática/manual
+        for fig in [fig2_a, fig2_b]:
+            if escala_incremento == "manual":
+                fig['layout']['xaxis']['range'] = [valor_negativo_incremento, valor_positivo_incremento]
+
+        # La escala de checksum va automática
+        for fig in [fig_chk_a, fig_chk_b]:
+            fig['layout']['xaxis'].update(
+                range=[-1, 1],  # Establece el rango mínimo a ±1
+                tickmode='linear',  # Modo de ticks lineal
+                dtick=0.5,  # Espacio entre ticks (0.5 para divisiones intermedias)
+                autorange=False,  # CORREGIDO: No autorange si ya hay un rango fijo (evita conflicto)
+                tick0=0,  # Empezar en 0
+                constrain='domain'  # Mantener la restricción en el dominio
+            )
+
+        return [fig1_a, fig1_b, fig2_a, fig2_b,fig_chk_a, fig_chk_b, fig3_a, fig3_b, fig3_total, fecha_slider]
 
     @app.callback(
         Output("grafico_temporal", "figure"),
@@ -1429,8 +1439,9 @@ def register_callbacks(app):
          Input("unidades_eje", "value"),
          ]
     )
-    def actualizar_grafico_temporal(profundidades_seleccionadas, data, desplazamientos_seleccionados, start_date, end_date,
+    def actualizar_grafico_temporal(profundidades_seleccionadas, clave_tubo, desplazamientos_seleccionados, start_date, end_date,
                                     escala_temporal, valor_positivo_temporal, valor_negativo_temporal, eje):
+        data = obtener_tubo(clave_tubo)  # la Store sólo guarda la referencia del tubo
         if not profundidades_seleccionadas or not data or not desplazamientos_seleccionados:
             fig_vacia = go.Figure()
             fig_vacia.update_layout(autosize=False, uirevision='constant')
@@ -1438,30 +1449,18 @@ def register_callbacks(app):
 
         fig_temporal = go.Figure()
 
-        # Obtener y ordenar las fechas de más antigua a más reciente
-        fechas_temp = sorted([fecha for fecha in data.keys() if fecha != "info" and fecha != "umbrales"], key=lambda x: datetime.fromisoformat(x))
-
+        # Cubo fechas x profundidades x variables del tubo para el eje (fechas de más antigua a más reciente)
+        cubo = CuboTemporal.de_tubo(data, eje)
 
         # Filtrar fechas dentro del rango seleccionado
-        fechas_temp = [fecha for fecha in fechas_temp if start_date <= fecha <= end_date]
-
-        for profundidad in profundidades_seleccionadas:
-            for desplazamiento in desplazamientos_seleccionados:
-                valores = []
-                for fecha in fechas_temp:
-                    if "calc" in data[fecha]:
-                        puntos = data[fecha]["calc"]
-                        for punto in puntos:
-                            #if punto.get("cota_abs") == profundidad and desplazamiento in punto:
-                            if str(punto.get(eje)) == str(profundidad) and desplazamiento in punto:
-                                valores.append(punto[desplazamiento])
-                                break
-
-                        else:
-                            valores.append(None)  # Añadir None si no se encuentra la cota
+        fechas_temp = [fecha for fecha in cubo.fechas if start_date <= fecha <= end_date]
 
+        # Una serie por profundidad y desplazamiento: slices del cubo (NaN donde la campaña no tiene el punto)
+        series = cubo.series(desplazamientos_seleccionados, profundidades_seleccionadas, fechas_temp)
+        for p, profundidad in enumerate(profundidades_seleccionadas):
+            for d, desplazamiento in enumerate(desplazamientos_seleccionados):
                 # Añadir la serie temporal al gráfico
-                fig_temporal.add_trace(go.Scatter(x=fechas_temp, y=valores, mode="markers+lines", name=f"{desplazamiento} ({profundidad})"))
+                fig_temporal.add_trace(go.Scatter(x=fechas_temp, y=series[:, p, d], mode="markers+lines", name=f"{desplazamiento} ({profundidad})"))
 
         # escala automática/manual
         if escala_temporal == "manual":
@@ -1727,7 +1726,7 @@ def register_callbacks(app):
          State("leyenda_umbrales", "data")],
         prevent_initial_call=True
     )
-    def cargar_plantilla_seleccionada_mejorada(nombre_plantilla, data, eje, orden, color_scheme,
+    def cargar_plantilla_seleccionada_mejorada(nombre_plantilla, clave_tubo, eje, orden, color_scheme,
                                                escala_desplazamiento, escala_incremento,
                                                valor_positivo_desplazamiento, valor_negativo_desplazamiento,
                                                valor_positivo_incremento, valor_negativo_incremento,
@@ -1766,6 +1765,7 @@ def register_callbacks(app):
                     }
                 }
 
+            data = obtener_tubo(clave_tubo)  # la Store sólo guarda la referencia del tubo
             # Obtener valores actuales
             current_values = cargar_valores_actuales(
                 data, eje, orden, color_scheme, escala_desplazamiento, escala_incremento,
@@ -1962,7 +1962,7 @@ def register_callbacks(app):
          State("leyenda_umbrales", "data")],
         prevent_initial_call=True
     )
-    def actualizar_parametros_por_script(script_seleccionado, data, eje, orden, color_scheme,
+    def actualizar_parametros_por_script(script_seleccionado, clave_tubo, eje, orden, color_scheme,
                                          escala_desplazamiento, escala_incremento,
                                          valor_positivo_desplazamiento, valor_negativo_desplazamiento,
                                          valor_positivo_incremento, valor_negativo_incremento,
@@ -1973,6 +1973,7 @@ def register_callbacks(app):
         """
         if not script_seleccionado:
             return [dmc.Text("Seleccione un script para ver los parámetros", c="dimmed")]
+        data = obtener_tubo(clave_tubo)  # la Store sólo guarda la referencia del tubo
 
         # Obtener valores actuales
         current_values = cargar_valores_actuales(
@@ -2025,7 +2026,7 @@ def register_callbacks(app):
          State("slider_fecha_tooltip", "children")],  # Estado añadido para capturar la fecha seleccionada
         prevent_initial_call=True
     )
-    def generar_informe_pdf(n_clicks, plantilla_json, datos_tubo,
+    def generar_informe_pdf(n_clicks, plantilla_json, clave_tubo,
                         eje, orden, color_scheme,
                         escala_desplazamiento, escala_incremento,
                         valor_positivo_desplazamiento, valor_negativo_desplazamiento,
@@ -2060,6 +2061,7 @@ def register_callbacks(app):
 
         if not n_clicks or not plantilla_json:
             return None, True, []
+        datos_tubo = obtener_tubo(clave_tubo)  # la Store sólo guarda la referencia del tubo
 
         try:
             # Crear una copia profunda de la plantilla para no modificar el original
@@ -2113,18 +2115,7 @@ def register_callbacks(app):
             }
 
             # Procesar la plantilla para reemplazar los valores $CURRENT restantes
-            for pagina_num, pagina_data in plantilla_modificada.get("paginas", {}).items():
-                for elemento_id, elemento in pagina_data.get("elementos", {}).items():
-                    # Procesar elementos de tipo grafico y tabla
-                    tipo_elemento = elemento.get("tipo")
-                    if tipo_elemento in ["grafico", "tabla"] and "configuracion" in elemento:
-                        # Obtener los parámetros actuales
-                        parametros = elemento["configuracion"].get("parametros", {})
-
-                        # Reemplazar valores $CURRENT
-                        for param_key, param_value in list(parametros.items()):
-                            if param_value == "$CURRENT" and param_key in current_values:
-                                elemento["configuracion"]["parametros"][param_key] = current_values[param_key]
+            plantilla_modificada = aplicar_valores_actuales(plantilla_modificada, current_values)
 
             # Obtener el nombre de la plantilla para el archivo
             nombre_plantilla = plantilla_modificada.get("configuracion", {}).get("nombre_plantilla", "informe")
@@ -2143,24 +2134,9 @@ def register_callbacks(app):
             biblioteca_graficos_path = Path("biblioteca_graficos")  # Ruta directa, no dentro de plantillas
             biblioteca_tablas_path = Path("biblioteca_tablas")  # Ruta a scripts de tablas
 
-            # Para mantener compatibilidad con gráficos que esperan la estructura original de datos_tubo,
-            # pasamos datos_tubo directamente. Los valores de current_values ya fueron reemplazados
-            # en los parámetros de los elementos arriba (líneas 2102-2104).
-            # 
-            # Para tablas que necesitan acceder a fecha_seleccionada, ultimas_camp, etc.,
-            # estos valores se pueden obtener de los parámetros del elemento, que ya fueron
-            # reemplazados con los valores de current_values.
-            #
-            # NOTA: Si es necesario pasar valores adicionales al data_source para tablas,
-            # se debe hacer de forma selectiva sin interferir con las claves de datos_tubo.
-            data_source_for_pdf = datos_tubo.copy() if datos_tubo else {}
-            
-            # Añadir SOLO los valores específicos que necesitan los scripts de tabla
-            # y que NO existen en datos_tubo (para no sobrescribir fechas u otros datos)
-            table_specific_values = ['fecha_seleccionada', 'ultimas_camp']
-            for key in table_specific_values:
-                if key in current_values:
-                    data_source_for_pdf[key] = current_values[key]
+            # El tubo tal cual (los valores $CURRENT ya están en los parámetros de los elementos) más
+            # fecha_seleccionada y ultimas_camp para los scripts de tabla
+            data_source_for_pdf = datos_informe(datos_tubo, current_values)
 
             # Generar PDF usando el módulo importado
             generate_pdf_from_template(
@@ -2245,7 +2221,7 @@ def register_callbacks(app):
         prevent_initial_call=True
     )
     def imprimir_pdf(n_clicks, fechas_seleccionadas, fechas_colores, slider_value,
-                     data, alto_graficos, color_scheme, escala_desplazamiento,
+                     clave_tubo, alto_graficos, color_scheme, escala_desplazamiento,
                      escala_incremento, valor_positivo_desplazamiento,
                      valor_negativo_desplazamiento, valor_positivo_incremento,
                      valor_negativo_incremento, leyenda_umbrales, eje, orden,
@@ -2256,6 +2232,7 @@ def register_callbacks(app):
         """
         if not n_clicks or not plantilla_json:
             return []
+        data = obtener_tubo(clave_tubo)  # la Store sólo guarda la referencia del tubo
 
         # Inicializar la lista resultados al inicio de la función
         resultados = []
@@ -2525,7 +2502,7 @@ def register_callbacks(app):
     )
     def agregar_parametros_por_defecto(n_clicks, ids_btn, script_values, script_ids, plantilla_json,
                                        fecha_inicial, fecha_final, eje, orden, color_scheme,
-                                       total_camp, ultimas_camp, cadencia_dias, data):
+                                       total_camp, ultimas_camp, cadencia_dias, clave_tubo):
         """
         Agrega parámetros por defecto a un elemento de gráfico en la plantilla JSON.
         """
@@ -2836,7 +2813,7 @@ def register_callbacks(app):
         prevent_initial_call=True
     )
     def generar_vista_previa_graficos(n_clicks, fechas_seleccionadas, fechas_colores, slider_value,
-                                      data, alto_graficos, color_scheme, escala_desplazamiento,
+                                      clave_tubo, alto_graficos, color_scheme, escala_desplazamiento,
                                       escala_incremento, valor_positivo_desplazamiento,
                                       valor_negativo_desplazamiento, valor_positivo_incremento,
                                       valor_negativo_incremento, leyenda_umbrales, eje, orden,
@@ -2847,6 +2824,7 @@ def register_callbacks(app):
         """
         if not n_clicks or not plantilla_json:
             return dash.no_update
+        data = obtener_tubo(clave_tubo)  # la Store sólo guarda la referencia del tubo
 
         # Solución para el error "main thread is not in main loop"
         import matplotlib
@@ -3050,16 +3028,10 @@ def register_callbacks(app):
                                 sys.path.insert(0, script_dir)
 
                                 try:
-                                    # Cargar dinámicamente el módulo
-                                    module_spec = importlib.util.spec_from_file_location(
-                                        script_valor_sin_extension,
-                                        script_path
-                                    )
-
-                                    if module_spec:
-                                        module = importlib.util.module_from_spec(module_spec)
-                                        module_spec.loader.exec_module(module)
+                                    # Cargar el módulo (desde la caché si el script no ha cambiado)
+                                    module = cargar_plugin(script_path, script_valor_sin_extension)
 
+                                    if module:
                                         # Obtener la función principal (mismo nombre que el script)
                                         if hasattr(module, script_valor_sin_extension):
                                             funcion_grafico = getattr(module, script_valor_sin_extension)
@@ -3099,7 +3071,7 @@ def register_callbacks(app):
                                             """
                                     else:
                                         html_content += f"""
-                                        <p class="error">No se pudo crear el spec para el módulo {script_valor_sin_extension}</p>
+                                        <p class="error">No se pudo cargar el módulo {script_valor_sin_extension}</p>
                                         """
                                 finally:
                                     # Restaurar el path original
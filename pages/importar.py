@@ -1,4 +1,3 @@
-import json
 import os
 import dash
 from dash.exceptions import PreventUpdate
@@ -11,10 +10,12 @@ from dash_mantine_components import (
 from dash_iconify import DashIconify
 import base64
 from utils.diccionarios import importadores
-from utils.funciones_comunes import calcular_incrementos, buscar_referencia, buscar_ant_referencia, evaluar_umbrales
+from utils.funciones_comunes import buscar_ant_referencia, recalcular_tubo
 from utils.funciones_graficos import importar_graficos
-from utils.funciones_importar import import_RST, import_Sisgeo, import_soil_dux, insertar_camp, es_fecha_isoformat, \
-    default_value, parse_alarm_val
+from utils.tubo_binario import cargar_tubo, EXTENSIONES_TUBO
+from utils.umbrales_compilados import evaluar_tubo
+from utils.funciones_importar import insertar_camp, es_fecha_isoformat, default_value, parse_alarm_val
+from utils.importacion_paralela import ITERADORES, importar_archivos, estado_importacion
 import pprint
 from datetime import datetime
 import re
@@ -64,7 +65,7 @@ def layout():
                     id='import-file-dropdown',
                     data=[
                         {"label": file, "value": file} for file in os.listdir(data_path) if
-                        os.path.isfile(os.path.join(data_path, file))
+                        os.path.isfile(os.path.join(data_path, file)) and file.endswith(EXTENSIONES_TUBO)
                     ],
                     placeholder="Selecciona un archivo...",
                     style={'width': '100%', 'marginBottom': '15px'},
@@ -93,11 +94,60 @@ def layout():
         # Contenedores para los siguientes pasos
         html.Div(id='import-step-2'),
         html.Div(id='import-step-3'),
+        # Progreso de la importación de archivos (visible mientras se procesan)
+        html.Div(id='import-progreso', style={'display': 'none'}, children=[
+            Paper(p="md", withBorder=True, shadow="md", radius="lg", mb=20, children=[
+                Text("Leyendo archivos...", id='import-progreso-texto', size="sm", mb=5),
+                dmc.Progress(id='import-progreso-barra', value=0, striped=True, animated=True),
+            ]),
+            dcc.Interval(id='import-progreso-intervalo', interval=500, disabled=True),
+        ]),
         html.Div(id='import-step-4'),
         html.Div(id='import-step-5'),
     ])
 
 
+def resumen_importacion(importacion):
+    """Tarjeta con el resultado de importar_archivos: tiempos, archivos con error y avisos."""
+    tiempos = importacion["tiempos"]
+    lento = max(tiempos, key=tiempos.get) if tiempos else None
+    filas = [Text(f"{len(tiempos)} archivos en {importacion['segundos']:.2f} s "
+                  f"({1000 * sum(tiempos.values()) / max(len(tiempos), 1):.0f} ms por archivo"
+                  + (f"; el más lento, {lento}: {1000 * tiempos[lento]:.0f} ms)" if lento else ")"), size="sm")]
+    if importacion["fallidos"]:
+        filas.append(Alert(
+            title=f"{len(importacion['fallidos'])} archivos no se han importado",
+            c="red",
+            icon=DashIconify(icon="mdi:alert-circle"),
+            children=[Text(f"{archivo}: {motivo}", size="sm") for archivo, motivo in importacion["fallidos"].items()]
+        ))
+    avisos = {archivo: mensajes for archivo, mensajes in importacion["avisos"].items()
+              if archivo not in importacion["fallidos"]}
+    if avisos:
+        filas.append(Alert(
+            title=f"Avisos en {len(avisos)} archivos",
+            c="yellow",
+            icon=DashIconify(icon="mdi:alert"),
+            children=[Text(f"{archivo}: {mensaje}", size="sm")
+                      for archivo, mensajes in avisos.items() for mensaje in mensajes]
+        ))
+    return Card(
+        withBorder=True, shadow="sm", radius="md", mb=15,
+        children=[
+            CardSection(
+                withBorder=True, inheritPadding=True, pb="xs",
+                children=[
+                    Group([
+                        DashIconify(icon="mdi:file-check", width=20, color="#1976d2"),
+                        Text("Archivos importados", fw=500),
+                    ], gap="xs"),
+                ]
+            ),
+            CardSection(inheritPadding=True, py="xs", children=[Stack(children=filas, gap="xs")])
+        ]
+    )
+
+
 # Callbacks para manejar la lógica del wizard
 def register_callbacks(app):
     # Paso 2 - Selección del importador y el index_0
@@ -116,9 +166,8 @@ def register_callbacks(app):
                 # Leer y almacenar el archivo JSON en 'tubo'
                 file_path = os.path.join(data_path, selected_files)
                 try:
-                    with open(file_path, 'r') as json_file:
-                        tempo_tubo = json.load(json_file)
-                except json.JSONDecodeError as e:
+                    tempo_tubo = cargar_tubo(file_path)  # JSON o binario (.tubo)
+                except ValueError as e:  # incluye json.JSONDecodeError
                     return Alert(
                         title="Error de formato JSON",
                         c="red",
@@ -393,6 +442,20 @@ def register_callbacks(app):
 
         return Text("No se han seleccionado archivos.", c="dimmed", fs="italic", size="sm")  # v2: fs en lugar de italic
 
+    # Progreso de la importación mientras se ejecuta el paso 4
+    @app.callback(
+        [Output('import-progreso-barra', 'value'),
+         Output('import-progreso-texto', 'children')],
+        Input('import-progreso-intervalo', 'n_intervals'),
+        prevent_initial_call=True
+    )
+    def update_import_progress(n_intervals):
+        estado = estado_importacion()
+        if not estado['activa'] or not estado['total']:
+            return 0, "Leyendo archivos..."
+        return (100 * estado['terminados'] / estado['total'],
+                f"Importando archivos: {estado['terminados']} de {estado['total']} ({estado['archivo'] or ''})")
+
     # Paso 4. Cálculo, pintado y selección de opciones de campaña
     # callback_04 - es la principal, se calculan los valores de la campaña
     @app.callback(
@@ -405,6 +468,8 @@ def register_callbacks(app):
         State('tubo', 'data'),
         State('index_0-input', 'value'),
         State('importar-checkbox-reference', 'checked')],
+        running=[(Output('import-progreso', 'style'), {'display': 'block'}, {'display': 'none'}),
+                 (Output('import-progreso-intervalo', 'disabled'), False, True)],
         prevent_initial_call=True
     )
     def execute_function_third(n_clicks, selected_value, uploaded_contents, uploaded_files, tubo, index_0, checkbox_ref_value):
@@ -431,24 +496,17 @@ def register_callbacks(app):
                 if isinstance(uploaded_contents, str):
                     uploaded_contents = [uploaded_contents]
 
+                # Los importadores leen cada archivo en streaming desde sus bytes
                 input_files = []
                 for content, filename in zip(uploaded_contents, uploaded_files):
                     content_type, content_string = content.split(',')
-                    decoded = base64.b64decode(content_string)
-                    lines = decoded.decode('utf-8').splitlines()
-                    input_files.append({'filename': filename, 'lines': lines})
+                    input_files.append({'filename': filename, 'contenido': base64.b64decode(content_string)})
 
                 # Valores del tubo por defecto que se usan en el importador
                 cota = tubo['info']['cota_1000'] # la cota se define en el archivo de configuración json
 
-                # Condicional dependiendo del importador seleccionado
-                if selected_value == 'RST':
-                    result = import_RST(input_files, index_0, cota)
-                elif selected_value == 'Sisgeo':
-                    result = import_Sisgeo(input_files, index_0, cota)
-                elif selected_value == 'Soil (dux)':
-                    result = import_soil_dux(input_files, index_0, cota)
-                else:
+                # Importador seleccionado
+                if selected_value not in ITERADORES:
                     return Alert(
                         title="Importador no reconocido",
                         c="red",
@@ -458,6 +516,18 @@ def register_callbacks(app):
                         ]
                     ), None
 
+                # Cada archivo se importa por separado, en paralelo: los que fallan no detienen al resto
+                importacion = importar_archivos(selected_value, input_files, index_0, cota)
+                result = importacion["campanas"]
+                if not result:
+                    return Alert(
+                        title="No se ha importado ninguna campaña",
+                        c="red",
+                        icon=DashIconify(icon="mdi:alert-circle"),
+                        children=[Text(f"{archivo}: {motivo}", size="sm")
+                                  for archivo, motivo in importacion["fallidos"].items()]
+                    ), None
+
                 fechas_agg = []
                 for clave in result.keys():
                     if es_fecha_isoformat(clave):
@@ -484,11 +554,9 @@ def register_callbacks(app):
                         tubo[fecha]["campaign_info"]["reference"] = True
                     else:
                         tubo[fecha]["campaign_info"]["reference"] = False
-                    # Calcular la referencia anterior a fecha
-                    fecha_referencia = buscar_referencia(tubo, fecha)
-
 
-                    calcular_incrementos(tubo, fecha, fecha_referencia)
+                # Recalcula en una pasada desde la primera fecha añadida, arrastrando referencia y campaña anterior
+                recalcular_tubo(tubo, desde=primera_fecha)
 
                 # Crear el nuevo diccionario 'camp_added' con solo las claves en fechas_agg
                 camp_added = {clave: tubo[clave] for clave in fechas_agg if clave in tubo}
@@ -501,9 +569,9 @@ def register_callbacks(app):
 
                 # Solo evaluar umbrales si existe la estructura completa
                 if umbrales.get('deformadas') and umbrales.get('valores'):
-                    eval_por_fecha = {fecha: evaluar_umbrales(tubo[fecha]['calc'], umbrales)
-                                      for fecha in fechas_agg
-                                      }
+                    # todas las campañas nuevas a la vez (matriz campañas x profundidades)
+                    eval_por_fecha = {fecha: evaluacion["alarma"]
+                                      for fecha, evaluacion in evaluar_tubo(tubo, fechas_agg).items()}
                 else:
                     # Valores por defecto si no hay umbrales configurados
                     eval_por_fecha = {fecha: None for fecha in fechas_agg}
@@ -588,6 +656,8 @@ def register_callbacks(app):
                                 DashIconify(icon="mdi:clipboard-check", width=24, color="#1976d2"),
                                 Text("Paso 4: Configurar campañas importadas", fw=700, size="lg"),
                             ], gap="xs", mb=10),
+                            # Resumen de la importación de archivos
+                            resumen_importacion(importacion),
                             # Gráficos
                             Card(
                                 withBorder=True, shadow="sm", radius="md", mb=15,
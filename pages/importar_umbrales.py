@@ -9,6 +9,9 @@ from pathlib import Path
 from dash_iconify import DashIconify
 from dash_mantine_components import NumberInput
 
+from utils.alarmas_historicas import guardar_umbrales
+from utils.tubo_binario import cargar_tubo_bytes
+
 
 def round_numbers_in_dict(obj, decimals=2):
     if isinstance(obj, dict):
@@ -41,7 +44,7 @@ def layout():
                         leftSection=DashIconify(icon="fa-solid:file-upload"),
                         variant="outline"
                     ),
-                    multiple=False, accept='.json'
+                    multiple=False, accept='.json,.tubo'
                 ),
                 dmc.Alert(id='i-json-info', title="", c="blue", hide=True)
             ]),
@@ -108,7 +111,7 @@ def register_callbacks(app):
         try:
             _, content_string = contents.split(',')
             decoded = base64.b64decode(content_string)
-            datos_json = json.loads(decoded)
+            datos_json = cargar_tubo_bytes(decoded, filename)  # JSON (con su diario) o binario (.tubo)
             if not isinstance(datos_json, dict):
                 raise ValueError("El archivo JSON no contiene un objeto válido")
             return (f"Archivo JSON cargado: {filename}", False, False, datos_json, filename)
@@ -308,9 +311,9 @@ def register_callbacks(app):
             ruta_script = Path(__file__).resolve().parent.parent
             ruta_data = ruta_script / "data"
             ruta_json = ruta_data / filename
-            with open(ruta_json, 'w', encoding='utf-8') as f:
-                json.dump(datos_json, f, ensure_ascii=False, indent=4,
-                          default=lambda o: o.item() if hasattr(o, 'item') else str(o))
-            return ("Archivo JSON guardado con éxito", "green", False)
+            # guarda los umbrales y las campañas cuya alarma cambia con ellos (JSON o binario, según el archivo)
+            resultado = guardar_umbrales(str(ruta_json), datos_json)
+            return (f"Archivo JSON guardado con éxito. Alarmas reevaluadas: {len(resultado['alarmas'])} campañas "
+                    f"con alarma, {len(resultado['cambiadas'])} actualizadas", "green", False)
         except Exception as e:
             return (f"Error al guardar: {e}", "red", False)
\ No newline at end of file
@@ -49,6 +49,13 @@ def layout():
                     "/graficar",
                     "#228be6"
                 ),
+                _crear_tarjeta_modulo(
+                    "Proyecto",
+                    "Estado y alarmas de todos los tubos",
+                    "mdi:view-dashboard",
+                    "/proyecto",
+                    "#15aabf"
+                ),
                 _crear_tarjeta_modulo(
                     "Correcciones",
                     "Corrige bias y elimina spikes",
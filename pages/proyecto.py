@@ -0,0 +1,103 @@
+# pages/proyecto.py
+"""
+Vista general del proyecto: un resumen por cada tubo de data/ (última campaña, referencia, máximo
+desplazamiento y umbral superado por la última campaña activa).
+Los datos salen de la tabla resumen del repositorio SQLite (utils/repositorio_tubos.py), que se
+actualiza al importar y al guardar correcciones o umbrales; la página no abre ningún tubo.
+"""
+
+from dash import html
+from dash.dependencies import Input, Output
+import dash_mantine_components as dmc
+from dash_iconify import DashIconify
+
+from utils.repositorio_tubos import sincronizar_repositorio, resumen_proyecto
+
+
+def _fecha(fecha):
+    return fecha.replace("T", " ")[:16] if fecha else "-"
+
+
+def _desp(valor):
+    return f"{valor:.2f}" if valor is not None else "-"
+
+
+def _estado(tubo):
+    # badge con el umbral superado, en el color de su deformada
+    if tubo["nivel"] is not None:
+        return dmc.Badge(f'{tubo["umbral"]} (nivel {tubo["nivel"]})', color=tubo["color"] or "red", variant="filled")
+    if tubo["fecha_actual"] is None:
+        return dmc.Badge("Sin campañas activas", color="gray", variant="light")
+    return dmc.Badge("Sin alarma", color="green", variant="light")
+
+
+def contenido_proyecto():
+    """Tarjetas de totales y tabla de tubos a partir del resumen del repositorio."""
+    avisos = []
+    try:
+        sincronizacion = sincronizar_repositorio()  # sólo lee los archivos que han cambiado
+        tubos = resumen_proyecto()
+    except Exception as e:
+        return dmc.Alert(f"No se pudo leer el repositorio de tubos: {e}", color="red", title="Error")
+    for nombre, motivo in sincronizacion["errores"].items():
+        avisos.append(dmc.Text(f"{nombre}: {motivo}", size="sm", c="red"))
+
+    en_alarma = sum(1 for tubo in tubos if tubo["nivel"] is not None)
+    sin_activas = sum(1 for tubo in tubos if tubo["fecha_actual"] is None)
+    totales = dmc.SimpleGrid(cols=3, spacing="lg", mb=20, children=[
+        dmc.Paper(p="md", withBorder=True, radius="md", children=[
+            dmc.Text("Tubos", c="dimmed", size="sm"), dmc.Text(str(len(tubos)), fw=700, size="xl")]),
+        dmc.Paper(p="md", withBorder=True, radius="md", children=[
+            dmc.Text("En alarma", c="dimmed", size="sm"), dmc.Text(str(en_alarma), fw=700, size="xl", c="red")]),
+        dmc.Paper(p="md", withBorder=True, radius="md", children=[
+            dmc.Text("Sin campañas activas", c="dimmed", size="sm"), dmc.Text(str(sin_activas), fw=700, size="xl")]),
+    ])
+
+    cabecera = ["Tubo", "Sensor", "Campañas (activas)", "Última campaña", "Última activa", "Referencia",
+                "Máx. |desp A| (mm)", "Máx. |desp B| (mm)", "Estado"]
+    filas = [
+        html.Tr([
+            html.Td(tubo["nombre"]),
+            html.Td(tubo["nom_sensor"] or "-"),
+            html.Td(f'{tubo["num_campanas"]} ({tubo["num_activas"]})'),
+            html.Td(_fecha(tubo["ultima_fecha"])),
+            html.Td(_fecha(tubo["fecha_actual"])),
+            html.Td(_fecha(tubo["fecha_referencia"])),
+            html.Td(_desp(tubo["max_desp_a"])),
+            html.Td(_desp(tubo["max_desp_b"])),
+            html.Td(_estado(tubo)),
+        ])
+        for tubo in tubos
+    ]
+    tabla = dmc.Table(
+        [html.Thead(html.Tr([html.Th(titulo) for titulo in cabecera])), html.Tbody(filas)],
+        striped=True,
+        highlightOnHover=True,
+        withTableBorder=True,
+    )
+    return html.Div([totales, *avisos, tabla])
+
+
+def layout():
+    return dmc.Container([
+        dmc.Group([
+            DashIconify(icon="mdi:view-dashboard", width=40, color="#1976d2"),
+            dmc.Title("Proyecto", order=1),
+        ], gap="md", mb=10),
+        dmc.Group([
+            dmc.Text("Estado de todos los tubos de data/ según su última campaña activa.", c="dimmed"),
+            dmc.Button("Actualizar", id="proyecto-actualizar", leftSection=DashIconify(icon="mdi:refresh"),
+                       variant="light"),
+        ], justify="space-between", mb=20),
+        html.Div(id="proyecto-contenido", children=contenido_proyecto()),
+    ], fluid=True)
+
+
+def register_callbacks(app):
+    @app.callback(
+        Output("proyecto-contenido", "children"),
+        Input("proyecto-actualizar", "n_clicks"),
+        prevent_initial_call=True,
+    )
+    def actualizar_proyecto(n_clicks):
+        return contenido_proyecto()
@@ -0,0 +1,106 @@
+# procesar_lecturas.py
+
+# Procesado de lecturas sin la aplicación (p. ej. una tarea programada cada noche):
+# importar -> recalcular -> evaluar umbrales -> guardar el tubo -> informes.
+# python procesar_lecturas.py lecturas/
+# python procesar_lecturas.py lecturas/ --tubos "IN-*.json" --alarmas alarmas.json --plantilla Incli_L9_BCN -o informes
+# python procesar_lecturas.py data/RST/IN-E09-16 --tubos IN-E09-16.json --importador RST --index-0 1000
+# No importa Dash: sólo utils.ingesta y utils.informes.
+
+
+import argparse
+import json
+import sys
+import time
+
+from utils.informes import cargar_plantilla, expandir_rutas_tubos, generar_informes_lote
+from utils.ingesta import EXTENSIONES_LECTURAS, ingerir_lecturas
+
+
+def _mostrar_ingesta(resultado):
+    if resultado["error"]:
+        print(f"ERROR {resultado['segundos']:7.2f} s  {resultado['tubo']}: {resultado['error']}", flush=True)
+        return
+    print(f"OK    {resultado['segundos']:7.2f} s  {resultado['tubo']} ({resultado['importador']}): "
+          f"{len(resultado['nuevas'])} campañas nuevas, {len(resultado['guardadas'])} guardadas", flush=True)
+    for archivo, motivo in resultado["fallidos"].items():
+        print(f"        ARCHIVO CON ERROR {archivo}: {motivo}", flush=True)
+    for fecha, alarma in resultado["alarmas"].items():
+        print(f"        ALARMA {fecha}: {alarma}", flush=True)
+
+
+def _mostrar_progreso(resultado_archivo, terminados, total):
+    # en stderr, para no mezclarse con el informe (y porque stdout se descarta mientras se importa);
+    # sólo en una terminal, no en el log de una tarea programada
+    if not sys.stderr.isatty():
+        return
+    final = "\n" if terminados == total else ""
+    sys.stderr.write(f"\r  {terminados}/{total} archivos ({resultado_archivo['filename']}){' ' * 20}{final}")
+    sys.stderr.flush()
+
+
+def _mostrar_informe(resultado):
+    estado = "ERROR" if resultado["error"] else ("AVISO" if resultado["avisos"] else "OK")
+    destino = resultado["error"] or resultado["pdf"]
+    print(f"{estado:5} {resultado['segundos']:7.2f} s  {resultado['tubo']} -> {destino}", flush=True)
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Importa lecturas en los tubos, evalúa umbrales y genera informes.")
+    parser.add_argument("lecturas", help="carpeta de lecturas, con una subcarpeta por tubo (nombre del archivo o nom_sensor)")
+    parser.add_argument("--tubos", nargs="+", default=["*"],
+                        help="rutas o patrones glob de los tubos (relativos a data/; por defecto todos)")
+    parser.add_argument("--importador", choices=list(EXTENSIONES_LECTURAS), default=None,
+                        help="importador (por defecto el de la última campaña de cada tubo)")
+    parser.add_argument("--index-0", type=int, default=None, help="index_0 de las campañas nuevas")
+    parser.add_argument("--alarmas", default=None, help="archivo JSON donde escribir las alarmas de las campañas nuevas")
+    parser.add_argument("--plantilla", default=None, help="plantilla para el informe de los tubos con campañas nuevas")
+    parser.add_argument("-o", "--salida", default="informes", help="carpeta de los informes (por defecto: informes)")
+    parser.add_argument("-j", "--procesos", type=int, default=None,
+                        help="procesos para importar los archivos y generar los informes (por defecto los núcleos)")
+    parser.add_argument("--detalle", action="store_true", help="mostrar la salida de importadores y scripts")
+    args = parser.parse_args(argumentos)
+
+    plantilla = None
+    if args.plantilla:
+        try:
+            plantilla = cargar_plantilla(args.plantilla)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"No se pudo cargar la plantilla {args.plantilla}: {e}")
+            return 2
+    rutas = expandir_rutas_tubos(args.tubos)
+    if not rutas:
+        print("No se ha encontrado ningún tubo")
+        return 2
+
+    inicio = time.perf_counter()
+    print(f"Importando lecturas de {args.lecturas} ({len(rutas)} tubos)")
+    resultados = ingerir_lecturas(args.lecturas, rutas, importador=args.importador, index_0=args.index_0,
+                                  detalle=args.detalle, procesos=args.procesos, al_importar=_mostrar_progreso,
+                                  al_terminar=_mostrar_ingesta)
+    fallidos = [resultado for resultado in resultados if resultado["error"]]
+    actualizados = [resultado["tubo"] for resultado in resultados if resultado["nuevas"]]
+    alarmas = [{"tubo": resultado["tubo"], "fecha": fecha, "alarma": alarma}
+               for resultado in resultados for fecha, alarma in resultado["alarmas"].items()]
+    print(f"\n{len(resultados)} tubos con lecturas, {len(actualizados)} actualizados, {len(fallidos)} con error, "
+          f"{len(alarmas)} alarmas")
+
+    if args.alarmas:
+        with open(args.alarmas, "w", encoding="utf-8") as f:
+            json.dump(alarmas, f, ensure_ascii=False, indent=4)
+        print(f"Alarmas guardadas en {args.alarmas}")
+
+    if plantilla is not None and actualizados:
+        print(f"\nGenerando {len(actualizados)} informes en {args.salida}")
+        informes = generar_informes_lote(plantilla, actualizados, args.salida, procesos=args.procesos,
+                                         detalle=args.detalle, al_terminar=_mostrar_informe)
+        fallidos += [resultado for resultado in informes if resultado["error"]]
+
+    print(f"\nTerminado en {time.perf_counter() - inicio:.2f} s")
+    for resultado in fallidos:
+        print(f"  {resultado['tubo']}: {resultado['error']}")
+    return 1 if fallidos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
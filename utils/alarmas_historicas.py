@@ -0,0 +1,112 @@
+# utils/alarmas_historicas.py
+
+import argparse
+import os
+import sys
+import time
+
+from utils.funciones_importar import parse_alarm_val
+from utils.tubo_binario import cargar_tubo, guardar_campanas, guardar_tubo
+from utils.umbrales_compilados import evaluar_tubo
+
+# Reevaluación de las alarmas de todo el histórico de un tubo con sus umbrales actuales.
+# campaign_info.alarm sólo se rellena al importar cada campaña, así que al cambiar los umbrales
+# (página importar_umbrales) las campañas anteriores se quedaban con la alarma de los umbrales viejos.
+# reevaluar_alarmas evalúa todas las campañas con calc en una sola llamada a evaluar_tubo (matriz
+# campañas x profundidades) y deja en el campaign_info de cada una:
+#   alarm: nivel de la curva superada de mayor nivel (como al importar), None si no supera ninguna;
+#   alarm_since: fecha de la primera campaña activa que superó esa curva (la propia campaña si no
+#     hay ninguna anterior);
+#   alarm_depth: depth del primer punto en que la supera.
+# Sólo se escriben las campañas en que ha cambiado algo (guardar_campanas), así que volver a evaluar
+# con los mismos umbrales no reescribe ninguna campaña.
+# python -m utils.alarmas_historicas data/tubo.json [data/otro.tubo ...]
+
+CLAVES_ALARMA = ('alarm', 'alarm_since', 'alarm_depth')
+
+
+def reevaluar_alarmas(tubo):
+    """
+    Reevalúa los umbrales del tubo en todas sus campañas con calc y actualiza su campaign_info.
+
+    Returns:
+        dict: {"cambiadas", "alarmas", "primeras"}. cambiadas son las campañas cuyo campaign_info ha
+        cambiado, alarmas {fecha: nivel} las que superan algún umbral y primeras {umbral: fecha} la
+        primera campaña activa que supera cada curva.
+    """
+    evaluacion = evaluar_tubo(tubo)
+    cambiadas, alarmas, primeras = [], {}, {}
+    for fecha in sorted(evaluacion):
+        campaign_info = tubo[fecha].get('campaign_info')
+        if not isinstance(campaign_info, dict):
+            continue
+        resultado = evaluacion[fecha]
+        if campaign_info.get('active') == True:
+            for umbral in resultado["superadas"]:
+                primeras.setdefault(umbral, fecha)
+
+        nivel = parse_alarm_val(resultado["alarma"])
+        nuevo = {'alarm': nivel,
+                 'alarm_since': primeras.get(resultado["umbral"], fecha) if resultado["alarma"] else None,
+                 'alarm_depth': resultado["depth"]}
+        if any(clave not in campaign_info or campaign_info[clave] != valor for clave, valor in nuevo.items()):
+            campaign_info.update(nuevo)
+            cambiadas.append(fecha)
+        if nivel is not None:
+            alarmas[fecha] = nivel
+    return {"cambiadas": cambiadas, "alarmas": alarmas, "primeras": primeras}
+
+
+def guardar_umbrales(ruta, tubo, umbrales=None):
+    """
+    Guarda los umbrales del tubo (los indicados o los que ya tiene) y reevalúa las alarmas de todas
+    sus campañas. Si el archivo existe sólo se escriben los umbrales y las campañas que han cambiado.
+
+    Returns:
+        dict: el de reevaluar_alarmas, con "segundos".
+    """
+    inicio = time.perf_counter()
+    if umbrales is not None:
+        tubo['umbrales'] = umbrales
+    resultado = reevaluar_alarmas(tubo)
+    if os.path.exists(ruta):
+        guardar_campanas(ruta, tubo, ['umbrales'] + resultado["cambiadas"])
+    else:
+        guardar_tubo(tubo, ruta)
+    resultado["segundos"] = time.perf_counter() - inicio
+    return resultado
+
+
+def reevaluar_archivo(ruta):
+    """Reevalúa las alarmas del tubo guardado en ruta y escribe sólo las campañas que cambian."""
+    inicio = time.perf_counter()
+    tubo = cargar_tubo(ruta)
+    resultado = reevaluar_alarmas(tubo)
+    if resultado["cambiadas"]:
+        guardar_campanas(ruta, tubo, resultado["cambiadas"])
+    resultado["segundos"] = time.perf_counter() - inicio
+    return resultado
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Reevalúa las alarmas de todas las campañas con los umbrales del tubo.")
+    parser.add_argument("tubos", nargs="+", help="archivos de los tubos (JSON o binario)")
+    args = parser.parse_args(argumentos)
+
+    errores = 0
+    for ruta in args.tubos:
+        try:
+            resultado = reevaluar_archivo(ruta)
+        except Exception as e:
+            print(f"ERROR {ruta}: {type(e).__name__}: {e}")
+            errores += 1
+            continue
+        print(f"OK    {resultado['segundos']:7.2f} s  {ruta}: {len(resultado['alarmas'])} campañas con alarma, "
+              f"{len(resultado['cambiadas'])} cambiadas")
+        for umbral, fecha in resultado["primeras"].items():
+            print(f"        {umbral}: superado desde {fecha}")
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
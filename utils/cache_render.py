@@ -0,0 +1,181 @@
+# utils/cache_render.py
+
+import hashlib
+import json
+import os
+import pickle
+import stat
+import tempfile
+
+from utils.cargador_plugins import firma_plugin
+
+# Caché en disco de los gráficos y tablas renderizados para los informes PDF.
+# Cada trabajo de generate_pdf_from_template (script, parámetros ya resueltos, tamaño y formato) se
+# identifica por un hash de su contenido junto con la firma de la carpeta del script (mtime y tamaño de
+# sus .py, la misma que usa cargador_plugins), la de utils/ (los módulos que importan los scripts y el
+# propio generador) y la huella de los datos del informe. Si nada de eso cambia, el resultado es el
+# mismo y se lee de disco: volver a exportar un informe en el que sólo ha cambiado un texto no vuelve a
+# ejecutar ningún script, y actualizar la aplicación invalida las entradas anteriores.
+# Cada resultado es un archivo <clave>.<ext>: las imágenes PNG y SVG se guardan tal cual (.png, .svg),
+# las tablas en JSON (.json) y sólo lo que no tiene otra forma (los Drawing de ReportLab del formato
+# vectorial) con pickle (.pkl). Al leerlo se actualiza su mtime y, cuando la carpeta supera
+# MAX_BYTES_CACHE_RENDER, se borran los usados hace más tiempo (LRU).
+# La carpeta es del usuario (en su carpeta de caché, no en el temporal compartido) y se crea con permisos
+# 0700; en POSIX no se usa si es de otro usuario o pueden escribir otros, y se descartan las entradas
+# que no son del usuario, para que nadie pueda dejar un pickle que la aplicación cargue.
+
+
+def _directorio_usuario():
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "incli_cache_render")
+
+
+DIRECTORIO_CACHE_RENDER = _directorio_usuario()
+MAX_BYTES_CACHE_RENDER = 256 * 1024 * 1024
+VERSION_CACHE_RENDER = 2  # cambiarla invalida las entradas existentes (p. ej. si cambian los resultados)
+EXTENSIONES_CACHE = (".png", ".svg", ".json", ".pkl")
+
+
+def _es_del_usuario(estado):
+    # en Windows la carpeta del perfil ya es privada; en POSIX se comprueba el propietario
+    return not hasattr(os, "getuid") or estado.st_uid == os.getuid()
+
+
+def _directorio_seguro(directorio, crear=False):
+    """Carpeta de la caché si es del usuario y sólo él puede escribir en ella; None si no se puede usar."""
+    try:
+        if crear:
+            os.makedirs(directorio, mode=0o700, exist_ok=True)
+        estado = os.lstat(directorio)
+    except FileNotFoundError:
+        return None
+    if stat.S_ISLNK(estado.st_mode) or not stat.S_ISDIR(estado.st_mode) or not _es_del_usuario(estado):
+        print(f"La caché de render {directorio} no es una carpeta del usuario, no se usa")
+        return None
+    if hasattr(os, "getuid") and estado.st_mode & 0o077:
+        os.chmod(directorio, 0o700)  # es nuestra: se cierra a los demás
+    return directorio
+
+
+def huella_datos(data_source):
+    """Hash del contenido de los datos del informe (se calcula una vez por informe)."""
+    serializado = json.dumps(data_source, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(serializado.encode("utf-8")).hexdigest()
+
+
+def clave_render(trabajo, huella):
+    """
+    Clave de un trabajo de renderizado.
+
+    Args:
+        trabajo (tuple): (tipo, script, parámetros, ...) como los de trabajo_grafico y trabajo_tabla.
+        huella (str): huella_datos de los datos del informe.
+    """
+    tipo, script_path, params = trabajo[:3]
+    contenido = json.dumps([VERSION_CACHE_RENDER, tipo, os.path.realpath(script_path), firma_plugin(script_path),
+                            firma_plugin(__file__), params, list(trabajo[3:]),
+                            huella], sort_keys=True, default=str)
+    return hashlib.sha1(contenido.encode("utf-8")).hexdigest()
+
+
+def _serializar(resultado):
+    # (extensión, bytes) de un resultado
+    if (isinstance(resultado, tuple) and len(resultado) == 2 and resultado[0] in ("png", "svg")
+            and isinstance(resultado[1], bytes)):
+        return "." + resultado[0], resultado[1]
+    try:
+        texto = json.dumps(resultado, ensure_ascii=False)
+        if json.loads(texto) == resultado:  # sólo si vuelve igual (sin tuplas, numpy...)
+            return ".json", texto.encode("utf-8")
+    except (TypeError, ValueError):
+        pass
+    return ".pkl", pickle.dumps(resultado, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _deserializar(extension, contenido):
+    if extension in (".png", ".svg"):
+        return (extension[1:], contenido)
+    if extension == ".json":
+        return json.loads(contenido.decode("utf-8"))
+    return pickle.loads(contenido)
+
+
+def _leer_propio(ruta):
+    # contenido del archivo si es del usuario (sin seguir enlaces); ValueError si no
+    fd = os.open(ruta, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0) | getattr(os, "O_BINARY", 0))
+    with os.fdopen(fd, "rb") as f:
+        if not _es_del_usuario(os.fstat(f.fileno())):
+            raise ValueError("no es del usuario")
+        return f.read()
+
+
+def leer_render(clave, directorio=None):
+    """Resultado guardado con esa clave, o None si no está en la caché (o no se puede leer)."""
+    directorio = _directorio_seguro(directorio or DIRECTORIO_CACHE_RENDER)
+    if directorio is None:
+        return None
+    for extension in EXTENSIONES_CACHE:
+        ruta = os.path.join(directorio, clave + extension)
+        try:
+            resultado = _deserializar(extension, _leer_propio(ruta))
+            os.utime(ruta)  # usado ahora: es el último en expulsarse
+            return resultado
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            print(f"Entrada de la caché de render ilegible ({e}), se descarta")
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+            return None
+    return None
+
+
+def guardar_render(clave, resultado, directorio=None):
+    """Guarda el resultado en la caché (escritura atómica). Los errores sólo se notifican."""
+    temporal = None
+    try:
+        directorio = _directorio_seguro(directorio or DIRECTORIO_CACHE_RENDER, crear=True)
+        if directorio is None:
+            return
+        extension, contenido = _serializar(resultado)
+        fd, temporal = tempfile.mkstemp(dir=directorio, suffix=".tmp")  # mkstemp lo crea con permisos 0600
+        with os.fdopen(fd, "wb") as f:
+            f.write(contenido)
+        os.replace(temporal, os.path.join(directorio, clave + extension))
+    except Exception as e:
+        print(f"No se pudo guardar en la caché de render: {e}")
+        if temporal and os.path.exists(temporal):
+            os.remove(temporal)
+
+
+def recortar_cache_render(directorio=None, max_bytes=None):
+    """Borra las entradas usadas hace más tiempo hasta que la caché ocupa como mucho max_bytes."""
+    directorio = _directorio_seguro(directorio or DIRECTORIO_CACHE_RENDER)
+    if directorio is None:
+        return
+    max_bytes = MAX_BYTES_CACHE_RENDER if max_bytes is None else max_bytes
+    try:
+        with os.scandir(directorio) as entradas:
+            archivos = [(entrada.stat().st_mtime, entrada.stat().st_size, entrada.path) for entrada in entradas
+                        if entrada.name.endswith(EXTENSIONES_CACHE)]
+    except FileNotFoundError:
+        return
+    total = sum(tamano for _, tamano, _ in archivos)
+    for _, tamano, ruta in sorted(archivos):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+        total -= tamano
+
+
+def vaciar_cache_render(directorio=None):
+    """Elimina todas las entradas de la caché de render."""
+    recortar_cache_render(directorio, max_bytes=0)
@@ -0,0 +1,109 @@
+# utils/cache_tubos.py
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# Caché de tubos en el servidor.
+# En lugar de enviar el tubo completo al navegador en un dcc.Store (y recibirlo serializado en cada
+# callback), el tubo se guarda aquí y la Store sólo lleva su clave. La clave es el hash del contenido,
+# así que volver a subir el mismo archivo reutiliza la entrada. Se expulsan los tubos usados hace más
+# tiempo (LRU) cuando el tamaño estimado supera MAX_BYTES_CACHE.
+# Los tubos de la caché se comparten entre callbacks: no se deben modificar en el sitio.
+# Un tubo expulsado (o pedido a otro proceso del servidor, que tiene su propia caché) se vuelve a
+# construir desde su origen: la referencia que va a la Store lleva, junto a la clave, el origen del
+# tubo ({"tipo": ..., ...}) y registrar_recarga asocia a cada tipo la función que lo reconstruye. Sólo
+# se acepta el tubo reconstruido si su contenido es el mismo (misma clave); si no, obtener_tubo
+# devuelve None y la página debe pedir que se vuelva a cargar.
+
+MAX_BYTES_CACHE = 512 * 1024 * 1024
+FACTOR_MEMORIA = 8  # bytes en memoria (dicts y floats de Python) por byte de JSON compacto, aproximado
+
+_tubos = OrderedDict()  # clave -> (tubo, bytes estimados)
+_bytes_en_cache = 0
+_lock = threading.Lock()
+_recargas = {}  # tipo de origen -> función(origen) que devuelve el tubo o None
+
+
+def registrar_recarga(tipo, funcion):
+    """Registra la función que reconstruye los tubos con origen de ese tipo (ver guardar_tubo_en_cache)."""
+    _recargas[tipo] = funcion
+
+
+def _clave_y_tamano(tubo):
+    serializado = json.dumps(tubo, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha1(serializado).hexdigest(), len(serializado) * FACTOR_MEMORIA
+
+
+def guardar_tubo_en_cache(tubo, origen=None):
+    """
+    Guarda el tubo en la caché y devuelve su referencia para la dcc.Store.
+
+    Args:
+        tubo (dict): tubo en el esquema JSON.
+        origen (dict, optional): {"tipo": ..., ...} para reconstruirlo si se expulsa de la caché
+            (el tipo debe estar registrado con registrar_recarga).
+
+    Returns:
+        str: clave (hash del contenido) si no hay origen; dict {"clave", "origen"} si lo hay.
+    """
+    clave, tamano = _clave_y_tamano(tubo)
+    _insertar(clave, tubo, tamano)
+    return clave if origen is None else {"clave": clave, "origen": origen}
+
+
+def _insertar(clave, tubo, tamano):
+    global _bytes_en_cache
+    with _lock:
+        if clave in _tubos:
+            _tubos.move_to_end(clave)
+            return
+        _tubos[clave] = (tubo, tamano)
+        _bytes_en_cache += tamano
+        # se expulsan los más antiguos, pero nunca el que se acaba de guardar
+        while _bytes_en_cache > MAX_BYTES_CACHE and len(_tubos) > 1:
+            _, (_, tamano_expulsado) = _tubos.popitem(last=False)
+            _bytes_en_cache -= tamano_expulsado
+
+
+def obtener_tubo(referencia):
+    """
+    Tubo de una referencia de guardar_tubo_en_cache (clave o dict con origen).
+
+    Si ya no está en la caché se reconstruye desde su origen. Devuelve None si no hay referencia o el
+    tubo no está en la caché y no se puede reconstruir tal como era.
+    """
+    if not referencia:
+        return None
+    clave = referencia.get("clave") if isinstance(referencia, dict) else referencia
+    with _lock:
+        entrada = _tubos.get(clave)
+        if entrada is not None:
+            _tubos.move_to_end(clave)
+            return entrada[0]
+
+    origen = referencia.get("origen") if isinstance(referencia, dict) else None
+    recargar = _recargas.get(origen.get("tipo")) if isinstance(origen, dict) else None
+    tubo = None
+    if recargar is not None:
+        try:
+            tubo = recargar(origen)
+        except Exception as e:
+            print(f"No se pudo reconstruir el tubo {clave} desde {origen}: {type(e).__name__}: {e}")
+    if tubo is not None:
+        clave_recargada, tamano = _clave_y_tamano(tubo)
+        if clave_recargada == clave:
+            _insertar(clave, tubo, tamano)
+            return tubo
+        print(f"El origen del tubo {clave} ({origen}) ha cambiado desde que se cargó")
+    print(f"Tubo {clave} no está en la caché del servidor, hay que volver a cargar el archivo")
+    return None
+
+
+def vaciar_cache_tubos():
+    """Elimina todos los tubos de la caché."""
+    global _bytes_en_cache
+    with _lock:
+        _tubos.clear()
+        _bytes_en_cache = 0
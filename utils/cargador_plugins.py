@@ -0,0 +1,80 @@
+# utils/cargador_plugins.py
+
+import importlib.util
+import os
+import sys
+import threading
+
+# Cargador de los scripts de biblioteca_graficos y biblioteca_tablas.
+# Cada script se ejecuta una sola vez y el módulo se guarda en caché por ruta. La entrada lleva la
+# firma (mtime y tamaño) de todos los .py de la carpeta del script, así que al modificar el script o
+# su funciones.py se vuelve a cargar en la siguiente llamada (recarga en caliente).
+# Los módulos hermanos (p. ej. "funciones") se importan aislados: se quitan de sys.modules mientras se
+# ejecuta el script y se restauran después, para que cada script use el funciones.py de su carpeta y
+# una recarga no reutilice el de la carga anterior.
+
+_modulos = {}  # ruta real -> (firma, módulo)
+_lock = threading.RLock()
+
+
+def firma_plugin(ruta):
+    """Firma de la carpeta del script: (nombre, mtime, tamaño) de cada .py, ordenada."""
+    firma = []
+    with os.scandir(os.path.dirname(ruta)) as entradas:
+        for entrada in entradas:
+            if entrada.name.endswith(".py") and entrada.is_file():
+                estado = entrada.stat()
+                firma.append((entrada.name, estado.st_mtime_ns, estado.st_size))
+    return tuple(sorted(firma))
+
+
+def _ejecutar_plugin(ruta, nombre, firma):
+    """Ejecuta el script con su carpeta en sys.path y los módulos hermanos aislados."""
+    carpeta = os.path.dirname(ruta)
+    propio = os.path.basename(ruta)
+    hermanos = [archivo[:-3] for archivo, _, _ in firma if archivo != propio]
+    previos = {hermano: sys.modules.pop(hermano) for hermano in hermanos if hermano in sys.modules}
+    sys.path.insert(0, carpeta)
+    try:
+        spec = importlib.util.spec_from_file_location(nombre, ruta)
+        if spec is None:
+            raise ImportError(f"No se pudo crear spec para {ruta}")
+        modulo = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(modulo)
+        return modulo
+    finally:
+        sys.path.remove(carpeta)
+        for hermano in hermanos:
+            sys.modules.pop(hermano, None)
+        sys.modules.update(previos)
+
+
+def cargar_plugin(ruta, nombre=None):
+    """
+    Módulo del script ruta, ejecutándolo sólo si no está en caché o ha cambiado su carpeta.
+
+    Args:
+        ruta (str): ruta al archivo .py del script.
+        nombre (str): nombre del módulo (por defecto el nombre del archivo sin extensión).
+
+    Returns:
+        module: el módulo cargado. Los errores del script se propagan y no se guardan en caché.
+    """
+    ruta = os.path.realpath(ruta)
+    nombre = nombre or os.path.splitext(os.path.basename(ruta))[0]
+    with _lock:
+        firma = firma_plugin(ruta)
+        entrada = _modulos.get(ruta)
+        if entrada is not None and entrada[0] == firma:
+            return entrada[1]
+        if entrada is not None:
+            print(f"Script {os.path.basename(ruta)} modificado, se vuelve a cargar")
+        modulo = _ejecutar_plugin(ruta, nombre, firma)
+        _modulos[ruta] = (firma, modulo)
+        return modulo
+
+
+def vaciar_cache_plugins():
+    """Elimina todos los módulos de la caché (la siguiente carga vuelve a ejecutar los scripts)."""
+    with _lock:
+        _modulos.clear()
@@ -0,0 +1,118 @@
+# utils/cubo_temporal.py
+
+import numpy as np
+
+from utils.indice_temporal import TimelineIndex
+from utils.tubo_array import TuboArray
+
+# Cubo de series temporales del tubo: fechas x profundidades x variables.
+# Para un eje (cota_abs, depth o index) se ordenan las fechas cronológicamente y las profundidades de
+# menor a mayor, y se guarda para cada (fecha, profundidad) la columna del TuboArray donde está ese punto.
+# Las variables se materializan al pedirlas, como matrices fechas x profundidades, de modo que una serie
+# temporal es un slice: no se recorren los puntos de calc ni se comparan cadenas.
+# Se cachea por TuboArray y eje; el TuboArray cambia cuando cambian los datos del tubo.
+
+VARIABLES_DERIVADAS = ("desp_total",)  # no están en calc, se calculan a partir de desp_a y desp_b
+
+MAX_CUBOS_EN_CACHE = 6
+_cubos = []  # [(tubo_array, eje, cubo)], el más reciente al final
+
+
+class CuboTemporal:
+    """
+    Series temporales de un tubo para un eje.
+
+    Atributos:
+        eje (str): "cota_abs", "depth" o "index".
+        fechas (list): fechas ISO de las campañas, de más antigua a más reciente.
+        profundidades (np.ndarray): valores del eje presentes en alguna campaña, ordenados.
+        columnas (np.ndarray): int, fechas x profundidades, columna del TuboArray de cada punto (-1 si
+            la campaña no tiene esa profundidad).
+
+    Se obtiene con CuboTemporal.de_tubo(tubo, eje).
+    """
+
+    def __init__(self, tubo_array, fechas, eje):
+        self.eje = eje
+        self.fechas = list(fechas)
+        self._tubo_array = tubo_array
+        self._fila = {fecha: k for k, fecha in enumerate(self.fechas)}
+        self._filas_tubo = np.array([tubo_array.posicion(fecha) for fecha in self.fechas], dtype=np.intp)
+        self._matrices = {}
+
+        calc = tubo_array.valores['calc']
+        if eje in calc:
+            cotas = calc[eje][self._filas_tubo]
+        else:
+            cotas = np.full((len(self.fechas), len(tubo_array.indices)), np.nan)
+        filas, columnas = np.nonzero(~np.isnan(cotas))
+        self.profundidades = np.unique(cotas[filas, columnas])
+
+        self.columnas = np.full((len(self.fechas), len(self.profundidades)), -1, dtype=np.intp)
+        # si una campaña repite un valor del eje, vale el primer punto (se asigna en orden inverso)
+        posiciones = np.searchsorted(self.profundidades, cotas[filas, columnas])
+        self.columnas[filas[::-1], posiciones[::-1]] = columnas[::-1]
+
+    @classmethod
+    def de_tubo(cls, tubo, eje):
+        """Devuelve el cubo del tubo para el eje, construyéndolo sólo si no está ya en caché."""
+        tubo_array = TuboArray.de_tubo(tubo)
+        for k, (array_cache, eje_cache, cubo) in enumerate(_cubos):
+            if array_cache is tubo_array and eje_cache == eje:
+                _cubos.append(_cubos.pop(k))
+                return cubo
+        fechas = [fecha for fecha in TimelineIndex.de_tubo(tubo).fechas if fecha in tubo_array]
+        cubo = cls(tubo_array, fechas, eje)
+        _cubos.append((tubo_array, eje, cubo))
+        del _cubos[:-MAX_CUBOS_EN_CACHE]
+        return cubo
+
+    # Lectura --------------------------------------------------------------------------------------
+    def fila(self, fecha):
+        """Fila de la fecha en el cubo, o None."""
+        return self._fila.get(fecha)
+
+    def columna(self, profundidad):
+        """Columna de la profundidad (número o texto, como en el MultiSelect) en el cubo, o None."""
+        try:
+            valor = float(profundidad)
+        except (TypeError, ValueError):
+            return None
+        k = int(np.searchsorted(self.profundidades, valor))
+        return k if k < len(self.profundidades) and self.profundidades[k] == valor else None
+
+    def matriz(self, variable):
+        """Array fechas x profundidades de una variable de calc (o derivada), NaN donde no hay dato."""
+        if variable not in self._matrices:
+            calc = self._tubo_array.valores['calc']
+            if variable == "desp_total" and variable not in calc:
+                desp_a, desp_b = self.matriz("desp_a"), self.matriz("desp_b")
+                valores = np.round(np.sqrt(desp_a ** 2 + desp_b ** 2), 2)
+            elif variable in calc:
+                filas = self._filas_tubo[:, np.newaxis]
+                valores = np.where(self.columnas >= 0, calc[variable][filas, self.columnas], np.nan)
+            else:
+                valores = np.full(self.columnas.shape, np.nan)
+            self._matrices[variable] = valores
+        return self._matrices[variable]
+
+    def series(self, variables, profundidades, fechas=None):
+        """
+        Cubo fechas x profundidades x variables (NaN donde no hay dato).
+
+        Args:
+            variables (list): variables de calc o derivadas.
+            profundidades (list): valores del eje; las que no están en el tubo quedan a NaN.
+            fechas (list): fechas a extraer (por defecto todas, en orden cronológico); las que no
+                están en el cubo quedan a NaN.
+        """
+        filas = np.arange(len(self.fechas)) if fechas is None else \
+            np.array([self._fila.get(fecha, -1) for fecha in fechas], dtype=np.intp)
+        columnas = np.array([-1 if c is None else c for c in map(self.columna, profundidades)], dtype=np.intp)
+        cubo = np.stack([self.matriz(variable) for variable in variables], axis=-1) if variables else \
+            np.empty((len(self.fechas), len(self.profundidades), 0))
+        resultado = cubo[filas[:, np.newaxis], columnas[np.newaxis, :]] if len(self.fechas) and len(self.profundidades) \
+            else np.full((len(filas), len(columnas), len(variables)), np.nan)
+        resultado[filas < 0] = np.nan
+        resultado[:, columnas < 0] = np.nan
+        return resultado
@@ -0,0 +1,109 @@
+# utils/diario_tubo.py
+
+import json
+import os
+import tempfile
+
+# Diario de campañas de los tubos JSON.
+# Añadir campañas a un tubo JSON no reescribe el archivo: cada campaña se anota como una línea JSON
+# en <tubo>.json.diario, de modo que se escriben sólo los bytes de las campañas nuevas. Al cargar el
+# tubo se aplican las anotaciones sobre el JSON base. Cuando el diario crece se compacta: se escribe
+# el tubo completo en un temporal, se sustituye el JSON con os.replace y se borra el diario. Si el
+# proceso se interrumpe entre las dos cosas, volver a aplicar el diario no cambia el tubo.
+
+SUFIJO_DIARIO = ".diario"
+MAX_ENTRADAS_DIARIO = 50  # campañas anotadas antes de compactar
+FRACCION_MAX_DIARIO = 0.5  # o si el diario ocupa más de esta fracción del JSON base
+
+
+def ruta_diario(ruta):
+    """Ruta del diario del tubo JSON ruta."""
+    return str(ruta) + SUFIJO_DIARIO
+
+
+def anotar_campanas(ruta, campanas):
+    """
+    Anota campañas en el diario del tubo (una línea por campaña) y las sincroniza a disco.
+
+    Args:
+        ruta (str): tubo JSON.
+        campanas (dict): {clave: valor} a aplicar sobre el tubo (normalmente {fecha: campaña}).
+    """
+    with open(ruta_diario(ruta), "a+b") as f:
+        # si una escritura anterior se cortó a mitad de línea, se cierra para no estropear la siguiente
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+        for clave, valor in campanas.items():
+            f.write((json.dumps({"clave": clave, "valor": valor}) + "\n").encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def leer_diario(ruta):
+    """Anotaciones (clave, valor) del diario del tubo, en orden. Se ignoran las líneas incompletas."""
+    anotaciones = []
+    try:
+        with open(ruta_diario(ruta), "r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    anotacion = json.loads(linea)
+                    anotaciones.append((anotacion["clave"], anotacion["valor"]))
+                except (ValueError, KeyError, TypeError):
+                    print(f"Línea incompleta en el diario de {ruta}, se ignora")
+    except FileNotFoundError:
+        pass
+    return anotaciones
+
+
+def aplicar_diario(tubo, ruta):
+    """Aplica sobre tubo (en el sitio) las campañas anotadas en el diario de ruta."""
+    for clave, valor in leer_diario(ruta):
+        tubo[clave] = valor
+    return tubo
+
+
+def borrar_diario(ruta):
+    """Elimina el diario del tubo, si existe."""
+    try:
+        os.remove(ruta_diario(ruta))
+    except FileNotFoundError:
+        pass
+
+
+def necesita_compactar(ruta):
+    """El diario del tubo ha superado MAX_ENTRADAS_DIARIO campañas o FRACCION_MAX_DIARIO del JSON."""
+    diario = ruta_diario(ruta)
+    if not os.path.exists(diario):
+        return False
+    if os.path.getsize(diario) > FRACCION_MAX_DIARIO * os.path.getsize(ruta):
+        return True
+    with open(diario, "rb") as f:
+        return sum(1 for _ in f) > MAX_ENTRADAS_DIARIO
+
+
+def escribir_json_atomico(datos, ruta, **opciones_dump):
+    """Escribe datos como JSON en un temporal del mismo directorio y lo sustituye con os.replace."""
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    fd, temporal = tempfile.mkstemp(dir=directorio, suffix=".json.tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(datos, f, **opciones_dump)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def compactar_tubo_json(ruta):
+    """Incorpora el diario al JSON del tubo (escritura atómica) y borra el diario."""
+    with open(ruta, "r", encoding="utf-8") as f:
+        tubo = json.load(f)
+    aplicar_diario(tubo, ruta)
+    escribir_json_atomico(tubo, ruta, indent=4)
+    borrar_diario(ruta)
+    return tubo
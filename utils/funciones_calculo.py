@@ -0,0 +1,146 @@
+# utils/funciones_calculo.py
+
+import numpy as np
+
+# Motor vectorizado de cálculo de incrementos y desplazamientos de una campaña.
+# Las campañas se alinean por 'index' una sola vez (searchsorted) y los acumulados desde el fondo
+# del tubo se obtienen con sumas acumuladas inversas, en lugar de sumar la cola de la lista en cada
+# profundidad. Se mantienen las reglas de redondeo de calcular_incrementos: 4 decimales en checksums
+# y 2 decimales en el resto.
+
+# claves que calcula el motor, en el orden en que se insertan en cada punto de 'calc'
+CLAVES_INCREMENTOS = ['incr_checksum_a', 'incr_checksum_b', 'incr_dev_a', 'incr_dev_b',
+                      'incr_dev_abs_a', 'incr_dev_abs_b', 'abs_dev_a', 'abs_dev_b',
+                      'desp_a', 'desp_b']
+
+
+def alinear_por_indice(indices, indices_origen):
+    """
+    Posición en indices_origen de cada valor de indices.
+
+    Equivale a next(item for item in origen if item['index'] == index): devuelve la primera
+    aparición de cada índice, o -1 si no existe en el origen.
+
+    Args:
+        indices (array-like): índices a buscar.
+        indices_origen (array-like): índices de la campaña en la que se busca.
+
+    Returns:
+        np.ndarray: posiciones (int) en el origen, -1 donde no hay coincidencia.
+    """
+    indices = np.asarray(indices)
+    indices_origen = np.asarray(indices_origen)
+    if indices_origen.size == 0:
+        return np.full(indices.shape, -1, dtype=np.intp)
+
+    orden = np.argsort(indices_origen, kind='stable')  # estable: la primera aparición queda delante
+    ordenados = indices_origen[orden]
+    pos = np.searchsorted(ordenados, indices, side='left')
+    pos_valida = np.minimum(pos, ordenados.size - 1)
+    encontrado = (pos < ordenados.size) & (ordenados[pos_valida] == indices)
+    return np.where(encontrado, orden[pos_valida], -1)
+
+
+def suma_inversa(valores):
+    """Suma de cada elemento con todos los posteriores: s[i] = sum(valores[i:])."""
+    valores = np.asarray(valores)
+    return np.cumsum(valores[::-1])[::-1]
+
+
+def _columna(calc, clave):
+    # devuelve los valores de una clave de 'calc' como array float y la máscara de los que son float
+    # (los valores sin calcular quedan como 0 entero, igual que en el cálculo original)
+    valores = [punto.get(clave, 0) for punto in calc]
+    es_float = np.fromiter((isinstance(v, float) for v in valores), dtype=bool, count=len(valores))
+    return np.asarray(valores, dtype=float), es_float
+
+
+def _a_lista(valores, es_float):
+    # vuelve a tipos python: float donde algún sumando era float, entero donde todos eran enteros
+    # (p. ej. el 0 de los valores no calculados)
+    return [v if f else int(v) for v, f in zip(valores.tolist(), es_float.tolist())]
+
+
+def calcular_incrementos_calc(calc, calc_referencia, sin_incrementos, calc_abs=None, calc_desp=None):
+    """
+    Calcula, sobre el 'calc' de una campaña, las claves dependientes de la referencia y de la
+    campaña anterior (CLAVES_INCREMENTOS). Modifica calc en el sitio y lo devuelve.
+
+    Args:
+        calc (list): 'calc' de la campaña a calcular.
+        calc_referencia (list): 'calc' de la campaña de referencia.
+        sin_incrementos (bool): la campaña es referencia o la primera activa; los incrementos son cero.
+        calc_abs (list, optional): 'calc' de la campaña activa anterior del que se copian
+            incr_dev_abs_a/b cuando sin_incrementos es True.
+        calc_desp (list, optional): 'calc' cuyos desp_a/b se suman a los desplazamientos de la campaña
+            (la activa anterior si es referencia, la referencia en otro caso).
+
+    Returns:
+        list: calc con las claves calculadas.
+    """
+    n = len(calc)
+    indices = np.fromiter((punto['index'] for punto in calc), dtype=float, count=n)
+    dev = {eje: _columna(calc, f'dev_{eje}') for eje in 'ab'}
+
+    columnas = {clave: [0] * n for clave in CLAVES_INCREMENTOS}
+    incr_dev = {eje: (np.zeros(n), np.zeros(n, dtype=bool)) for eje in 'ab'}
+
+    if sin_incrementos:
+        # referencia o primera activa: se arrastran los incrementos absolutos de la campaña anterior
+        if calc_abs is not None:
+            pos = alinear_por_indice(indices, [punto['index'] for punto in calc_abs])
+            for i in np.flatnonzero(pos >= 0).tolist():
+                anterior = calc_abs[pos[i]]
+                columnas['incr_dev_abs_a'][i] = anterior.get('incr_dev_abs_a', 0)
+                columnas['incr_dev_abs_b'][i] = anterior.get('incr_dev_abs_b', 0)
+    else:
+        pos = alinear_por_indice(indices, [punto['index'] for punto in calc_referencia])
+        calculado = pos >= 0
+        filas = np.flatnonzero(calculado).tolist()
+        ref = [calc_referencia[j] for j in pos[calculado].tolist()]
+        for eje in 'ab':
+            checksum, checksum_float = _columna(calc, f'checksum_{eje}')
+            checksum_ref, checksum_ref_float = _columna(ref, f'checksum_{eje}')
+            dev_ref, dev_ref_float = _columna(ref, f'dev_{eje}')
+            abs_ref, abs_ref_float = _columna(ref, f'incr_dev_abs_{eje}')
+
+            incr_checksum = np.round(checksum[calculado] - checksum_ref, 4)
+            incr_checksum_float = checksum_float[calculado] | checksum_ref_float
+            valores, es_float = incr_dev[eje]
+            valores[calculado] = np.round(dev[eje][0][calculado] - dev_ref, 2)
+            es_float[calculado] = dev[eje][1][calculado] | dev_ref_float
+            incr_abs = np.round(valores[calculado] + abs_ref, 2)
+            incr_abs_float = es_float[calculado] | abs_ref_float
+
+            for clave, calculados in ((f'incr_checksum_{eje}', _a_lista(incr_checksum, incr_checksum_float)),
+                                      (f'incr_dev_{eje}', _a_lista(valores[calculado], es_float[calculado])),
+                                      (f'incr_dev_abs_{eje}', _a_lista(incr_abs, incr_abs_float))):
+                columna = columnas[clave]
+                for i, valor in zip(filas, calculados):
+                    columna[i] = valor
+
+    # Se suman los desplazamientos de la campaña de la que se parte
+    if calc_desp is not None:
+        pos_desp = alinear_por_indice(indices, [punto['index'] for punto in calc_desp])
+        hay_desp = pos_desp >= 0
+        base = [calc_desp[j] for j in pos_desp[hay_desp].tolist()]
+
+    for eje in 'ab':
+        # Envolvente del tubo y desplazamientos: acumulados desde el fondo
+        valores, es_float = dev[eje]
+        columnas[f'abs_dev_{eje}'] = _a_lista(np.round(suma_inversa(valores), 2), suma_inversa(es_float) > 0)
+
+        valores, es_float = incr_dev[eje]
+        desp = np.round(suma_inversa(valores), 2)
+        desp_float = suma_inversa(es_float) > 0
+        if calc_desp is not None:
+            base_desp, base_float = _columna(base, f'desp_{eje}')
+            desp[hay_desp] = np.round(desp[hay_desp] + base_desp, 2)
+            desp_float[hay_desp] |= base_float
+        columnas[f'desp_{eje}'] = _a_lista(desp, desp_float)
+
+    for i, punto in enumerate(calc):
+        for clave in CLAVES_INCREMENTOS:
+            punto[clave] = columnas[clave][i]
+
+    return calc
@@ -5,7 +5,11 @@ from datetime import datetime
 import plotly.colors as pcolors
 import os
 import random
-import bisect
+
+from utils.funciones_calculo import calcular_incrementos_calc, CLAVES_INCREMENTOS
+from utils.indice_temporal import TimelineIndex
+from utils.tubo_array import invalidar_tubo
+from utils.umbrales_compilados import UmbralesCompilados
 
 
 # función para los calculados directos de cada profundidad
@@ -48,73 +52,18 @@ def valores_calc_directos(index, cota_abs, depth, a0, a180, b0, b180, cte):
 ######################################################################################################################
 # cálculos acumulados y en función de la lectura cero
 def buscar_referencia(data, fecha_calc):
-    #fechas = sorted([datetime.fromisoformat(fecha) for fecha in data.keys() if fecha != 'info'])
-
-    fechas = sorted([
-        datetime.fromisoformat(fecha)
-        for fecha in data.keys()
-        if isinstance(fecha, str)  # Asegurar que es una cadena
-           and fecha.count('-') >= 2  # Un filtro rápido para evitar textos claramente no relacionados con fechas
-           and fecha.count('T') <= 1  # Para evitar entradas con múltiples "T" que no sean ISO
-           and all(c.isdigit() or c in "-T:." for c in fecha)  # Solo caracteres esperados en una fecha ISO
-           and fecha[0].isdigit()  # Asegurar que empieza con un número (año)
-           and '-' in fecha  # Asegurar que tiene guiones como parte del formato de fecha
-           and ':' in fecha  # Asegurar que tiene dos puntos (para la parte de la hora)
-           and (  # Intentar convertir la fecha para validarla
-               lambda f: datetime.fromisoformat(f) if f else False
-           )(fecha)
-    ])
-
-    fecha_calc_dt = datetime.fromisoformat(fecha_calc)
-
-    fecha_referencia = None
-    for fecha in reversed(fechas):
-        # print('fecha_calc_dt', fecha_calc_dt, '----', 'fecha', fecha)
-        # print(list(data[fecha.isoformat()]['campaign_info'].keys()))
-        if fecha <= fecha_calc_dt and data[fecha.isoformat()]['campaign_info']['reference']:
-
-            fecha_referencia = fecha.isoformat()
-            break
-
-    return fecha_referencia
+    # Última campaña de referencia con fecha <= fecha_calc, sobre el índice temporal del tubo
+    return TimelineIndex.de_tubo(data).referencia_vigente(fecha_calc)
 
 
 def buscar_ant_referencia(data, fecha_referencia):
-    fechas = sorted([datetime.fromisoformat(fecha) for fecha in data.keys() if fecha != 'info'])
-    fecha_ref_dt = datetime.fromisoformat(fecha_referencia)
-
-    fecha_ant_referencia = None
-    for fecha in reversed(fechas):
-        if fecha < fecha_ref_dt and data[fecha.isoformat()]['campaign_info']['active']:
-            fecha_ant_referencia = fecha.isoformat()
-            break
-
-    return fecha_ant_referencia
+    # Última campaña activa anterior a la referencia
+    return TimelineIndex.de_tubo(data).activa_anterior(fecha_referencia)
 
 
 def extraer_fechas_activas(diccionario):
-    # Lista para almacenar las fechas activas
-    fechas_activas = []
-
-    # Iterar a través de todas las claves del diccionario
-    for clave in diccionario.keys():
-        # Ignorar las claves especiales que no son fechas
-        if clave in ["info", "umbrales"]:
-            continue
-
-        # Verificar si es una fecha con campaña activa
-        try:
-            if diccionario[clave].get('campaign_info', {}).get('active', False) == True:
-                fechas_activas.append(clave)
-        except (KeyError, AttributeError):
-            # Si hay errores al acceder a las claves anidadas, ignorar esta entrada
-            continue
-
-    # Ordenar las fechas de más antigua a más reciente
-    # Asumiendo que las fechas están en formato ISO (como '2024-11-20T12:39:22')
-    fechas_activas.sort()
-
-    return fechas_activas
+    # Fechas con campaña activa, ordenadas de más antigua a más reciente
+    return TimelineIndex.de_tubo(diccionario).activas()
 
 
 def calcular_incrementos(data, fecha_calc, fecha_referencia):
@@ -122,154 +71,112 @@ def calcular_incrementos(data, fecha_calc, fecha_referencia):
     # data: tubo + campañas añadidas
     # fecha_calc: fecha a calcular
     # fecha_referencia: referencia para fecha_calc
+    # El cálculo por profundidades se hace en el motor vectorizado utils/funciones_calculo.py
 
-    # Primero extraer las fechas activas
-    fechas_activas = extraer_fechas_activas(data)
-
-    # Encontrar el índice de la fecha actual en la lista de fechas activas
-    indice_actual = fechas_activas.index(fecha_calc) if fecha_calc in fechas_activas else -1
+    indice = TimelineIndex.de_tubo(data)
 
     calc_fecha_calc = data[fecha_calc]['calc']
     calc_fecha_referencia = data[fecha_referencia]['calc']
 
-    # Determinar la fecha anterior activa
-    fecha_anterior = None
-    if indice_actual > 0:
-        fecha_anterior = fechas_activas[indice_actual - 1]
-    elif indice_actual == 0:  # Es la primera fecha activa
-        fecha_anterior = fecha_calc  # No hay anterior, usamos la misma
-
-    # Inicializar valores para evitar errores
-    for index_info in calc_fecha_calc:
-        index_info['incr_checksum_a'] = 0
-        index_info['incr_checksum_b'] = 0
-        index_info['incr_dev_a'] = 0
-        index_info['incr_dev_b'] = 0
-        index_info['incr_dev_abs_a'] = 0
-        index_info['incr_dev_abs_b'] = 0
-        index_info['abs_dev_a'] = 0
-        index_info['abs_dev_b'] = 0
-        index_info['desp_a'] = 0
-        index_info['desp_b'] = 0
-
-    # Caso especial: es una fecha de referencia o la primera fecha activa
-    if fecha_calc == fecha_referencia or fecha_calc == fechas_activas[0]:
-        if fecha_anterior is not None and fecha_anterior != fecha_calc:
-            calc_fecha_anterior = data[fecha_anterior]['calc']
-
-            # Copiar los valores de incr_dev_abs_a y incr_dev_abs_b de la fecha anterior
-            for index_info in calc_fecha_calc:
-                index = index_info['index']
-                anterior_info = next((item for item in calc_fecha_anterior if item['index'] == index), None)
-
-                if anterior_info:
-                    index_info['incr_dev_abs_a'] = anterior_info.get('incr_dev_abs_a', 0)
-                    index_info['incr_dev_abs_b'] = anterior_info.get('incr_dev_abs_b', 0)
-
-    # Para el caso normal, calcular los incrementos
-    else:
-        for index_info in calc_fecha_calc:
-            index = index_info['index']
-            referencia_info = next((item for item in calc_fecha_referencia if item['index'] == index), None)
-
-            if referencia_info:
-                index_info['incr_checksum_a'] = round(index_info['checksum_a'] - referencia_info['checksum_a'],4)
-                index_info['incr_checksum_b'] = round(index_info['checksum_b'] - referencia_info['checksum_b'], 4)
-                index_info['incr_dev_a'] = round(index_info['dev_a'] - referencia_info['dev_a'], 2)
-                index_info['incr_dev_b'] = round(index_info['dev_b'] - referencia_info['dev_b'], 2)
-                index_info['incr_dev_abs_a'] = round(
-                    index_info['incr_dev_a'] + referencia_info.get('incr_dev_abs_a', 0), 2)
-                index_info['incr_dev_abs_b'] = round(
-                    index_info['incr_dev_b'] + referencia_info.get('incr_dev_abs_b', 0), 2)
-
-    # Insertar parámetros calculados en el diccionario data
-    for index_info in calc_fecha_calc:
-        existing_info = next((item for item in data[fecha_calc]['calc'] if item['index'] == index_info['index']), None)
-        if existing_info:
-            # Actualizamos todas las claves calculadas
-            for key in ['incr_checksum_a', 'incr_checksum_b','incr_dev_a', 'incr_dev_b',
-                        'incr_dev_abs_a', 'incr_dev_abs_b', 'abs_dev_a', 'abs_dev_b',
-                        'desp_a', 'desp_b']:
-                if key in index_info:
-                    existing_info[key] = index_info[key]
-
-    # Calcular abs_dev_a y abs_dev_b (envolvente del tubo)
-    for i, index_info in enumerate(calc_fecha_calc):
-        index_info['abs_dev_a'] = round(sum(item['dev_a'] for item in calc_fecha_calc[i:]), 2)
-        index_info['abs_dev_b'] = round(sum(item['dev_b'] for item in calc_fecha_calc[i:]), 2)
-
-    # Calcular desp_a y desp_b (desplazamientos)
-    for i, index_info in enumerate(calc_fecha_calc):
-        index_info['desp_a'] = round(sum(item.get('incr_dev_a', 0) for item in calc_fecha_calc[i:]), 2)
-        index_info['desp_b'] = round(sum(item.get('incr_dev_b', 0) for item in calc_fecha_calc[i:]), 2)
-
-    # Añadir los desplazamientos de la referencia
-    fecha_activa_anterior = obtener_fecha_activa_anterior(data, fecha_calc)
-
-    # Si hay una fecha activa anterior
-    if fecha_activa_anterior:
-        calc_fecha_activa_anterior = fecha_activa_anterior.get('calc', [])
-
-        for index_info in calc_fecha_calc:
-            index = index_info['index']
-
-            # Determinar qué referencia usar
-            if fecha_calc == fecha_referencia:
-                # Si es referencia, usar los desplazamientos de la campaña anterior
-                referencia_info = next((item for item in calc_fecha_activa_anterior if item['index'] == index), None)
-            else:
-                # Sino, usar los de la campaña de referencia
-                referencia_info = next((item for item in calc_fecha_referencia if item['index'] == index), None)
+    # Fecha activa anterior a fecha_calc (None si es la primera)
+    fecha_activa_anterior = indice.activa_anterior(fecha_calc)
+    es_activa = data[fecha_calc].get('campaign_info', {}).get('active') == True
+
+    # Caso especial: es una fecha de referencia o la primera fecha activa. No hay incrementos,
+    # se copian los incr_dev_abs de la fecha activa anterior
+    sin_incrementos = fecha_calc == fecha_referencia or fecha_calc == indice.primera_activa()
+    calc_abs = None
+    if sin_incrementos and es_activa and fecha_activa_anterior is not None:
+        calc_abs = data[fecha_activa_anterior]['calc']
+
+    # Desplazamientos de partida: si es referencia los de la campaña anterior, sino los de la referencia
+    calc_desp = None
+    if fecha_activa_anterior is not None:
+        if fecha_calc == fecha_referencia:
+            calc_desp = data[fecha_activa_anterior].get('calc', [])
+        else:
+            calc_desp = calc_fecha_referencia
 
-            if referencia_info:
-                index_info['desp_a'] = round(index_info['desp_a'] + referencia_info.get('desp_a', 0), 2)
-                index_info['desp_b'] = round(index_info['desp_b'] + referencia_info.get('desp_b', 0), 2)
+    calcular_incrementos_calc(calc_fecha_calc, calc_fecha_referencia, sin_incrementos, calc_abs, calc_desp)
+    invalidar_tubo(data)  # 'calc' modificado en el sitio
 
     return data
 
-def obtener_fecha_activa_anterior(datos, fecha_calc):
-    # Extraer fechas activas
+def _incrementos(calc):
+    # valores de las claves que recalcula calcular_incrementos_calc (0 y 0.0 cuentan como iguales)
+    return [[punto.get(clave) for clave in CLAVES_INCREMENTOS] for punto in calc]
 
-    fechas_activas = [fecha for fecha in datos.keys()
-                      if isinstance(datos[fecha], dict) and 'campaign_info' in datos[fecha]
-                      and datos[fecha]['campaign_info'].get('active') == True]
 
-    # Si no hay fechas activas, devolver un diccionario vacío
+def recalcular_tubo(tubo, desde=None):
+    """
+    Recalcula en una sola pasada los incrementos y desplazamientos de las campañas del tubo
+    con fecha igual o posterior a 'desde' (todas si es None).
 
-    if not fechas_activas:
-        return {}
+    Recorre la línea temporal una vez, de antigua a reciente, arrastrando la referencia vigente
+    y la campaña activa anterior. El resultado es el mismo que llamar a buscar_referencia y
+    calcular_incrementos fecha a fecha, sin reordenar ni reparsear las claves en cada campaña.
 
-    # Convertir fechas de string a objetos datetime
-    fechas_datetime = []
-    for fecha_str in fechas_activas:
-        try:
-            fecha_dt = datetime.fromisoformat(fecha_str)
-            fechas_datetime.append((fecha_str, fecha_dt))
-        except ValueError:
+    Args:
+        tubo (dict): tubo completo (info, umbrales y campañas). Se modifica en el sitio.
+        desde (str, optional): fecha ISO de la primera campaña a recalcular.
+
+    Returns:
+        list: fechas recalculadas cuyo 'calc' ha cambiado de valor, en orden cronológico. Son las
+        únicas que hay que volver a guardar.
+    """
+    indice = TimelineIndex.de_tubo(tubo)
+    desde_dt = datetime.fromisoformat(desde) if desde else None
+    primera_activa = indice.primera_activa()
+
+    fecha_referencia = None  # última referencia igual o anterior a la campaña en curso
+    fecha_activa_anterior = None  # última campaña activa estrictamente anterior
+    recalculadas = []
+    for fecha_dt, fecha, con_info, es_activa, es_ref in zip(indice.fechas_dt, indice.fechas, indice.con_info,
+                                                             indice.activa, indice.referencia):
+        if not con_info:
             continue
+        if es_ref:
+            fecha_referencia = fecha
 
-    # Convertir fecha_calc a datetime
+        if desde_dt is None or fecha_dt >= desde_dt:
+            if fecha_referencia is None:
+                print(f"Campaña {fecha} sin referencia anterior, no se recalcula")
+            else:
+                es_referencia = fecha == fecha_referencia
+                sin_incrementos = es_referencia or fecha == primera_activa
+                calc_abs = None
+                if sin_incrementos and es_activa and fecha_activa_anterior is not None:
+                    calc_abs = tubo[fecha_activa_anterior]['calc']
+                calc_desp = None
+                if fecha_activa_anterior is not None:
+                    if es_referencia:
+                        calc_desp = tubo[fecha_activa_anterior].get('calc', [])
+                    else:
+                        calc_desp = tubo[fecha_referencia]['calc']
+
+                calc = tubo[fecha]['calc']
+                antes = _incrementos(calc)
+                calcular_incrementos_calc(calc, tubo[fecha_referencia]['calc'], sin_incrementos, calc_abs, calc_desp)
+                if _incrementos(calc) != antes:
+                    recalculadas.append(fecha)
+
+        if es_activa:
+            fecha_activa_anterior = fecha
+
+    invalidar_tubo(tubo)  # 'calc' modificado en el sitio
+    return recalculadas
+
+def obtener_fecha_activa_anterior(datos, fecha_calc):
+    # Devuelve los datos de la campaña activa inmediatamente anterior a fecha_calc,
+    # o un diccionario vacío si no la hay
     try:
-        fecha_calc_dt = datetime.fromisoformat(fecha_calc)
+        fecha_anterior = TimelineIndex.de_tubo(datos).activa_anterior(fecha_calc)
     except ValueError:
         return {}
 
-    # Ordenar fechas de más reciente a más antigua
-    fechas_ordenadas = sorted(fechas_datetime, key=lambda x: x[1], reverse=True)
-
-    # Buscar la fecha inmediatamente anterior a fecha_calc
-    fecha_anterior = None
-    for fecha_str, fecha_dt in fechas_ordenadas:
-        if fecha_dt < fecha_calc_dt:
-            fecha_anterior = fecha_str
-            break
-
-    # Si no se encuentra una fecha anterior, devolver un diccionario vacío
     if not fecha_anterior:
         return {}
 
-    # Devolver los datos de la fecha encontrada
-
     return datos.get(fecha_anterior, {})
 
 
@@ -456,62 +363,42 @@ def asignar_colores(umbrales_tubo, colores_disponibles=None):
 
 
 
+def hex_to_spanish_color(hex_color):
+    """
+    Convierte un color hexadecimal a nombre en español.
+    Mantiene compatibilidad con el sistema existente.
+    """
+    # Mapeo de colores hex a nombres españoles
+    hex_to_spanish = {
+        '#3B82F6': 'azul',
+        '#EF4444': 'rojo',
+        '#10B981': 'verde',
+        '#F59E0B': 'amarillo',
+        '#8B5CF6': 'violeta',
+        '#EC4899': 'rosa',
+        '#06B6D4': 'cian',
+        '#84CC16': 'lima',
+        '#F97316': 'naranja',
+        '#6B7280': 'gris',
+        '#DC2626': 'rojo_oscuro',
+        '#059669': 'verde_esmeralda',
+        '#7C3AED': 'purpura',
+        '#DB2777': 'rosa_intenso',
+        '#0891B2': 'azul_petroleo'
+    }
+
+    return hex_to_spanish.get(hex_color, 'azul')  # Azul por defecto
+
+
 def evaluar_umbrales(calc, umbrales):
     """
     calc: List[dict], cada dict debe tener 'cota_abs', 'desp_a', 'desp_b'
     umbrales: dict completo con claves 'deformadas' y 'valores'
     Devuelve un string con el umbral de mayor nivel superado, o None.
+    Las curvas se preparan una vez por umbrales (UmbralesCompilados); para evaluar varias campañas
+    de un tubo a la vez, utils.umbrales_compilados.evaluar_tubo.
     """
-    # Preparación de curvas leyendo flanco y nivel
-    curvas = {}
-    for nombre, info in umbrales['deformadas'].items():
-        flanco = info['flanco']
-        nivel  = info.get('nivel', 0)
-        if flanco == 'sin_flanco':
-            continue
-        # Extraer puntos: (cota_abs, valor_umbral)
-        puntos = [
-            (v['cota_abs'], v[nombre])
-            for v in umbrales['valores']
-            if nombre in v
-        ]
-        # Ordenar por profundidad
-        puntos.sort(key=lambda x: x[0])
-        cotas = [p[0] for p in puntos]
-        vals  = [p[1] for p in puntos]
-        curvas[nombre] = {'flanco': flanco, 'nivel': nivel, 'cotas': cotas, 'vals': vals}
-
-    superaciones = []
-
-    def interp(cotas, vals, y):
-        # Interpolación lineal entre puntos
-        if y <= cotas[0]:
-            return vals[0]
-        if y >= cotas[-1]:
-            return vals[-1]
-        i = bisect.bisect_left(cotas, y)
-        y0, y1 = cotas[i-1], cotas[i]
-        v0, v1 = vals[i-1], vals[i]
-        if y1 == y0:
-            return v0
-        return v0 + (v1 - v0) * ((y - y0) / (y1 - y0))
-
-    # Evaluar cada curva: añadir si supera
-    for nombre, info in curvas.items():
-        flanco = info['flanco']
-        nivel  = info['nivel']
-        cotas, vals = info['cotas'], info['vals']
-        for p in calc:
-            y = p['cota_abs']
-            d = p['desp_a'] if nombre.endswith('_a') else p['desp_b']
-            u = interp(cotas, vals, y)
-            if (flanco == 'flanco_positivo' and d > u) or \
-               (flanco == 'flanco_negativo' and d < u):
-                superaciones.append((nombre, nivel))
-                break
-
-    if not superaciones:
-        return None
-    # Seleccionar el umbral con mayor nivel
-    top_nombre, top_nivel = max(superaciones, key=lambda x: x[1])
-    return f'Supera umbral "{top_nombre}", nivel: {top_nivel}'
+    compilados = UmbralesCompilados.de_umbrales(umbrales)
+    perfil = {clave: [p[clave] for p in calc] for clave in ('cota_abs', 'desp_a', 'desp_b')}
+    evaluacion = compilados.evaluar(perfil['cota_abs'], perfil['desp_a'], perfil['desp_b'])
+    return compilados.alarma(int(evaluacion["curva"][0]))
@@ -1,8 +1,10 @@
 # utils/funciones_correcciones.py
 import dash
+import numpy as np
 import pandas as pd
 import plotly.graph_objs as go
 
+
 def grafico_violines(df, fecha_seleccionada):
     # Convertir las profundidades a índice si no lo están
     df.index.name = 'Profundidad'
@@ -37,24 +39,38 @@ def grafico_violines(df, fecha_seleccionada):
     #fig.show()
     return fig
 
+def _con_calc(data, fecha):
+    campana = data.get(fecha)
+    return isinstance(campana, dict) and isinstance(campana.get('calc'), list) and len(campana['calc']) > 0
+
+
+def _perfil_calc(data, fecha, variable):
+    # valores de una variable en los puntos de calc de la campaña, en su orden (NaN donde falta o no es un número).
+    # Se leen directamente del dict: los callbacks reciben un dict nuevo de la Store en cada llamada y
+    # construir el TuboArray de todo el tubo costaría más que leer las pocas campañas que se piden
+    return np.array([valor if isinstance(valor, (int, float)) and not isinstance(valor, bool) else np.nan
+                     for valor in (punto.get(variable) for punto in data[fecha]['calc'])], dtype=float)
+
+
 def dict_a_df(data, variables, fechas_seleccionadas):
     # pasa el diccionario json a un df con las variables seleccionadas
     # se cogen sólo las fechas que importan
     # devuelve tantos df como variables, en un diccionario de df's
-
-    # Inicializar diccionarios para cada DataFrame
-    df_dicts = {key: {} for key in variables}
-
-    # Rellenar los diccionarios para cada DataFrame
-    for fecha in fechas_seleccionadas:
-        if fecha in data:
-            rows = data[fecha]['calc']
-            for row in rows:
-                for key in variables:
-                    df_dicts[key].setdefault(fecha, {})[row['depth']] = row[key]
-
-    # Crear los DataFrames dinámicamente
-    dfs = {f"{key}": pd.DataFrame(df_dicts[key]) for key in variables}
+    # una serie por fecha, indexada por 'depth'
+    fechas = [fecha for fecha in fechas_seleccionadas if _con_calc(data, fecha)]
+
+    depths = [_perfil_calc(data, fecha, 'depth') for fecha in fechas]
+    misma_rejilla = all(np.array_equal(depth, depths[0]) for depth in depths[1:])
+
+    dfs = {}
+    for key in variables:
+        perfiles = [_perfil_calc(data, fecha, key) for fecha in fechas]
+        if fechas and misma_rejilla:
+            # todas las campañas con las mismas profundidades: un único bloque 2D
+            dfs[f"{key}"] = pd.DataFrame(np.column_stack(perfiles), index=depths[0], columns=fechas)
+        else:
+            dfs[f"{key}"] = pd.DataFrame({fecha: pd.Series(perfil, index=depth)
+                                          for fecha, perfil, depth in zip(fechas, perfiles, depths)})
 
     return dfs
 
@@ -370,20 +386,17 @@ def tabla_del_json(df, fechas):
 
 
 def std(variables, fechas_activas, data, profundidad):
-    # Inicializar diccionarios para cada DataFrame
-    df_dicts = {key: {} for key in variables}
-
-    # Rellenar los diccionarios para cada DataFrame, filtrando por profundidad
-    for fecha in fechas_activas:
-        if fecha in data:
-            rows = data[fecha]['calc']
-            for row in rows:
-                if row['depth'] >= profundidad:
-                    for key in variables:
-                        df_dicts[key].setdefault(fecha, {})[row['depth']] = row[key]
-
-    # Crear los DataFrames dinámicamente
-    dfs_sigma = {f"{key}": pd.DataFrame(df_dicts[key]) for key in variables}
+    # DataFrames por variable (una columna por fecha), filtrando por profundidad
+    fechas = [fecha for fecha in fechas_activas if _con_calc(data, fecha)]
+
+    dfs_sigma = {}
+    for key in variables:
+        columnas = {}
+        for fecha in fechas:
+            depth = _perfil_calc(data, fecha, 'depth')
+            filtro = depth >= profundidad
+            columnas[fecha] = pd.Series(_perfil_calc(data, fecha, key)[filtro], index=depth[filtro])
+        dfs_sigma[f"{key}"] = pd.DataFrame(columnas)
 
     # Calcula desviación típica por cada fecha (columna) y crea un único DataFrame combinado
     df_std = pd.DataFrame({var: dfs_sigma[var].std() for var in dfs_sigma})
@@ -2,16 +2,18 @@
 
 import re
 from datetime import datetime
-import math
 import plotly.graph_objects as go
 import numpy as np
 import os
 import sys
-import importlib.util
 import traceback
 import dash_mantine_components as dmc
 from dash import html
 
+from utils.cargador_plugins import cargar_plugin
+from utils.funciones_comunes import hex_to_spanish_color  # noqa: F401 (se reexporta para los scripts de gráficos que lo importan de aquí)
+from utils.tubo_array import TuboArray
+
 # Funciones para graficar
 
 
@@ -70,44 +72,88 @@ def obtener_color_para_fecha(fecha, fechas_colores):
     return 'gray'  # Color por defecto si no se encuentra
 
 
-def extraer_datos_fecha(fecha, data, eje):
-    """Extrae y procesa los datos de cálculo para una fecha específica"""
-    if fecha not in data or "calc" not in data[fecha]:
-        return None
+# Trazas precalculadas de los gráficos de profundidad.
+# Para cada tubo y eje (cota_abs, depth o index) se calculan una vez los arrays de todas las campañas:
+# eje Y numérico, desplazamientos, incrementales, checksum y desplazamiento total (este último sobre la
+# matriz campañas x índices completa). Al mover el slider o cambiar la selección sólo se buscan arrays.
+# La caché se indexa por el TuboArray del tubo, que cambia cuando cambian sus datos.
+VARIABLES_TRAZAS = ("desp_a", "desp_b", "incr_dev_a", "incr_dev_b", "incr_dev_abs_a", "incr_dev_abs_b",
+                    "checksum_a", "checksum_b")
+MAX_TRAZAS_EN_CACHE = 12
+_trazas = []  # [(tubo_array, eje, trazas)], el más reciente al final
+
+
+def _calcular_trazas(tubo_array, eje):
+    # {fecha: datos} de todas las campañas con algún punto en calc
+    calc = tubo_array.valores['calc']
+    vacia = np.full((len(tubo_array), len(tubo_array.indices)), np.nan)
+    desp_a, desp_b = calc.get("desp_a", vacia), calc.get("desp_b", vacia)
+    desp_total = np.round(np.sqrt(desp_a ** 2 + desp_b ** 2), 2)
+
+    trazas = {}
+    for fecha in tubo_array.fechas:
+        if not tubo_array.tiene_bloque(fecha):
+            continue
+        perfil = lambda variable: tubo_array.perfil(fecha, variable)
+        datos = {variable: perfil(variable) for variable in VARIABLES_TRAZAS}
+
+        # Si el eje es "depth", se construye con el paso entre cotas de la propia campaña
+        # esto es debido a que puede haber recrecimientos del tubo, "depth" sólo vale dentro de las campañas de la misma ref
+        if eje == "depth":
+            cota_abs = perfil("cota_abs")
+            paso = abs(cota_abs[1] - cota_abs[0]) if len(cota_abs) > 1 else 0.0
+            eje_Y = paso * np.arange(len(cota_abs))
+        else:
+            eje_Y = perfil(eje)
 
-    calc_data = data[fecha]["calc"]
+        total = tubo_array.perfil_matriz(fecha, desp_total)
+        if total is None:
+            total = np.round(np.sqrt(datos["desp_a"] ** 2 + datos["desp_b"] ** 2), 2)
 
-    # Si el eje es "depth", construimos la lista según la lógica especificada
-    # esto es debido a que puede haber recrecimientos del tubo, "depth" sólo vale dentro de las campañas de la misma ref
-    if eje == "depth":
-        # Extraer todos los valores de index
-        #indices = [punto["index"] for punto in calc_data]
-        cota_abs = [punto["cota_abs"] for punto in calc_data]
+        trazas[fecha] = {'eje_Y': eje_Y, **datos, 'desp_total': total}
+    return trazas
 
-        paso = abs(cota_abs[1] - cota_abs[0])
 
-        # Construir la lista eje_Y
-        eje_Y = []
-        for i in range(len(cota_abs)):
-            eje_Y.append(paso * i)
+def trazas_tubo(data, eje):
+    """
+    Arrays de las trazas de todas las campañas del tubo para un eje.
 
-    else:
-        # Si no es "depth", extraer directamente los valores del eje especificado
-        eje_Y = [punto[eje] for punto in calc_data]
+    Args:
+        data (dict): tubo en el esquema JSON.
+        eje (str): "cota_abs", "depth" o "index".
 
-    # Extraer el resto de listas de datos
-    return {
-        'eje_Y': eje_Y,
-        'desp_a': [punto["desp_a"] for punto in calc_data],
-        'desp_b': [punto["desp_b"] for punto in calc_data],
-        'incr_dev_a': [punto["incr_dev_a"] for punto in calc_data],
-        'incr_dev_b': [punto["incr_dev_b"] for punto in calc_data],
-        'incr_dev_abs_a': [punto["incr_dev_abs_a"] for punto in calc_data],
-        'incr_dev_abs_b': [punto["incr_dev_abs_b"] for punto in calc_data],
-        'checksum_a': [punto["checksum_a"] for punto in calc_data],
-        'checksum_b': [punto["checksum_b"] for punto in calc_data],
-        'desp_total': [round(math.sqrt(punto["desp_a"] ** 2 + punto["desp_b"] ** 2), 2) for punto in calc_data]
-    }
+    Returns:
+        dict: {fecha: datos}, con las mismas claves que extraer_datos_fecha. Los arrays se comparten
+        entre llamadas: no se deben modificar.
+    """
+    tubo_array = TuboArray.de_tubo(data)
+    for k, (array_cache, eje_cache, trazas) in enumerate(_trazas):
+        if array_cache is tubo_array and eje_cache == eje:
+            _trazas.append(_trazas.pop(k))
+            return trazas
+    trazas = _calcular_trazas(tubo_array, eje)
+    _trazas.append((tubo_array, eje, trazas))
+    del _trazas[:-MAX_TRAZAS_EN_CACHE]
+    return trazas
+
+
+def extraer_datos_fecha(fecha, data, eje):
+    """Extrae y procesa los datos de cálculo para una fecha específica (trazas precalculadas del tubo)"""
+    if fecha not in data or "calc" not in data[fecha]:
+        return None
+    return trazas_tubo(data, eje).get(fecha)
+
+
+def traza_lineas(x_data, y_data, nombre, color, grosor=2, opacidad=0.7, grupo=None):
+    """
+    Traza de líneas como dict de Plotly, para crear la figura de una vez con
+    go.Figure(data=trazas) en lugar de añadirlas una a una.
+
+    Args: los mismos que add_traza, sin la figura.
+    """
+    grupo_leyenda = grupo if grupo else nombre.split(" - ")[0] if " - " in nombre else nombre
+    return dict(type="scatter", x=x_data, y=y_data, mode="lines", name=nombre,
+                line=dict(color=color, width=grosor), legendgroup=grupo_leyenda, opacity=opacidad)
 
 
 def add_traza(fig, x_data, y_data, nombre, color, grosor=2, opacidad=0.7, grupo=None):
@@ -138,45 +184,10 @@ def add_traza(fig, x_data, y_data, nombre, color, grosor=2, opacidad=0.7, grupo=
     return fig
 
 
-def interpolar_def_tubo(cota_abs_tubo, cota_abs_umbral, def_umbral):
-    """
-    Interpola, para cada cota de tubo, la deflexión correspondiente
-    a partir de la curva (def_umbral vs cota_abs_umbral).
-
-    Parámetros
-    ----------
-    cota_abs_tubo : list of float
-        Lista de cotas absolutas del tubo (puede ser progresión aritmética).
-    cota_abs_umbral : list of float
-        Lista de cotas absolutas del umbral (monótonamente decreciente).
-    def_umbral : list of float
-        Lista de deflexiones del umbral, misma longitud que cota_abs_umbral.
-
-    Devuelve
-    -------
-    def_tubo : list of float
-        Lista de deflexiones del tubo interpoladas en cada cota de tubo.
-    """
-    # Convertir a arrays NumPy
-    cota_arr = np.array(cota_abs_umbral)
-    def_arr = np.array(def_umbral)
-
-    # Ordenar los puntos por cota ascendente (requisito de np.interp)
-    idx = np.argsort(cota_arr)
-    cota_sorted = cota_arr[idx]
-    def_sorted = def_arr[idx]
-
-    # Interpolar: para cada valor de cota_abs_tubo,
-    # hallar la deflexión correspondiente
-    def_tubo_arr = np.interp(cota_abs_tubo, cota_sorted, def_sorted)
-
-    # Devolver como lista de Python
-    return def_tubo_arr.tolist()
-
-
 def load_module_dynamically(module_path, module_name):
     """
-    Carga dinámicamente un módulo Python desde una ruta específica.
+    Carga dinámicamente un módulo Python desde una ruta específica (con la caché de cargador_plugins:
+    sólo se vuelve a ejecutar si el script o su carpeta han cambiado).
 
     Args:
         module_path (str): Ruta al archivo Python
@@ -186,16 +197,8 @@ def load_module_dynamically(module_path, module_name):
         module: El módulo cargado o None si no se pudo cargar
     """
     try:
-        print(f"Intentando cargar módulo {module_name} desde {module_path}")
-        spec = importlib.util.spec_from_file_location(module_name, module_path)
-        if spec is None:
-            print(f"No se pudo obtener spec para {module_path}")
-            return None
-
-        module = importlib.util.module_from_spec(spec)
+        module = cargar_plugin(module_path, module_name)
         sys.modules[module_name] = module
-        spec.loader.exec_module(module)
-        print(f"Módulo {module_name} cargado exitosamente")
         return module
     except Exception as e:
         print(f"Error al cargar el módulo {module_name}: {str(e)}")
@@ -258,36 +261,20 @@ def obtener_parametros_por_defecto(script_name, current_values):
             print(f"Script no encontrado: {script_path}")
             return {}
 
-        # Añadir el directorio del script al path
-        script_dir = os.path.dirname(script_path)
-        import sys
-        sys.path.insert(0, script_dir)
-
-        try:
-            # Cargar el módulo dinámicamente
-            import importlib.util
-            module_spec = importlib.util.spec_from_file_location(script_name, script_path)
-
-            if module_spec:
-                module = importlib.util.module_from_spec(module_spec)
-                module_spec.loader.exec_module(module)
-
-                # Buscar función get_default_params
-                if hasattr(module, 'get_default_params'):
-                    try:
-                        parametros_script = module.get_default_params()
-                        print(f"Parámetros obtenidos de {script_name}.get_default_params(): {parametros_script}")
-                        return parametros_script
-                    except Exception as e:
-                        print(f"Error al ejecutar get_default_params en {script_name}: {e}")
-
-                # Si no hay función, usar parámetros por defecto estándar
-                print(f"No se encontró get_default_params en {script_name}, usando valores $CURRENT")
-
-        finally:
-            # Restaurar el path
-            if script_dir in sys.path:
-                sys.path.remove(script_dir)
+        # Cargar el módulo (desde la caché si el script no ha cambiado)
+        module = cargar_plugin(script_path, script_name)
+
+        # Buscar función get_default_params
+        if hasattr(module, 'get_default_params'):
+            try:
+                parametros_script = module.get_default_params()
+                print(f"Parámetros obtenidos de {script_name}.get_default_params(): {parametros_script}")
+                return parametros_script
+            except Exception as e:
+                print(f"Error al ejecutar get_default_params en {script_name}: {e}")
+
+        # Si no hay función, usar parámetros por defecto estándar
+        print(f"No se encontró get_default_params en {script_name}, usando valores $CURRENT")
 
     except Exception as e:
         print(f"Error al cargar script {script_name}: {e}")
@@ -509,33 +496,6 @@ def generar_campos_parametros(num_pagina, nombre_elemento, parametros_json, curr
 
 
 
-def hex_to_spanish_color(hex_color):
-    """
-    Convierte un color hexadecimal a nombre en español.
-    Mantiene compatibilidad con el sistema existente.
-    """
-    # Mapeo de colores hex a nombres españoles
-    hex_to_spanish = {
-        '#3B82F6': 'azul',
-        '#EF4444': 'rojo',
-        '#10B981': 'verde',
-        '#F59E0B': 'amarillo',
-        '#8B5CF6': 'violeta',
-        '#EC4899': 'rosa',
-        '#06B6D4': 'cian',
-        '#84CC16': 'lima',
-        '#F97316': 'naranja',
-        '#6B7280': 'gris',
-        '#DC2626': 'rojo_oscuro',
-        '#059669': 'verde_esmeralda',
-        '#7C3AED': 'purpura',
-        '#DB2777': 'rosa_intenso',
-        '#0891B2': 'azul_petroleo'
-    }
-
-    return hex_to_spanish.get(hex_color, 'azul')  # Azul por defecto
-
-
 def spanish_to_plotly_dash(tipo_linea):
     """
     Convierte tipos de línea del JSON a formato Plotly.
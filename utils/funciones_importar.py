@@ -1,20 +1,139 @@
 #utils/funciones_importar.py
+import io
 import os
-import json
 import re
 from datetime import datetime
-from dash import html
 import xml.etree.ElementTree as ET
 
 
 
 from utils.funciones_comunes import valores_calc_directos
+from utils.indice_temporal import TimelineIndex
+from utils.tubo_binario import guardar_campanas
 
 
 
 #funciones que sólo se usan en el módulo importar
 # importadores de diferentes marcas
-def import_RST(files, index_0, cota):
+# Cada importador lee los archivos de uno en uno y en streaming: las líneas se recorren con un iterador
+# (RST, Soil dux) y el XML de Sisgeo con iterparse, liberando cada paso ya leído. Las lecturas de una
+# campaña se guardan como filas (index, cota_abs, depth, a0, a180, b0, b180) y con ellas se construyen
+# raw y calc. iterar_X devuelve las campañas una a una, (fecha, campaña), y import_X las reúne en un dict.
+# Los avisos de iterar_X (líneas que no se pueden leer, pasos sin lectura...) se añaden a la lista
+# avisos si se pasa y, si no, se escriben en la consola.
+# Cada archivo de files es un dict con 'filename' y una de estas claves:
+#   'ruta': archivo en disco; 'contenido': bytes del archivo; 'lines': lista de líneas (ya decodificadas)
+
+RUNS_SISGEO = ('A1B1', 'A3B3')  # pasadas a 0 y a 180 grados
+
+PATRON_LECTURA_DUX = re.compile(r"^\d+\.\d+,-?\d+,-?\d+,-?\d+,-?\d+$")
+
+
+def lineas_archivo(file):
+    """Iterador de las líneas (sin salto de línea) de un archivo de lecturas, sin leerlo entero."""
+    if 'ruta' in file:
+        with open(file['ruta'], "r", encoding="utf-8") as f:
+            for line in f:
+                yield line.rstrip("\n")
+    elif 'contenido' in file:
+        for line in io.TextIOWrapper(io.BytesIO(file['contenido']), encoding="utf-8"):
+            yield line.rstrip("\n")
+    else:
+        yield from file['lines']
+
+
+def archivo_binario(file):
+    """Archivo binario (para iterparse) con el contenido de un archivo de lecturas."""
+    if 'ruta' in file:
+        return open(file['ruta'], "rb")
+    if 'contenido' in file:
+        return io.BytesIO(file['contenido'])
+    return io.BytesIO("\n".join(file['lines']).encode("utf-8"))
+
+
+def campana_importada(campaign_info, campaign_data, filas, cte_instrument):
+    """
+    Campaña en el esquema del tubo a partir de sus filas (index, cota_abs, depth, a0, a180, b0, b180).
+    calc son los valores en mm (valores_calc_directos); los que dependen de la referencia y de las
+    profundidades anteriores se calculan fuera del importador.
+    """
+    raw_entries = []  # valores raw
+    calc_entries = []  # convertidos en mm
+    for fila in filas:
+        index, cota_abs, depth, a0, a180, b0, b180 = fila
+        raw_entries.append({
+            "index": index,  # posición absoluta en el índice del tubo
+            "cota_abs": cota_abs,  # cota absoluta
+            "depth": depth,  # profundidades positivas
+            "a0": a0,
+            "a180": a180,
+            "b0": b0,
+            "b180": b180
+        })
+        calc_entries.append(valores_calc_directos(*fila, cte_instrument))
+    return {
+        "campaign_info": campaign_info,
+        "info_readout": campaign_data,
+        "raw": raw_entries,
+        #"normalizados": calc_entries,
+        "calc": calc_entries  # en la importación no hay cambios en calculado, a tener en cuenta en caso de spira
+    }
+
+
+def _avisar(avisos, mensaje):
+    # aviso del importador: a la lista avisos si se pasa (importacion_paralela) o a la consola
+    if avisos is None:
+        print(mensaje)
+    else:
+        avisos.append(mensaje)
+
+
+def _cabecera_RST(lineas_cabecera, filename, avisos=None):
+    # Recorre las líneas de la cabecera y rellena la información de la campaña. Devuelve (fecha, info)
+    campaign_data = {}
+    date_time = None
+    for line in lineas_cabecera:
+        if ',' in line:
+            try:
+                key, value = line.strip().split(',', 1)
+            except ValueError:
+                _avisar(avisos, f"Error al dividir la línea en {filename}: {line.strip()}")
+                continue
+            if key in ["Reading Date(m/d/y)", "Reading Date(m/d/y,h:m:s)"]:
+                try:
+                    # Intentar varios formatos posibles de fecha
+                    date_time = datetime.strptime(value.strip(), "%m/%d/%Y,%H:%M:%S").isoformat()
+                except ValueError:
+                    try:
+                        date_time = datetime.strptime(value.strip(), "%m/%d/%Y").isoformat()
+                    except ValueError:
+                        _avisar(avisos, f"Error al parsear la fecha en {filename}: {value.strip()}")
+            elif key == "Borehole":
+                campaign_data["nom_campo"] = value
+            elif key == "Interval":
+                depth_interval = float(value)
+                campaign_data["interval"] = depth_interval
+            elif key == "Probe Serial#":
+                campaign_data["probe_serial"] = value
+            elif key == "Reel Serial#":
+                campaign_data["reel_serial"] = value
+            elif key == "Reading Units":
+                campaign_data["reading_units"] = value
+            elif key == "Depth Units":
+                campaign_data["depth_units"] = value
+            elif key == "Operator":
+                campaign_data["operator"] = value
+            elif key == "Offset Correction":
+                campaign_data["offset_correction"] = float(value.split(",")[0])
+            elif key == "Incline Angle":
+                campaign_data["incline_angle"] = float(value.split(",")[1])
+            else:
+                campaign_data[key] = value.strip()
+    campaign_data["fecha_campo"] = date_time
+    return date_time, campaign_data
+
+
+def iterar_RST(files, index_0, cota, avisos=None):
     # importador para archivos de RST de inclinómetros verticales, con sonda de 0.5 m
     # index_0 marca dónde comienza el inclinómetro, 1000 si no hay cambios en la boca
     # cota es la cota original de index_0=1000
@@ -23,27 +142,11 @@ def import_RST(files, index_0, cota):
     cte_instrument = 1000
     paso = 0.5
 
-    data = {}
-
     for file in files:
         # Para cada archivo se genera una estructura de datos compatible con el json tipo
         filename = file['filename']
-        lines = file['lines']
         index = index_0 - 1 # inicializo en índice en cada pasada
 
-        # Inicializar la estructura de datos para la fecha y hora
-        campaign_data = {}
-        date_time = None
-
-        # Variables para almacenar los datos
-        index_values = []
-        abs_depth_values = []
-        depth_values = []
-        a0_values = []
-        a180_values = []
-        b0_values = []
-        b180_values = []
-
         # info asociada a la campaña. Por defecto
         campaign_info = {
             "index_0": index_0,
@@ -54,58 +157,24 @@ def import_RST(files, index_0, cota):
             "quarentine": False,
             "alarm": "por definir"
         }
-        # Paso 1. Busca dónde comienzan las líneas de lecturas
-        # Parsear las líneas del archivo (mantener la lógica existente)
-        reading_lines_start = 0
-        # busca la línea donde empiezan los datos - reading_lines_start
-        for i, line in enumerate(lines):
-            if line.strip() == "" and "Depth,Face" in lines[i + 1]:
-                reading_lines_start = i + 2
+        # Paso 1. La cabecera llega hasta la línea "Depth,Face..." que sigue a una línea en blanco
+        lineas = lineas_archivo(file)
+        lineas_cabecera = []
+        anterior = None
+        for line in lineas:
+            lineas_cabecera.append(line)
+            if anterior is not None and anterior.strip() == "" and "Depth,Face" in line:
                 break
-        # Paso 2. Recorre del inicio hasta las lecturas y rellena la información de la campaña
-        for line in lines[:reading_lines_start]:
-            if ',' in line:
-                try:
-                    key, value = line.strip().split(',', 1)
-                except ValueError:
-                    print(f"Error al dividir la línea en {filename}: {line.strip()}")
-                    continue
-                if key in ["Reading Date(m/d/y)", "Reading Date(m/d/y,h:m:s)"]:
-                    try:
-                        # Intentar varios formatos posibles de fecha
-                        date_time = datetime.strptime(value.strip(), "%m/%d/%Y,%H:%M:%S").isoformat()
-                    except ValueError:
-                        try:
-                            date_time = datetime.strptime(value.strip(), "%m/%d/%Y").isoformat()
-                        except ValueError:
-                            print(f"Error al parsear la fecha en {filename}: {value.strip()}")
-                elif key == "Borehole":
-                    campaign_data["nom_campo"] = value
-                elif key == "Reading Date(m/d/y)":
-                    campaign_date = value
-                elif key == "Interval":
-                    depth_interval = float(value)
-                    campaign_data["interval"] = depth_interval
-                elif key == "Probe Serial#":
-                    campaign_data["probe_serial"] = value
-                elif key == "Reel Serial#":
-                    campaign_data["reel_serial"] = value
-                elif key == "Reading Units":
-                    campaign_data["reading_units"] = value
-                elif key == "Depth Units":
-                    campaign_data["depth_units"] = value
-                elif key == "Operator":
-                    campaign_data["operator"] = value
-                elif key == "Offset Correction":
-                    campaign_data["offset_correction"] = float(value.split(",")[0])
-                elif key == "Incline Angle":
-                    campaign_data["incline_angle"] = float(value.split(",")[1])
-                else:
-                    campaign_data[key] = value.strip()
-        campaign_data["fecha_campo"] = date_time
-
-        # Paso 3. Recorre las líneas con lecturas y separa las variables. Se guarda una lista con cada una
-        for line in lines[reading_lines_start:]:
+            anterior = line
+        else:
+            _avisar(avisos, f"Fecha no encontrada en {filename}")  # archivo sin lecturas
+            continue
+        # Paso 2. Información de la campaña
+        date_time, campaign_data = _cabecera_RST(lineas_cabecera, filename, avisos)
+
+        # Paso 3. Recorre las líneas con lecturas, una fila por profundidad
+        filas = []
+        for line in lineas:
             if ',' in line:
                 try:
                     values = line.split(',')
@@ -119,114 +188,83 @@ def import_RST(files, index_0, cota):
                     index += 1 # añado una posición por línea
                     abs_depth = cota - (index - index_0 + 1) * paso
                 except ValueError:
-                    print(f"Error al dividir la línea en {filename}: {line.strip()}")
+                    _avisar(avisos, f"Error al dividir la línea en {filename}: {line.strip()}")
                     continue
-
-                index_values.append(index)
-                abs_depth_values. append(abs_depth)
-                depth_values.append(depth)
-                a0_values.append(a0)
-                a180_values.append(a180)
-                b0_values.append(b0)
-                b180_values.append(b180)
+                filas.append((index, abs_depth, -depth, a0, a180, b0, b180))  # profundidades positivas
 
         # añado la última fila, para que parta el cálculo de cero
-        index_values.append(index_values[-1] + 1) # posición absoluta en el índice del tubo "index"
-        abs_depth_values.append(cota - (index_values[-1] - index_0 + 1) * paso)
-        depth_values.append(depth_values[-1] - paso)
-        a0_values.append(0)
-        a180_values.append(0)
-        b0_values.append(0)
-        b180_values.append(0)
+        index = filas[-1][0] + 1 # posición absoluta en el índice del tubo "index"
+        filas.append((index, cota - (index - index_0 + 1) * paso, filas[-1][2] + paso, 0, 0, 0, 0))
 
         # Paso 4. Generar la estructura de salida compatible con JSON
-        raw_entries = [] # valores raw
-        calc_entries = [] # convertidos en mm
-        # Paso 4.a. Primero inserto los valores raw
-        for i in range(len(depth_values)):
-            entry = {
-                "index": index_values[i], # posición absoluta en el índice del tubo
-                "cota_abs": abs_depth_values[i], # cota absoluta
-                "depth": -depth_values[i], # considero las profundidades positivas
-                "a0": a0_values[i],
-                "a180": a180_values[i],
-                "b0": b0_values[i],
-                "b180": b180_values[i]
-            }
-            raw_entries.append(entry)
-
-        # Paso 4.b. Calcula los valores raw normalizados
-        # Se crea el bloque "normalizados", sólo es el paso a mm del raw.
-        # Es por unificar debido a como da los datos Sisgeo
-        # En resumen, habrá dos bloques además del raw:
-        #  - normalizados, en mm. Es un raw en mm, nunca va a cambiar
-        #  - calc, en mm. En este paso del importador serán iguales, luego puede cambiar con las correcciones
-        for i in range(len(depth_values)):
-            entry = valores_calc_directos(
-                index_values[i], abs_depth_values[i],
-                -depth_values[i], a0_values[i], a180_values[i],
-                b0_values[i], b180_values[i], cte_instrument)
-            calc_entries.append(entry)
-        # Nota: el bloque que depende de los cáculos con referencias y profundidades, se calcula fuera del importador
-
-        # Paso 4.c. Añadir la información al diccionario final
         if date_time:
-            data[date_time] = {
-                "campaign_info": campaign_info,
-                "info_readout": campaign_data,
-                "raw": raw_entries,
-                #"normalizados": calc_entries,
-                "calc": calc_entries # en la importación no hay cambios en calculado, a tener en cuenta en caso de spira
-            }
+            yield date_time, campana_importada(campaign_info, campaign_data, filas, cte_instrument)
         else:
-            print(f"Fecha no encontrada en {filename}")
+            _avisar(avisos, f"Fecha no encontrada en {filename}")
 
-    return data
 
-def import_Sisgeo(files, index_0, cota):
+def _atributo(elemento, clave):
+    return elemento.attrib.get(clave) if elemento is not None else None
+
+
+def iterar_Sisgeo(files, index_0, cota, avisos=None):
     # importador para archivos de Sisgeo de inclinómetros verticales, con sonda de 0.5 m
     # index_0 marca dónde comienza el inclinómetro, 1000 si no hay cambios en la boca
     # cota es la cota original de index_0=1000
-    # el archivo de sisgeo es un .xml
-
+    # el archivo de sisgeo es un .xml, que se lee con iterparse: los pasos (step) se procesan al cerrarse
+    # y se eliminan del árbol, así que en memoria sólo queda la cabecera
 
     # Contante del instrumento para dar mm de desplazamiento por paso
     cte_instrument = 0.025 # =(1/20000)*0.5*1000
     paso = 0.5
 
-    data = {}
-
     for file in files:
-        # Convertir el contenido del archivo (lista de líneas) en un solo string
-        content = "\n".join(file['lines'])
-
-        # Parsear el contenido XML desde el string
-        root = ET.fromstring(content)
-
         # Para cada archivo se genera una estructura de datos compatible con el json tipo
         filename = file['filename']
-        index = index_0 - 1  # inicializo en índice en cada pasada
 
-        # Inicializar la estructura de datos para la fecha y hora
-        campaign_data = {}
-        date_time = None
+        # Lecturas de cada profundidad por pasada: {depth: {'A1B1': (A, B), 'A3B3': (A, B)}}
+        # Las pasadas se emparejan por profundidad y no por su orden en el archivo, así que un paso que
+        # falta o se repite en una de ellas no desplaza a180 respecto a a0.
+        lecturas = {}
+        repetidas = {run: [] for run in RUNS_SISGEO}
+
+        # Paso 1. Recorre el XML: cabecera (hijos directos de la raíz) y pasos de test/run/step
+        root = None
+        cabecera = {}  # primer elemento de cada etiqueta hija de la raíz
+        ruta = []  # elementos abiertos, de la raíz al actual
+        with archivo_binario(file) as origen:
+            for evento, elemento in ET.iterparse(origen, events=("start", "end")):
+                if evento == "start":
+                    if root is None:
+                        root = elemento
+                    elif len(ruta) == 1:
+                        cabecera.setdefault(elemento.tag, elemento)
+                    ruta.append(elemento)
+                    continue
+
+                ruta.pop()
+                etiquetas = [e.tag for e in ruta[1:]] + [elemento.tag]
+                if etiquetas == ['test', 'run', 'step']:
+                    run_type = ruta[-1].get('type')
+                    depth = float(elemento.get('depth'))
+                    a_value = float(elemento.get('A'))
+                    b_value = float(elemento.get('B'))
+
+                    pasadas = lecturas.setdefault(depth, {})
+                    if run_type in RUNS_SISGEO:
+                        if run_type in pasadas:
+                            repetidas[run_type].append(depth)  # se queda la última lectura
+                        pasadas[run_type] = (a_value, b_value)
+                if etiquetas in (['test', 'run', 'step'], ['test', 'run']):
+                    ruta[-1].remove(elemento)  # ya procesado
 
         # hay que formatear la fecha
         # Convertir la fecha original a un objeto datetime
-        fecha_obj = datetime.fromisoformat(root.find('test').attrib.get('date'))
+        fecha_obj = datetime.fromisoformat(_atributo(cabecera.get('test'), 'date'))
 
         # Convertir el objeto datetime a un string sin fracción de segundos
         date_time = fecha_obj.strftime("%Y-%m-%dT%H:%M:%S") # fecha_sin_fraccion
 
-        # Listas de variables para almacenar los datos
-        index_values = []
-        abs_depth_values = []
-        depth_values = []
-        a0_values = []
-        a180_values = []
-        b0_values = []
-        b180_values = []
-
         # info asociada a la campaña. Por defecto
         campaign_info = {
             "index_0": index_0,
@@ -238,7 +276,9 @@ def import_Sisgeo(files, index_0, cota):
             "alarm": "por definir"
         }
 
-        # Paso 1. Rellena los datos de la campaña
+        # Paso 2. Rellena los datos de la campaña
+        site_description = cabecera.get('site_description')
+        tube_description = cabecera.get('tube_description')
         campaign_data = {
             "xml_version": root.attrib.get('version'),
             "encoding": root.attrib.get('encoding'),
@@ -252,184 +292,142 @@ def import_Sisgeo(files, index_0, cota):
             "runs": root.attrib.get('runs'),
             "length": root.attrib.get('length'),
             "azimuth": root.attrib.get('azimuth'),
-            "site_description": root.findtext('site_description'),
-            "tube_description": root.findtext('tube_description'),
-            "application_version": root.find('application').attrib.get('version') if root.find('application') is not None else None,
-            "master_type": root.find('master').attrib.get('type') if root.find('master') is not None else None,
-            "serial": root.find('master').attrib.get('serial') if root.find('master') is not None else None,
-            "firmware": root.find('master').attrib.get('firmware') if root.find('master') is not None else None,
-            "probe_serial": root.find('instrument').attrib.get('serial') if root.find('instrument') is not None else None,
-            "hardware": root.find('instrument').attrib.get('hardware') if root.find('instrument') is not None else None,
-            "reading_units": root.find('instrument').attrib.get('unit') if root.find('instrument') is not None else None,
-            "factor": root.find('instrument').attrib.get('factor') if root.find('instrument') is not None else None,
-            "calibration": root.find('instrument').attrib.get('calibration') if root.find('instrument') is not None else None,
+            "site_description": (site_description.text or "") if site_description is not None else None,
+            "tube_description": (tube_description.text or "") if tube_description is not None else None,
+            "application_version": _atributo(cabecera.get('application'), 'version'),
+            "master_type": _atributo(cabecera.get('master'), 'type'),
+            "serial": _atributo(cabecera.get('master'), 'serial'),
+            "firmware": _atributo(cabecera.get('master'), 'firmware'),
+            "probe_serial": _atributo(cabecera.get('instrument'), 'serial'),
+            "hardware": _atributo(cabecera.get('instrument'), 'hardware'),
+            "reading_units": _atributo(cabecera.get('instrument'), 'unit'),
+            "factor": _atributo(cabecera.get('instrument'), 'factor'),
+            "calibration": _atributo(cabecera.get('instrument'), 'calibration'),
             "fecha_campo": date_time,
         }
 
-        # Paso 2. Recorre las líneas con lecturas y separa las variables
-        for test in root.findall('test'):
-            #date_time = test.get('date') # esto no está muy pulido
-            for run in test.findall('run'):
-                run_type = run.get('type')
-
-                for step in run.findall('step'):
-                    depth = float(step.get('depth'))
-                    a_value = float(step.get('A'))
-                    b_value = float(step.get('B'))
-
-                    # Add depth value only once (to avoid duplication)
-                    if depth not in depth_values:
-                        index += 1
-                        abs_depth = cota - (index - index_0 + 1) * paso
-
-                        index_values.append(index)
-                        abs_depth_values.append(abs_depth)
-                        depth_values.append(depth)
-
-                    if run_type == 'A1B1':
-                        a0_values.append(a_value)
-                        b0_values.append(b_value)
-                    elif run_type == 'A3B3':
-                        a180_values.append(a_value)
-                        b180_values.append(b_value)
-
-        # Paso 3. Añado la última fila, para que parta el cálculo de cero
-        index_values.append(index_values[-1] + 1)  # posición absoluta en el índice del tubo
-        abs_depth_values.append(cota - (index_values[-1] - index_0 + 1) * paso)
-        depth_values.append(depth_values[-1] + paso)
-        a0_values.append(0)
-        a180_values.append(0)
-        b0_values.append(0)
-        b180_values.append(0)
+        if not lecturas:
+            _avisar(avisos, f"No se encontraron lecturas en {filename}")
+            continue
+
+        # Paso 3. Filas emparejadas por profundidad. Cada profundidad ocupa su posición en la rejilla de
+        # pasos desde la primera (index = index_0 + posición), así que un paso que falta en una pasada o en
+        # las dos deja un hueco en el índice en lugar de desplazar los siguientes; esos pasos no se importan
+        primera = min(lecturas)
+        por_posicion = {}
+        for depth in lecturas:
+            posicion = round((depth - primera) / paso)
+            if posicion in por_posicion:
+                _avisar(avisos, f"{filename}: profundidades {por_posicion[posicion]:g} y {depth:g} en el mismo paso, "
+                      f"se usa la de {depth:g}")
+            por_posicion[posicion] = depth
+        num_pasos = max(por_posicion) + 1
+
+        filas = []
+        huecos = {run: [] for run in RUNS_SISGEO}
+        for posicion in range(num_pasos):
+            depth = por_posicion.get(posicion)
+            pasadas = lecturas[depth] if depth is not None else {}
+            faltan = [run for run in RUNS_SISGEO if run not in pasadas]
+            for run in faltan:
+                huecos[run].append(depth if depth is not None else primera + posicion * paso)
+            if not faltan:
+                index = index_0 + posicion  # posición absoluta en el índice del tubo
+                (a0, b0), (a180, b180) = pasadas['A1B1'], pasadas['A3B3']
+                filas.append((index, cota - (index - index_0 + 1) * paso, depth, a0, a180, b0, b180))
+        for run in RUNS_SISGEO:
+            if huecos[run]:
+                _avisar(avisos, f"{filename}: profundidades sin lectura {run}, no se importan: "
+                      f"{', '.join(f'{d:g}' for d in huecos[run])}")
+            if repetidas[run]:
+                _avisar(avisos, f"{filename}: profundidades con varias lecturas {run}, se usa la última: "
+                      f"{', '.join(f'{d:g}' for d in repetidas[run])}")
+
+        # Paso 4. Añado la última fila, para que parta el cálculo de cero
+        index = index_0 + num_pasos
+        filas.append((index, cota - (index - index_0 + 1) * paso, por_posicion[num_pasos - 1] + paso, 0, 0, 0, 0))
 
-        # Paso 4. Generar la estructura de salida compatible con JSON
-        raw_entries = []  # valores raw
-        calc_entries = []  # convertidos en mm
-
-        # Paso 4.a. Primero inserto los valores raw
-        for i in range(len(depth_values)):
-            entry = {
-                "index": index_values[i],  # posición absoluta en el índice del tubo
-                "cota_abs": abs_depth_values[i],  # cota absoluta
-                "depth": depth_values[i],  # considero las profundidades positivas
-                "a0": a0_values[i],
-                "a180": a180_values[i],
-                "b0": b0_values[i],
-                "b180": b180_values[i]
-            }
-            raw_entries.append(entry)
-
-        # Paso 4.b. Calcula los valores raw normalizados
-        # Se crea el bloque "normalizados", sólo es el paso a mm del raw.
-        # Es por unificar debido a como da los datos Sisgeo
-        # En resumen, habrá dos bloques además del raw:
-        #  - normalizados, en mm. Es un raw en mm, nunca va a cambiar
-        #  - calc, en mm. En este paso del importador serán iguales, luego puede cambiar con las correcciones
-        for i in range(len(depth_values)):
-            entry = valores_calc_directos(
-                index_values[i], abs_depth_values[i],
-                depth_values[i], a0_values[i], a180_values[i],
-                b0_values[i], b180_values[i], cte_instrument)
-            calc_entries.append(entry)
-        # Nota: el bloque que depende de los cáculos con referncias y profundidades, se calcula fuera del importador
-
-        # Paso 4.c. Añadir la información al diccionario final
         if date_time:
-            data[date_time] = {
-                "campaign_info": campaign_info,
-                "info_readout": campaign_data,
-                "raw": raw_entries,
-                #"normalizados": calc_entries,
-                "calc": calc_entries  # en la importación no hay cambios en calculado, a tener en cuenta en caso de spira
-            }
+            yield date_time, campana_importada(campaign_info, campaign_data, filas, cte_instrument)
         else:
-            print(f"Fecha no encontrada en {filename}")
-    return data
+            _avisar(avisos, f"Fecha no encontrada en {filename}")
 
 
-def import_soil_dux(files, index_0, cota):
+def iterar_soil_dux(files, index_0, cota, avisos=None):
     # Constantes del instrumento
     cte_instrument = 0.005  # La salida es en 100.000*sen -> 100.000*sen = R -> sen = delta/L -> R/100.000 = delta / L
     # L=0.5m = 0.5*1000 -> delta = R * 0.005
     paso = 0.5  # Intervalo de medición en metros
 
-    data = {}
-
     for file in files:
         filename = file['filename']
-        lines = file['lines']
 
         index = index_0 - 1
+        date_time = None
         campaign_data = {}
         campaign_info = {}
-        raw_entries = []
-        calc_entries = []
-
-        # Extraer información de instalación
-        for line in lines:
-            if line.startswith("Installation v1"):
-                install_params = line.strip().split(',')
-                campaign_info = {
-                    "index_0": index_0,
-                    "importador": "Soil (dux)",
-                    "instrument_constant": cte_instrument,
-                    "reference": False,
-                    "active": True,
-                    "quarentine": False,
-                    "alarm": "por definir"
-                }
-            elif line.startswith("Survey v1"):
-                survey_params = line.strip().split(',')
-                date_str = survey_params[1]  # Fecha en formato YYYY/MM/DD HH:MM:SS
-                date_time = datetime.strptime(date_str, "%Y/%m/%d %H:%M:%S").isoformat()
-                campaign_data = {
-                    "probe_serial": survey_params[4],
-                    "factor": float(survey_params[5]),
-                    "fecha_campo": date_time
-                }
-                break  # Ya tenemos la información necesaria del encabezado
-
-        # Extraer los datos de medición
-        for line in lines:
-            if re.match(r"^\d+\.\d+,-?\d+,-?\d+,-?\d+,-?\d+$", line.strip()):
-                values = list(map(float, line.strip().split(',')))
-                depth, a0, a180, b0, b180 = values
+        filas = []
+
+        # Una sola pasada: información de instalación y de la campaña (hasta la línea "Survey v1")
+        # y datos de medición
+        cabecera_leida = False
+        for line in lineas_archivo(file):
+            if not cabecera_leida:
+                if line.startswith("Installation v1"):
+                    campaign_info = {
+                        "index_0": index_0,
+                        "importador": "Soil (dux)",
+                        "instrument_constant": cte_instrument,
+                        "reference": False,
+                        "active": True,
+                        "quarentine": False,
+                        "alarm": "por definir"
+                    }
+                elif line.startswith("Survey v1"):
+                    survey_params = line.strip().split(',')
+                    date_str = survey_params[1]  # Fecha en formato YYYY/MM/DD HH:MM:SS
+                    date_time = datetime.strptime(date_str, "%Y/%m/%d %H:%M:%S").isoformat()
+                    campaign_data = {
+                        "probe_serial": survey_params[4],
+                        "factor": float(survey_params[5]),
+                        "fecha_campo": date_time
+                    }
+                    cabecera_leida = True  # Ya tenemos la información necesaria del encabezado
+
+            if PATRON_LECTURA_DUX.match(line.strip()):
+                depth, a0, a180, b0, b180 = map(float, line.strip().split(','))
 
                 index += 1
                 abs_depth = cota - (index - index_0 + 1) * paso
+                filas.append((index, abs_depth, depth, a0, a180, b0, b180))
 
-                entry = {
-                    "index": index,
-                    "cota_abs": abs_depth,
-                    "depth": depth,
-                    "a0": a0,
-                    "a180": a180,
-                    "b0": b0,
-                    "b180": b180
-                }
-                raw_entries.append(entry)
-                calc_entries.append(valores_calc_directos(index, abs_depth, depth, a0, a180, b0, b180, cte_instrument))
-
+        if not filas:
+            _avisar(avisos, f"Lecturas no encontradas en {filename}")
+            continue
         # Agregar una última fila para cierre
-        index += 1
-        abs_depth -= paso
-        raw_entries.append(
-            {"index": index, "cota_abs": abs_depth, "depth": depth + paso, "a0": 0, "a180": 0, "b0": 0, "b180": 0})
-        calc_entries.append(valores_calc_directos(index, abs_depth, depth + paso, 0, 0, 0, 0, cte_instrument))
+        index, abs_depth, depth = filas[-1][:3]
+        filas.append((index + 1, abs_depth - paso, depth + paso, 0, 0, 0, 0))
 
         # Guardar en la estructura final
         if date_time:
-            data[date_time] = {
-                "campaign_info": campaign_info,
-                "info_readout": campaign_data,
-                "raw": raw_entries,
-                #"normalizados": calc_entries,
-                "calc": calc_entries
-            }
+            yield date_time, campana_importada(campaign_info, campaign_data, filas, cte_instrument)
         else:
-            print(f"Fecha no encontrada en {filename}")
+            _avisar(avisos, f"Fecha no encontrada en {filename}")
 
-    return data
+
+def import_RST(files, index_0, cota):
+    # campañas de los archivos de RST: {fecha: campaña} (ver iterar_RST)
+    return dict(iterar_RST(files, index_0, cota))
+
+
+def import_Sisgeo(files, index_0, cota):
+    # campañas de los archivos de Sisgeo: {fecha: campaña} (ver iterar_Sisgeo)
+    return dict(iterar_Sisgeo(files, index_0, cota))
+
+
+def import_soil_dux(files, index_0, cota):
+    # campañas de los archivos de Soil (dux): {fecha: campaña} (ver iterar_soil_dux)
+    return dict(iterar_soil_dux(files, index_0, cota))
 
 # Funciones auxiliares   +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 def insertar_camp(data, fechas_agg, selected_filename, data_path):
@@ -442,23 +440,9 @@ def insertar_camp(data, fechas_agg, selected_filename, data_path):
 
         file_path = os.path.join(data_path, selected_filename)
 
-        # Cargar el contenido actual del archivo JSON
-        # realmente se puede optimizar porque el archivo json ya esta en memoria, pero esto penaliza poco
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as json_file:
-                existing_data = json.load(json_file)
-        else:
-            existing_data = {}
-
-        # Filtrar selected_file_data para incluir solo las fechas en fechas_agg
-        filtered_data = {key: value for key, value in data.items() if key in fechas_agg}
-
-        # Actualizar el contenido existente con los nuevos datos
-        existing_data.update(filtered_data)
-
-        # Guardar el archivo actualizado
-        with open(file_path, 'w') as json_file:
-            json.dump(existing_data, json_file, indent=4)
+        # Guardar sólo las fechas en fechas_agg, sin releer ni reescribir el tubo: en binario (.tubo)
+        # se añaden al final del archivo y en JSON se anotan en su diario (utils/diario_tubo.py)
+        guardar_campanas(file_path, data, fechas_agg)
 
         return "campañas añadidas"
     except Exception as e:
@@ -501,41 +485,17 @@ def default_value(data):
                 "umbrales": content.get("umbrales", "por_definir")
             })
 
-        # Obtener todas las claves del diccionario que parezcan fechas (campañas)
-        fechas = sorted([clave for clave in data.keys() if isinstance(clave, str) and "T" in clave])
+        # Índice temporal de las campañas del tubo
+        indice = TimelineIndex.de_tubo(data)
 
         # Si no hay fechas (campañas), retornar los valores por defecto
-        if not fechas:
+        if not len(indice):
             return extracted_data
 
-        # Obtener las últimas campañas
-        latest_date = None
-        camp_anterior_referencia = None
-        latest_reference = None
-
-        # Recorre la lista en orden inverso para encontrar la última campaña activa
-        for fecha in reversed(fechas):
-            if data[fecha].get("campaign_info", {}).get("active", False):
-                latest_date = fecha
-                break
-
-        # Última referencia activa
-        for fecha in reversed(fechas):
-            campaign_info = data[fecha].get("campaign_info", {})
-            if campaign_info.get("reference", False) and campaign_info.get("active", False):
-                latest_reference = fecha
-                break
-
-        # Campaña activa anterior a la última referencia
-        if latest_reference:
-            try:
-                idx_latest = fechas.index(latest_reference)
-                for fecha in reversed(fechas[:idx_latest]):
-                    if data[fecha].get("campaign_info", {}).get("active", False):
-                        camp_anterior_referencia = fecha
-                        break
-            except ValueError:
-                print("Error: latest_reference no se encuentra en la lista de fechas")
+        # Última campaña activa, última referencia activa y campaña activa anterior a esta
+        latest_date = indice.ultima_activa()
+        latest_reference = indice.ultima_referencia_activa()
+        camp_anterior_referencia = indice.activa_anterior(latest_reference) if latest_reference else None
 
         # Obtener información de la última campaña activa
         latest_importador = data[latest_date].get("campaign_info", {}).get("importador") if latest_date else None
@@ -0,0 +1,151 @@
+# utils/importacion_paralela.py
+
+import contextlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.funciones_importar import iterar_RST, iterar_Sisgeo, iterar_soil_dux
+
+# Importación de muchos archivos de lecturas a la vez (p. ej. todo el histórico de un tubo).
+# Cada archivo se importa por separado en un proceso del pool: un archivo mal formado sólo afecta a
+# ese archivo, y sus mensajes (los avisos del importador) se recogen con él. El resultado indica
+# las campañas, los avisos y los archivos que fallaron con el motivo, y cuánto tardó cada uno.
+# Las campañas se reúnen en el orden de los archivos, así que si una fecha se repite vale la del último,
+# como al importarlos en serie. El progreso se puede seguir con al_terminar o, desde otro hilo (la
+# página importar), con estado_importacion.
+
+ITERADORES = {
+    "RST": iterar_RST,
+    "Sisgeo": iterar_Sisgeo,
+    "Soil (dux)": iterar_soil_dux,
+}
+
+MAX_PROCESOS_IMPORTACION = os.cpu_count() or 1
+MIN_ARCHIVOS_POOL = 8  # con menos archivos no compensa arrancar los procesos
+
+_progreso = {"total": 0, "terminados": 0, "archivo": None, "activa": False}
+_lock_progreso = threading.Lock()
+
+
+def estado_importacion():
+    """Progreso de la importación en curso: {"total", "terminados", "archivo", "activa"}."""
+    with _lock_progreso:
+        return dict(_progreso)
+
+
+def _actualizar_progreso(**valores):
+    with _lock_progreso:
+        _progreso.update(valores)
+
+
+def importar_archivo(importador, file, index_0, cota, omitir_fechas=None):
+    """
+    Importa un archivo de lecturas.
+
+    Args:
+        importador (str): "RST", "Sisgeo" o "Soil (dux)".
+        file (dict): archivo como lo reciben los importadores ('filename' y 'ruta', 'contenido' o 'lines').
+        index_0, cota: como en los importadores.
+        omitir_fechas (set): fechas que no se devuelven (p. ej. las que ya tiene el tubo).
+
+    Returns:
+        dict: {"filename", "campanas", "avisos", "error", "segundos"}. error es el motivo si el archivo no
+        se pudo importar o no tiene ninguna campaña.
+    """
+    inicio = time.perf_counter()
+    avisos = []
+    campanas = {}
+    error = None
+    try:
+        # los avisos se recogen en la lista y no redirigiendo sys.stdout, que es de todo el proceso
+        # (en el servidor Dash hay otros hilos escribiendo en la consola)
+        for fecha, campana in ITERADORES[importador]([file], index_0, cota, avisos):
+            if not omitir_fechas or fecha not in omitir_fechas:
+                campanas[fecha] = campana
+            else:
+                campanas.setdefault(fecha, None)  # leída pero omitida: el archivo es válido
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    if error is None and not campanas:
+        error = avisos[-1] if avisos else "No se encontró ninguna campaña"
+    return {"filename": file['filename'], "campanas": {f: c for f, c in campanas.items() if c is not None},
+            "avisos": avisos, "error": error, "segundos": time.perf_counter() - inicio}
+
+
+def _importar_en_proceso(argumentos):
+    # en un proceso del pool sólo se importa este archivo: lo que escriba en la consola es suyo
+    mensajes = io.StringIO()
+    with contextlib.redirect_stdout(mensajes):
+        resultado = importar_archivo(*argumentos)
+    resultado["avisos"] += [linea.strip() for linea in mensajes.getvalue().splitlines() if linea.strip()]
+    return resultado
+
+
+def importar_archivos(importador, files, index_0, cota, procesos=None, omitir_fechas=None, al_terminar=None):
+    """
+    Importa varios archivos de lecturas, en paralelo si son suficientes y hay más de un núcleo.
+
+    Args:
+        importador (str): "RST", "Sisgeo" o "Soil (dux)".
+        files (list): archivos como los reciben los importadores.
+        index_0, cota: como en los importadores.
+        procesos (int): número máximo de procesos (por defecto MAX_PROCESOS_IMPORTACION; 1 = sin pool).
+        omitir_fechas (set): fechas que no se devuelven (ver importar_archivo).
+        al_terminar (callable): se llama con (resultado del archivo, terminados, total) según van terminando.
+
+    Returns:
+        dict: {"campanas": {fecha: campaña}, "avisos": {archivo: [mensajes]}, "fallidos": {archivo: motivo},
+        "tiempos": {archivo: segundos}, "segundos": total}
+    """
+    if importador not in ITERADORES:
+        raise ValueError(f"Importador no reconocido: {importador}")
+    inicio = time.perf_counter()
+    trabajos = [(importador, file, index_0, cota, omitir_fechas) for file in files]
+    resultados = [None] * len(trabajos)
+    _actualizar_progreso(total=len(trabajos), terminados=0, archivo=None, activa=True)
+
+    def anotar(posicion, resultado):
+        resultados[posicion] = resultado
+        terminados = sum(1 for r in resultados if r is not None)
+        _actualizar_progreso(terminados=terminados, archivo=resultado["filename"])
+        if al_terminar:
+            al_terminar(resultado, terminados, len(trabajos))
+
+    try:
+        procesos = min(procesos or MAX_PROCESOS_IMPORTACION, len(trabajos))
+        if procesos > 1 and len(trabajos) >= MIN_ARCHIVOS_POOL:
+            try:
+                with ProcessPoolExecutor(max_workers=procesos) as pool:
+                    futuros = {pool.submit(_importar_en_proceso, trabajo): k for k, trabajo in enumerate(trabajos)}
+                    for futuro in as_completed(futuros):
+                        anotar(futuros[futuro], futuro.result())
+            except Exception as e:
+                # p. ej. un proceso del pool ha muerto: los archivos que faltan se importan en este proceso
+                print(f"No se pudo importar en paralelo ({e}), se continúa en este proceso")
+        for k, trabajo in enumerate(trabajos):
+            if resultados[k] is None:
+                anotar(k, importar_archivo(*trabajo))
+    finally:
+        _actualizar_progreso(activa=False)
+
+    campanas = {}
+    origen = {}
+    avisos = {}
+    fallidos = {}
+    for resultado in resultados:
+        nombre = resultado["filename"]
+        for fecha, campana in resultado["campanas"].items():
+            if fecha in origen:
+                resultado["avisos"].append(f"Fecha {fecha} repetida en {origen[fecha]}, se usa la de {nombre}")
+            campanas[fecha] = campana
+            origen[fecha] = nombre
+        if resultado["avisos"]:
+            avisos[nombre] = resultado["avisos"]
+        if resultado["error"]:
+            fallidos[nombre] = resultado["error"]
+    return {"campanas": campanas, "avisos": avisos, "fallidos": fallidos,
+            "tiempos": {resultado["filename"]: resultado["segundos"] for resultado in resultados},
+            "segundos": time.perf_counter() - inicio}
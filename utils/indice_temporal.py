@@ -0,0 +1,138 @@
+# utils/indice_temporal.py
+
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime
+
+# Índice temporal de las campañas de un tubo.
+# Se construye una vez por tubo: fechas ordenadas (ISO y datetime) y marcas de activa/referencia,
+# con búsquedas por bisección de la referencia vigente y de la campaña activa anterior.
+# Los índices se guardan en una caché indexada por la firma del tubo (fechas + active/reference de
+# cada campaign_info), de modo que cualquier cambio en campaign_info genera un índice nuevo.
+# La caché no guarda referencias a los tubos (los dicts de los callbacks se liberan al terminar) y,
+# como la firma incluye las marcas, un cambio en el sitio de active/reference nunca devuelve un índice
+# viejo. Calcular la firma es una pasada por las claves del tubo: quien haga muchas búsquedas sobre el
+# mismo tubo obtiene el índice una vez y lo reutiliza (recalcular_tubo, calcular_incrementos, scripts
+# de biblioteca_graficos).
+
+MAX_INDICES_EN_CACHE = 32
+_indices = OrderedDict()
+
+CLAVES_NO_CAMPANA = ("info", "umbrales")
+
+
+def _firma_tubo(tubo):
+    # firma barata del tubo: no parsea fechas ni ordena, sólo lee las marcas de campaign_info
+    firma = []
+    for clave, valor in tubo.items():
+        if clave in CLAVES_NO_CAMPANA or not isinstance(valor, dict):
+            continue
+        campaign_info = valor.get('campaign_info')
+        if isinstance(campaign_info, dict):
+            firma.append((clave, True, campaign_info.get('active') == True, bool(campaign_info.get('reference'))))
+        else:
+            firma.append((clave, False, False, False))
+    return tuple(firma)
+
+
+def _a_datetime(fecha):
+    # admite str ISO o datetime
+    return fecha if isinstance(fecha, datetime) else datetime.fromisoformat(fecha)
+
+
+class TimelineIndex:
+    """
+    Línea temporal ordenada de las campañas de un tubo.
+
+    Atributos:
+        fechas (list): claves ISO de las campañas, de más antigua a más reciente.
+        fechas_dt (list): las mismas fechas como datetime.
+        con_info (list): la campaña tiene bloque campaign_info.
+        activa (list): campaign_info.active == True.
+        referencia (list): campaign_info.reference.
+
+    Se obtiene con TimelineIndex.de_tubo(tubo), que reutiliza el índice mientras no cambien las
+    fechas ni las marcas active/reference del tubo.
+    """
+
+    def __init__(self, firma):
+        entradas = []
+        for clave, con_info, activa, referencia in firma:
+            try:
+                entradas.append((datetime.fromisoformat(clave), clave, con_info, activa, referencia))
+            except (TypeError, ValueError):
+                continue  # claves que no son fechas (parámetros del data_source, etc.)
+        entradas.sort(key=lambda entrada: entrada[0])
+
+        self.fechas_dt = [entrada[0] for entrada in entradas]
+        self.fechas = [entrada[1] for entrada in entradas]
+        self.con_info = [entrada[2] for entrada in entradas]
+        self.activa = [entrada[3] for entrada in entradas]
+        self.referencia = [entrada[4] for entrada in entradas]
+        # posiciones (en self.fechas) de las campañas activas y de las referencias
+        self._pos_activas = [i for i, activa in enumerate(self.activa) if activa]
+        self._pos_referencias = [i for i, referencia in enumerate(self.referencia) if referencia]
+        self._pos_ref_activas = [i for i in self._pos_referencias if self.activa[i]]
+        self._posicion = {fecha: i for i, fecha in enumerate(self.fechas)}
+
+    @classmethod
+    def de_tubo(cls, tubo):
+        """Devuelve el índice del tubo, construyéndolo sólo si no está ya en caché."""
+        firma = _firma_tubo(tubo)
+        indice = _indices.get(firma)
+        if indice is None:
+            indice = cls(firma)
+            _indices[firma] = indice
+            if len(_indices) > MAX_INDICES_EN_CACHE:
+                _indices.popitem(last=False)
+        else:
+            _indices.move_to_end(firma)
+        return indice
+
+    def __len__(self):
+        return len(self.fechas)
+
+    def fecha_dt(self, fecha):
+        """datetime de una fecha del índice (sin volver a parsearla)."""
+        return self.fechas_dt[self._posicion[fecha]]
+
+    # Búsquedas --------------------------------------------------------------------------------
+    def _ultima_antes(self, posiciones, limite):
+        # última posición de 'posiciones' estrictamente menor que limite, o None
+        k = bisect_left(posiciones, limite)
+        return self.fechas[posiciones[k - 1]] if k > 0 else None
+
+    def activas(self):
+        """Fechas con campaña activa, de más antigua a más reciente."""
+        return [self.fechas[i] for i in self._pos_activas]
+
+    def referencia_vigente(self, fecha):
+        """Última referencia con fecha <= fecha (activa o no), o None."""
+        return self._ultima_antes(self._pos_referencias, bisect_right(self.fechas_dt, _a_datetime(fecha)))
+
+    def activa_anterior(self, fecha):
+        """Última campaña activa con fecha estrictamente anterior a fecha, o None."""
+        return self._ultima_antes(self._pos_activas, bisect_left(self.fechas_dt, _a_datetime(fecha)))
+
+    def primera_activa(self):
+        """Campaña activa más antigua, o None."""
+        return self.fechas[self._pos_activas[0]] if self._pos_activas else None
+
+    def ultima_activa(self):
+        """Campaña activa más reciente, o None."""
+        return self.fechas[self._pos_activas[-1]] if self._pos_activas else None
+
+    def ultima_referencia_activa(self):
+        """Referencia activa más reciente, o None."""
+        return self.fechas[self._pos_ref_activas[-1]] if self._pos_ref_activas else None
+
+    def entre(self, fecha_inicial, fecha_final):
+        """Fechas con fecha_inicial <= fecha <= fecha_final, de más antigua a más reciente."""
+        inicio = bisect_left(self.fechas_dt, _a_datetime(fecha_inicial))
+        fin = bisect_right(self.fechas_dt, _a_datetime(fecha_final))
+        return self.fechas[inicio:fin]
+
+
+def invalidar_indices():
+    """Vacía la caché de índices temporales."""
+    _indices.clear()
@@ -0,0 +1,237 @@
+# utils/informes.py
+
+import contextlib
+import copy
+import glob
+import io
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from utils.funciones_comunes import hex_to_spanish_color
+from utils.indice_temporal import TimelineIndex
+from utils.pdf_generator import generate_pdf_from_template
+from utils.tubo_binario import cargar_tubo, EXTENSIONES_TUBO, DIRECTORIO_DATA
+
+# Preparación de informes PDF y generación en lote.
+# Un informe es una plantilla de biblioteca_plantillas aplicada a un tubo: los parámetros "$CURRENT"
+# de gráficos y tablas se sustituyen por los valores actuales (en la interfaz, los de los controles de
+# graficar; en lote, los mismos valores por defecto que tienen esos controles al cargar un tubo).
+# generar_informes_lote reparte los tubos entre procesos; cada proceso carga la plantilla una vez y
+# conserva entre informes la caché de módulos de los scripts (cargador_plugins), la de matplotlib y
+# la caché de render en disco. Dentro de cada informe los gráficos se renderizan en serie.
+
+BIBLIOTECA_PLANTILLAS = Path("biblioteca_plantillas")
+BIBLIOTECA_GRAFICOS = Path("biblioteca_graficos")
+BIBLIOTECA_TABLAS = Path("biblioteca_tablas")
+
+# valores iniciales de los controles de graficar
+VALORES_POR_DEFECTO = {
+    'eje': "depth",
+    'orden': False,  # "descendente"
+    'orden_ascendente': False,
+    'color_scheme': "monocromo",
+    'escala_desplazamiento': "manual",
+    'escala_incremento': "manual",
+    'valor_positivo_desplazamiento': 20,
+    'valor_negativo_desplazamiento': -20,
+    'valor_positivo_incremento': 1,
+    'valor_negativo_incremento': -1,
+    'escala_temporal': "manual",
+    'valor_positivo_temporal': 10,
+    'valor_negativo_temporal': -10,
+    'total_camp': 30,
+    'ultimas_camp': 30,
+    'cadencia_dias': 30,
+}
+
+CLAVES_DATA_SOURCE = ['fecha_seleccionada', 'ultimas_camp']  # valores actuales que leen los scripts de tabla
+
+_plantilla_proceso = None  # (plantilla, directorio_salida, valores) en cada proceso del pool
+
+
+def leyenda_umbrales_tubo(umbrales_deformadas):
+    """Leyenda de umbrales {deformada: {color, color_hex, tipo_linea}} con los colores del JSON del tubo."""
+    leyenda = {}
+    for nombre_deformada, propiedades in umbrales_deformadas.items():
+        if isinstance(propiedades, dict):
+            color_hex = propiedades.get('color', '#3B82F6')  # Azul por defecto
+            leyenda[nombre_deformada] = {
+                'color': hex_to_spanish_color(color_hex),
+                'color_hex': color_hex,
+                'tipo_linea': propiedades.get('tipo_linea', 'dashed'),  # Discontinua por defecto
+            }
+        else:
+            print(f"ADVERTENCIA: Formato inesperado para deformada {nombre_deformada}")
+            leyenda[nombre_deformada] = {'color': 'azul', 'color_hex': '#3B82F6', 'tipo_linea': 'dashed'}
+    return leyenda
+
+
+def valores_actuales_tubo(tubo, valores=None):
+    """
+    Valores para sustituir "$CURRENT" en un informe sin interfaz: los de VALORES_POR_DEFECTO, el rango
+    completo de fechas del tubo, la última campaña como fecha seleccionada y la leyenda de sus umbrales.
+
+    Args:
+        tubo (dict): tubo en el esquema JSON.
+        valores (dict): valores que sustituyen a los calculados (opcional).
+    """
+    fechas = TimelineIndex.de_tubo(tubo).fechas
+    umbrales = tubo.get('umbrales', {})
+    deformadas = umbrales.get('deformadas', {}) if isinstance(umbrales, dict) else {}
+    actuales = {
+        **VALORES_POR_DEFECTO,
+        'fecha_inicial': fechas[0] if fechas else None,
+        'fecha_final': fechas[-1] if fechas else None,
+        'fecha_seleccionada': fechas[-1] if fechas else None,
+        'sensor': tubo.get('info', {}).get('codigo', 'desconocido'),
+        'nombre_sensor': tubo.get('info', {}).get('nombre', 'Sin nombre'),
+        'leyenda_umbrales': leyenda_umbrales_tubo(deformadas) if isinstance(deformadas, dict) else {},
+    }
+    actuales.update(valores or {})
+    return actuales
+
+
+def aplicar_valores_actuales(plantilla, valores):
+    """Copia de la plantilla con los parámetros "$CURRENT" de gráficos y tablas sustituidos por valores."""
+    plantilla = copy.deepcopy(plantilla)
+    for pagina_data in plantilla.get("paginas", {}).values():
+        for elemento in pagina_data.get("elementos", {}).values():
+            if elemento.get("tipo") in ["grafico", "tabla"] and "configuracion" in elemento:
+                parametros = elemento["configuracion"].get("parametros", {})
+                for param_key, param_value in list(parametros.items()):
+                    if param_value == "$CURRENT" and param_key in valores:
+                        parametros[param_key] = valores[param_key]
+    return plantilla
+
+
+def datos_informe(tubo, valores):
+    """
+    data_source para generate_pdf_from_template: el tubo (copia superficial) más los valores actuales
+    que necesitan los scripts de tabla, sin sobrescribir claves del tubo.
+    """
+    datos = tubo.copy() if tubo else {}
+    for clave in CLAVES_DATA_SOURCE:
+        if clave in valores:
+            datos[clave] = valores[clave]
+    return datos
+
+
+def cargar_plantilla(plantilla):
+    """Plantilla desde la ruta de su JSON o por nombre (biblioteca_plantillas/<nombre>/<nombre>.json)."""
+    ruta = Path(plantilla)
+    if not ruta.exists():
+        ruta = BIBLIOTECA_PLANTILLAS / plantilla / f"{plantilla}.json"
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def expandir_rutas_tubos(patrones):
+    """
+    Rutas de los tubos a partir de rutas o patrones glob (relativos a data/ si no existen tal cual),
+    sin repetir y en el orden dado. Sólo se incluyen archivos con extensión de tubo.
+    """
+    rutas = []
+    for patron in patrones:
+        encontradas = sorted(glob.glob(patron)) or sorted(glob.glob(os.path.join(DIRECTORIO_DATA, patron)))
+        for ruta in encontradas:
+            if os.path.isfile(ruta) and ruta.endswith(EXTENSIONES_TUBO) and ruta not in rutas:
+                rutas.append(ruta)
+    return rutas
+
+
+def generar_informe_tubo(ruta_tubo, plantilla, directorio_salida, valores=None, detalle=False):
+    """
+    Genera el informe de un tubo en directorio_salida/<tubo>_<plantilla>.pdf.
+
+    Args:
+        ruta_tubo (str): tubo de data/ (JSON o binario).
+        plantilla (dict): plantilla de informe.
+        directorio_salida (str): carpeta de los PDF (se crea si no existe).
+        valores (dict): valores "$CURRENT" que sustituyen a los por defecto (opcional).
+        detalle (bool): mostrar la salida de los scripts (por defecto se descarta).
+
+    Returns:
+        dict: {"tubo", "pdf", "segundos", "error", "avisos"}; error es None si el informe se generó y avisos
+        son los mensajes de error de los elementos que no se pudieron dibujar (el PDF se genera sin ellos;
+        sólo se recogen si no se muestra el detalle).
+    """
+    inicio = time.perf_counter()
+    nombre_plantilla = plantilla.get("configuracion", {}).get("nombre_plantilla") or "informe"
+    salida = os.path.join(directorio_salida, f"{Path(ruta_tubo).stem}_{nombre_plantilla}.pdf")
+    mensajes = io.StringIO()
+    try:
+        salida_scripts = contextlib.nullcontext() if detalle else contextlib.redirect_stdout(mensajes)
+        with salida_scripts:
+            tubo = cargar_tubo(ruta_tubo)
+            actuales = valores_actuales_tubo(tubo, valores)
+            buffer = io.BytesIO()
+            generate_pdf_from_template(aplicar_valores_actuales(plantilla, actuales), datos_informe(tubo, actuales),
+                                       buffer, BIBLIOTECA_PLANTILLAS, BIBLIOTECA_GRAFICOS, BIBLIOTECA_TABLAS,
+                                       procesos=1)
+        os.makedirs(directorio_salida, exist_ok=True)
+        with open(salida, "wb") as f:
+            f.write(buffer.getvalue())
+        error = None
+    except Exception as e:
+        salida = None
+        error = f"{type(e).__name__}: {e}"
+        if detalle:
+            traceback.print_exc()
+    # generate_pdf_from_template notifica con print los elementos que fallan y continúa
+    avisos = [linea.strip() for linea in mensajes.getvalue().splitlines() if linea.lstrip().startswith("Error")]
+    return {"tubo": ruta_tubo, "pdf": salida, "segundos": time.perf_counter() - inicio, "error": error,
+            "avisos": avisos}
+
+
+def _iniciar_proceso_lote(plantilla, directorio_salida, valores, detalle):
+    global _plantilla_proceso
+    _plantilla_proceso = (plantilla, directorio_salida, valores, detalle)
+
+
+def _informe_en_proceso(ruta_tubo):
+    plantilla, directorio_salida, valores, detalle = _plantilla_proceso
+    return generar_informe_tubo(ruta_tubo, plantilla, directorio_salida, valores, detalle)
+
+
+def generar_informes_lote(plantilla, rutas_tubos, directorio_salida, procesos=None, valores=None,
+                          detalle=False, al_terminar=None):
+    """
+    Genera el informe de cada tubo con la misma plantilla, en paralelo.
+
+    Args:
+        plantilla (dict): plantilla de informe (ver cargar_plantilla).
+        rutas_tubos (list): tubos (ver expandir_rutas_tubos).
+        directorio_salida (str): carpeta de los PDF.
+        procesos (int): número máximo de procesos (por defecto los núcleos del equipo; 1 = sin pool).
+        valores (dict): valores "$CURRENT" comunes a todos los tubos (opcional).
+        detalle (bool): mostrar la salida de los scripts.
+        al_terminar (callable): se llama con el resultado de cada tubo según van terminando.
+
+    Returns:
+        list: resultados de generar_informe_tubo, en el orden de rutas_tubos.
+    """
+    procesos = min(procesos or os.cpu_count() or 1, len(rutas_tubos))
+    resultados = {}
+
+    def anotar(resultado):
+        resultados[resultado["tubo"]] = resultado
+        if al_terminar:
+            al_terminar(resultado)
+
+    if procesos > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso_lote,
+                                     initargs=(plantilla, directorio_salida, valores, detalle)) as pool:
+                for futuro in as_completed([pool.submit(_informe_en_proceso, ruta) for ruta in rutas_tubos]):
+                    anotar(futuro.result())
+        except Exception as e:
+            # p. ej. un proceso del pool ha muerto: los tubos que faltan se generan en este proceso
+            print(f"No se pudo generar en paralelo ({e}), se continúa en este proceso")
+    for ruta in rutas_tubos:
+        if ruta not in resultados:
+            anotar(generar_informe_tubo(ruta, plantilla, directorio_salida, valores, detalle))
+    return [resultados[ruta] for ruta in rutas_tubos]
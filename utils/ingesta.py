@@ -0,0 +1,194 @@
+# utils/ingesta.py
+
+import contextlib
+import io
+import os
+import time
+import traceback
+
+from utils.funciones_comunes import recalcular_tubo
+from utils.funciones_importar import es_fecha_isoformat, default_value, parse_alarm_val
+from utils.importacion_paralela import importar_archivos
+from utils.tubo_binario import cargar_tubo, guardar_campanas
+from utils.umbrales_compilados import evaluar_tubo
+
+# Importación de lecturas sin interfaz: los mismos pasos que la página importar, para muchos tubos.
+# Para cada tubo se buscan sus lecturas en una carpeta con su nombre, se importan en paralelo
+# (importar_archivos) con el importador de su última campaña, se descartan las fechas que el tubo ya tiene, se recalcula desde la primera fecha
+# nueva (recalcular_tubo), se evalúan los umbrales de las campañas nuevas y se guardan en el archivo
+# del tubo (guardar_campanas) junto con las campañas posteriores que haya cambiado el recálculo.
+# Las campañas nuevas quedan activas y sin cuarentena, como en la página, y la primera es referencia
+# si el tubo no tenía campañas.
+# Este módulo (y lo que importa) no carga Dash, para que la línea de comandos arranque rápido.
+
+# importador (mismo nombre que en utils.diccionarios.importadores) -> extensiones de los archivos de lectura
+EXTENSIONES_LECTURAS = {
+    "RST": (".csv",),
+    "Sisgeo": (".xml",),
+    "Soil (dux)": (".dux",),
+}
+
+INDEX_0_POR_DEFECTO = 1000
+
+
+def _normalizar(nombre):
+    return " ".join(str(nombre).lower().replace("_", " ").split())
+
+
+def nombres_tubo(ruta_tubo, tubo=None):
+    """Nombres con los que se reconoce la carpeta de lecturas del tubo: el del archivo y nom_sensor."""
+    nombres = {_normalizar(os.path.splitext(os.path.basename(ruta_tubo))[0])}
+    nom_sensor = (tubo or {}).get("info", {}).get("nom_sensor")
+    if nom_sensor:
+        nombres.add(_normalizar(nom_sensor))
+    return nombres
+
+
+def carpetas_lecturas(directorio, rutas_tubos):
+    """
+    Carpeta de lecturas de cada tubo: la subcarpeta de directorio (a cualquier profundidad) con el nombre
+    del archivo del tubo o su nom_sensor (sin distinguir mayúsculas, espacios ni guiones bajos).
+    Con un único tubo y sin subcarpeta con su nombre se usa el propio directorio.
+
+    Returns:
+        dict: {ruta_tubo: carpeta}; los tubos sin carpeta no aparecen.
+    """
+    por_nombre = {}
+    for raiz, subcarpetas, _ in os.walk(directorio):
+        for subcarpeta in subcarpetas:
+            por_nombre.setdefault(_normalizar(subcarpeta), os.path.join(raiz, subcarpeta))
+
+    carpetas = {}
+    for ruta_tubo in rutas_tubos:
+        try:
+            tubo = cargar_tubo(ruta_tubo)
+        except Exception:
+            tubo = None  # se informará al procesarlo
+        for nombre in sorted(nombres_tubo(ruta_tubo, tubo)):
+            if nombre in por_nombre:
+                carpetas[ruta_tubo] = por_nombre[nombre]
+                break
+    if len(rutas_tubos) == 1 and not carpetas:
+        carpetas[rutas_tubos[0]] = directorio
+    return carpetas
+
+
+def importador_de_carpeta(carpeta):
+    """Importador cuyas extensiones tiene la carpeta, o None si no hay ninguno o hay varios."""
+    extensiones = {os.path.splitext(nombre)[1].lower() for nombre in os.listdir(carpeta)}
+    candidatos = [importador for importador, ext in EXTENSIONES_LECTURAS.items() if extensiones.intersection(ext)]
+    return candidatos[0] if len(candidatos) == 1 else None
+
+
+def archivos_lecturas(carpeta, importador):
+    """Archivos de lectura de la carpeta (sin subcarpetas) como los recibe el importador: [{filename, ruta}]."""
+    extensiones = EXTENSIONES_LECTURAS[importador]
+    archivos = []
+    for nombre in sorted(os.listdir(carpeta)):
+        ruta = os.path.join(carpeta, nombre)
+        if os.path.isfile(ruta) and os.path.splitext(nombre)[1].lower() in extensiones:
+            archivos.append({'filename': nombre, 'ruta': ruta})  # el importador lo lee en streaming
+    return archivos
+
+
+def ingerir_tubo(ruta_tubo, carpeta, importador=None, index_0=None, detalle=False, procesos=None,
+                 al_importar=None):
+    """
+    Importa las lecturas nuevas de la carpeta en el tubo y guarda el archivo.
+
+    Args:
+        ruta_tubo (str): tubo de data/ (JSON o binario).
+        carpeta (str): carpeta con los archivos de lectura.
+        importador (str): "RST", "Sisgeo" o "Soil (dux)" (por defecto el de la última campaña del tubo
+            o, si no tiene, el que corresponde a las extensiones de la carpeta).
+        index_0 (int): index_0 de las campañas nuevas (por defecto el de la última campaña, o 1000).
+        detalle (bool): mostrar la salida de los importadores (por defecto se descarta).
+        procesos (int): procesos para importar los archivos (ver importar_archivos).
+        al_importar (callable): progreso de la importación de archivos (ver importar_archivos).
+
+    Returns:
+        dict: {"tubo", "carpeta", "importador", "nuevas", "guardadas", "alarmas", "avisos", "fallidos",
+        "segundos", "error"}. nuevas son las fechas importadas, guardadas todas las escritas (nuevas y
+        recalculadas), alarmas {fecha: texto de evaluar_umbrales} de las campañas nuevas que superan algún
+        umbral, y avisos y fallidos los de importar_archivos ({archivo: mensajes} y {archivo: motivo}).
+    """
+    inicio = time.perf_counter()
+    resultado = {"tubo": ruta_tubo, "carpeta": carpeta, "importador": importador, "nuevas": [],
+                 "guardadas": [], "alarmas": {}, "avisos": {}, "fallidos": {}, "error": None}
+    try:
+        salida_importador = contextlib.nullcontext() if detalle else contextlib.redirect_stdout(io.StringIO())
+        with salida_importador:
+            tubo = cargar_tubo(ruta_tubo)
+            valores_tubo = default_value(tubo)
+            importador = importador or valores_tubo['importador'] or importador_de_carpeta(carpeta)
+            if importador not in EXTENSIONES_LECTURAS:
+                raise ValueError(f"Importador no reconocido: {importador}")
+            resultado["importador"] = importador
+            if index_0 is None:
+                index_0 = valores_tubo['index_0'] if valores_tubo['index_0'] is not None else INDEX_0_POR_DEFECTO
+
+            # sólo se conservan las campañas de fechas que el tubo no tiene: volver a ejecutar sobre la
+            # misma carpeta no cambia nada
+            archivos = archivos_lecturas(carpeta, importador)
+            importacion = importar_archivos(importador, archivos, index_0, tubo['info']['cota_1000'],
+                                            procesos=procesos, omitir_fechas=set(tubo), al_terminar=al_importar)
+            resultado["avisos"] = importacion["avisos"]
+            resultado["fallidos"] = importacion["fallidos"]
+            importado = {fecha: campana for fecha, campana in importacion["campanas"].items()
+                         if es_fecha_isoformat(fecha)}
+            fechas_agg = sorted(importado)
+            if fechas_agg:
+                es_primera_carga = valores_tubo['latest_campaign'] is None
+                for fecha in fechas_agg:
+                    tubo[fecha] = importado[fecha]
+                    tubo[fecha]["campaign_info"]["reference"] = es_primera_carga and fecha == fechas_agg[0]
+                recalculadas = recalcular_tubo(tubo, desde=fechas_agg[0])
+
+                umbrales = tubo.get('umbrales', {})
+                evaluar = bool(umbrales.get('deformadas') and umbrales.get('valores'))
+                evaluacion = evaluar_tubo(tubo, fechas_agg) if evaluar else {}
+                for fecha in fechas_agg:
+                    alarma = evaluacion[fecha]["alarma"] if evaluar else None
+                    campaign_info = tubo[fecha]["campaign_info"]
+                    campaign_info['alarm'] = parse_alarm_val(alarma)
+                    campaign_info['active'] = True
+                    campaign_info['quarentine'] = False
+                    if alarma:
+                        resultado["alarmas"][fecha] = alarma
+
+                guardadas = sorted(set(fechas_agg).union(recalculadas))
+                guardar_campanas(ruta_tubo, tubo, guardadas)
+                resultado["nuevas"] = fechas_agg
+                resultado["guardadas"] = guardadas
+    except Exception as e:
+        resultado["error"] = f"{type(e).__name__}: {e}"
+        if detalle:
+            traceback.print_exc()
+    resultado["segundos"] = time.perf_counter() - inicio
+    return resultado
+
+
+def ingerir_lecturas(directorio, rutas_tubos, importador=None, index_0=None, detalle=False, procesos=None,
+                     al_importar=None, al_terminar=None):
+    """
+    Importa las lecturas de directorio en cada tubo que tenga carpeta (ver carpetas_lecturas).
+
+    Args:
+        directorio (str): carpeta de lecturas, con una subcarpeta por tubo.
+        rutas_tubos (list): tubos a actualizar.
+        importador, index_0, detalle, procesos, al_importar: ver ingerir_tubo.
+        al_terminar (callable): se llama con el resultado de cada tubo según van terminando.
+
+    Returns:
+        list: resultados de ingerir_tubo de los tubos con carpeta, en el orden de rutas_tubos.
+    """
+    carpetas = carpetas_lecturas(directorio, rutas_tubos)
+    resultados = []
+    for ruta_tubo in rutas_tubos:
+        if ruta_tubo in carpetas:
+            resultado = ingerir_tubo(ruta_tubo, carpetas[ruta_tubo], importador, index_0, detalle, procesos,
+                                     al_importar)
+            resultados.append(resultado)
+            if al_terminar:
+                al_terminar(resultado)
+    return resultados
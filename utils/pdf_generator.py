@@ -14,15 +14,20 @@ from pathlib import Path
 import io
 import base64
 import os
-import tempfile
 import math
 import json
-import importlib.util
 import sys
+import pickle
+import itertools
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from PIL import Image
 import matplotlib.pyplot as plt
 
 from reportlab.graphics import renderPDF
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib.utils import ImageReader
 try:
     from svglib.svglib import svg2rlg
 except ImportError:
@@ -31,6 +36,10 @@ except ImportError:
     def svg2rlg(path):
         raise ImportError("No se ha instalado svglib. Instale con 'pip install svglib'")
 
+from utils.cargador_plugins import cargar_plugin
+from utils.render_vectorial import FORMATO_VECTORIAL, figura_a_drawing
+from utils.cache_render import huella_datos, clave_render, leer_render, guardar_render, recortar_cache_render
+
 # Constantes
 A4_PORTRAIT_WIDTH = 595  # Ancho A4 vertical en puntos (21 cm)
 A4_PORTRAIT_HEIGHT = 842  # Alto A4 vertical en puntos (29.7 cm)
@@ -39,6 +48,20 @@ A4_LANDSCAPE_HEIGHT = 595  # Alto A4 horizontal en puntos (21 cm)
 CM_TO_POINTS = 28.35  # 1 cm = 28.35 puntos
 MM_TO_POINTS = 2.835  # 1 mm = 2.835 puntos
 
+# Renderizado en dos fases: generate_pdf_from_template ejecuta primero los scripts de todos los
+# gráficos y tablas de la plantilla en un pool de procesos (matplotlib no es seguro entre hilos, cada
+# proceso tiene el suyo) y después compone los resultados en el canvas en orden de zIndex.
+# El pool se crea una sola vez por proceso y se reutiliza entre informes: con spawn (Windows, macOS)
+# arrancar cada proceso vuelve a importar todos los módulos, demasiado caro para pagarlo en cada informe.
+# Los datos del informe viajan serializados una vez con cada trabajo y cada proceso del pool sólo los
+# deserializa la primera vez que recibe los de ese informe.
+MAX_PROCESOS_RENDER = os.cpu_count() or 1
+_SIN_RESULTADO = object()  # el elemento no se ha precalculado: su script se ejecuta al dibujarlo
+_pool_render = None  # (procesos, ProcessPoolExecutor) reutilizado entre informes
+_lock_pool_render = threading.Lock()
+_informes = itertools.count()  # identificador de los datos de cada informe enviado al pool
+_data_source_proceso = (None, None)  # (informe, datos) en cada proceso del pool
+
 
 def get_safe_font_name(family, bold=False, italic=False):
     """
@@ -365,20 +388,14 @@ def draw_image(pdf, image_data, page_height, plantilla_dir=None, biblioteca_path
             # Decodificar datos
             img_binary = base64.b64decode(img_data)
 
-            # Crear archivo temporal con la extensión correcta
-            ext = image_data["imagen"].get("formato", "png")
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f".{ext}") as temp_file:
-                temp_file.write(img_binary)
-                temp_path = temp_file.name
-
             # Configurar transparencia si es necesario
             if opacidad < 1.0:
                 pdf.saveState()
                 pdf.setFillAlpha(opacidad)
 
-            # Dibujar imagen
+            # Dibujar imagen (desde memoria)
             pdf.drawImage(
-                temp_path,
+                ImageReader(io.BytesIO(img_binary)),
                 x, y,
                 width=ancho,
                 height=alto,
@@ -389,8 +406,6 @@ def draw_image(pdf, image_data, page_height, plantilla_dir=None, biblioteca_path
             if opacidad < 1.0:
                 pdf.restoreState()
 
-            # Eliminar el archivo temporal
-            os.unlink(temp_path)
             imagen_encontrada = True
         except Exception as e:
             print(f"Error al procesar imagen base64: {str(e)}")
@@ -413,7 +428,8 @@ def draw_image(pdf, image_data, page_height, plantilla_dir=None, biblioteca_path
 
 def load_module_dynamically(script_path):
     """
-    Carga dinámicamente un módulo de Python.
+    Carga dinámicamente un módulo de Python (desde la caché de cargador_plugins: el script sólo se
+    vuelve a ejecutar si ha cambiado).
 
     Args:
         script_path: Ruta completa al archivo Python
@@ -422,19 +438,65 @@ def load_module_dynamically(script_path):
         Módulo cargado o None si hubo error
     """
     try:
-        module_name = Path(script_path).stem  # Nombre del archivo sin extensión
-        spec = importlib.util.spec_from_file_location(module_name, script_path)
-        if not spec:
-            return None
-
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
-        return module
+        return cargar_plugin(script_path)
     except Exception as e:
         print(f"Error al cargar módulo {script_path}: {str(e)}")
         return None
 
 
+def _es_svg(contenido):
+    # documento SVG: empieza por <svg, o por la declaración XML (y DOCTYPE o comentarios) antes de <svg
+    inicio = bytes(contenido[:4096]).lstrip(b'\xef\xbb\xbf \t\r\n')
+    return inicio.startswith(b'<svg') or (inicio.startswith(b'<?xml') and b'<svg' in inicio)
+
+
+def imagen_grafico(resultado, formato="png"):
+    """
+    Normaliza lo que devuelve un script de gráfico a una imagen en memoria.
+
+    Los scripts pueden devolver bytes PNG, un SVG (str o bytes), un Drawing de ReportLab (formato
+    "vectorial", ver utils/render_vectorial.py) o un data URL en base64 (como en la interfaz). Si no
+    devuelven nada (o devuelven otra cosa) se usa la figura actual de matplotlib.
+
+    Returns:
+        (formato, contenido): ("png", bytes), ("svg", bytes) o ("drawing", Drawing)
+    """
+    if isinstance(resultado, Drawing):
+        return ("drawing", resultado)
+    if isinstance(resultado, str) and resultado.startswith('data:image'):
+        cabecera, datos = resultado.split(',', 1)
+        return ("svg" if "svg" in cabecera else "png", base64.b64decode(datos))
+    if isinstance(resultado, str):
+        resultado = resultado.encode('utf-8')
+    if isinstance(resultado, (bytes, bytearray)):
+        if bytes(resultado[:8]) == b'\x89PNG\r\n\x1a\n':
+            return ("png", bytes(resultado))
+        if _es_svg(resultado):
+            # el SVG se convierte ya aquí (en el pool, y queda así en la caché de render)
+            drawing = svg2rlg(io.BytesIO(resultado))
+            return ("drawing", drawing) if drawing is not None else ("svg", bytes(resultado))
+        # otro texto o bytes (p. ej. un mensaje): se dibuja la figura actual, como si no devolviera nada
+
+    # Si no devolvió una imagen, asumir que generó una figura con matplotlib
+    if formato.lower() == FORMATO_VECTORIAL:
+        drawing = figura_a_drawing(plt.gcf(), bbox_inches='tight')
+        plt.close()
+        return ("drawing", drawing)
+    formato = "svg" if formato.lower() == "svg" else "png"  # Por defecto usar PNG
+    buffer = io.BytesIO()
+    try:
+        plt.savefig(buffer, format=formato, bbox_inches='tight', dpi=300 if formato == "png" else None)
+    except Exception as e:
+        print(f"Error al guardar en formato {formato}: {str(e)}")
+        # Si falla un formato, intentar con el otro
+        formato = "png" if formato == "svg" else "svg"
+        buffer = io.BytesIO()
+        plt.savefig(buffer, format=formato, bbox_inches='tight', dpi=300 if formato == "png" else None)
+        print(f"Se usó formato alternativo: {formato}")
+    plt.close()
+    return (formato, buffer.getvalue())
+
+
 def render_matplotlib_graph(script_path, params, data_source, ancho, alto, formato="png"):
     """
     Renderiza un gráfico usando el script especificado.
@@ -443,20 +505,15 @@ def render_matplotlib_graph(script_path, params, data_source, ancho, alto, forma
         script_path: Ruta al script Python que genera el gráfico
         params: Diccionario con parámetros para el script
         data_source: Datos de origen para el gráfico
-        formato: Formato de salida del gráfico (png o svg)
+        formato: Formato de salida del gráfico (png, svg o vectorial)
 
     Returns:
-        Ruta al archivo temporal del gráfico o None si hubo error
+        (formato, contenido) en memoria (ver imagen_grafico) o None si hubo error
     """
     try:
         # Usar backend no interactivo para evitar errores de GUI
         import matplotlib
         matplotlib.use('Agg')
-        import matplotlib.pyplot as plt
-        
-        # DEBUG reducido - solo mostrar nombre del script
-        # print(f"DEBUG: Iniciando renderizado de gráfico con script: {script_path}")
-        # print(f"DEBUG: Parámetros recibidos: {params.keys()}")
 
         # Limpiar cualquier figura de matplotlib anterior
         plt.close('all')
@@ -465,7 +522,6 @@ def render_matplotlib_graph(script_path, params, data_source, ancho, alto, forma
         script_dir = os.path.dirname(script_path)
         utils_dir = os.path.join(os.path.dirname(os.path.dirname(script_path)), "utils")
 
-        import sys
         original_path = sys.path.copy()  # Guardar el path original
         sys.path.insert(0, script_dir)
         sys.path.insert(0, utils_dir)  # Añadir carpeta utils
@@ -489,44 +545,10 @@ def render_matplotlib_graph(script_path, params, data_source, ancho, alto, forma
             params['formato'] = formato  # Añadir el formato a los parámetros
             params['alto_cm'] = alto
             params['ancho_cm'] = ancho
+            params['salida'] = 'bytes'  # la imagen sin codificar en base64
             result = main_function(data_source, params)
 
-            # Si el resultado es una URL de datos, convertir a archivo temporal
-            if isinstance(result, str) and result.startswith('data:image'):
-                try:
-                    # Extraer los datos base64
-                    img_data = result.split(',')[1]
-                    img_binary = base64.b64decode(img_data)
-
-                    # Crear archivo temporal
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{formato}") as temp_file:
-                        temp_file.write(img_binary)
-                        temp_path = temp_file.name
-                        return temp_path
-                except Exception as e:
-                    print(f"Error al procesar imagen base64: {str(e)}")
-                    return None
-
-            # Si no devolvió una imagen, asumir que generó una figura con matplotlib
-            # Guardar la figura actual en un archivo temporal con el formato especificado
-            temp_path = tempfile.mktemp(suffix=f'.{formato}')
-
-            try:
-                if formato.lower() == 'svg':
-                    plt.savefig(temp_path, format='svg', bbox_inches='tight')
-                else:  # Por defecto usar PNG
-                    plt.savefig(temp_path, dpi=300, format='png', bbox_inches='tight')
-            except Exception as e:
-                print(f"Error al guardar en formato {formato}: {str(e)}")
-                # Si falla un formato, intentar con el otro
-                formato_alt = "png" if formato.lower() == "svg" else "svg"
-                temp_path = tempfile.mktemp(suffix=f'.{formato_alt}')
-                plt.savefig(temp_path, format=formato_alt, bbox_inches='tight',
-                            dpi=300 if formato_alt == "png" else None)
-                print(f"Se usó formato alternativo: {formato_alt}")
-
-            plt.close()
-            return temp_path
+            return imagen_grafico(result, formato)
 
         finally:
             # Restaurar el path original al finalizar
@@ -539,6 +561,48 @@ def render_matplotlib_graph(script_path, params, data_source, ancho, alto, forma
         return None
 
 
+def ruta_script_tabla(script_name, biblioteca_tablas_path):
+    """
+    Ruta del script de una tabla en la biblioteca de tablas (en la raíz o en su subcarpeta).
+
+    Returns:
+        Path o None si no hay script o no se encuentra
+    """
+    if not script_name or not biblioteca_tablas_path:
+        return None
+    if not script_name.endswith('.py'):
+        script_name = script_name + '.py'
+
+    script_path = Path(biblioteca_tablas_path) / script_name
+    if not script_path.exists():
+        script_basename = Path(script_name).stem
+        script_path = Path(biblioteca_tablas_path) / script_basename / script_name
+    if not script_path.exists():
+        print(f"Script de tabla no encontrado: {script_path}")
+        return None
+    return script_path
+
+
+def ejecutar_script_tabla(script_path, params, data_source):
+    """
+    Ejecuta el script de una tabla (función con el nombre del archivo).
+
+    Returns:
+        Datos devueltos por el script o None si hubo error
+    """
+    try:
+        module = load_module_dynamically(str(script_path))
+        if module:
+            main_func_name = Path(script_path).stem
+            if hasattr(module, main_func_name):
+                return getattr(module, main_func_name)(data_source, params)
+    except Exception as e:
+        print(f"Error al obtener datos de tabla {Path(script_path).name}: {str(e)}")
+        import traceback
+        traceback.print_exc()
+    return None
+
+
 def resolve_placeholders(params, data_source):
     """
     Reemplaza marcadores de posición en los parámetros con valores del data_source.
@@ -584,7 +648,7 @@ def resolve_placeholders(params, data_source):
     return resolved_params
 
 
-def draw_graph(pdf, graph_data, page_height, data_source, biblioteca_graficos_path):
+def draw_graph(pdf, graph_data, page_height, data_source, biblioteca_graficos_path, resultado=_SIN_RESULTADO):
     """
     Dibuja un gráfico generado por un script en el PDF
     
@@ -594,6 +658,8 @@ def draw_graph(pdf, graph_data, page_height, data_source, biblioteca_graficos_pa
         page_height: Altura total de la página en puntos
         data_source: Datos de origen para el gráfico
         biblioteca_graficos_path: Ruta a la biblioteca de gráficos
+        resultado: imagen del gráfico ya renderizada (fase 1 de generate_pdf_from_template);
+            si no se indica, se renderiza aquí
     """
     # Extraer datos
     x = graph_data["geometria"]["x"] * CM_TO_POINTS
@@ -614,9 +680,6 @@ def draw_graph(pdf, graph_data, page_height, data_source, biblioteca_graficos_pa
     # Obtener opacidad
     opacidad = graph_data["estilo"].get("opacidad", 100) / 100
 
-    # Obtener formato de gráfico (directamente de configuracion)
-    formato = graph_data["configuracion"].get("formato", "png")
-
     # Obtener nombre del script
     script_name = graph_data["configuracion"].get("script", "")
     if not script_name:
@@ -649,27 +712,24 @@ def draw_graph(pdf, graph_data, page_height, data_source, biblioteca_graficos_pa
         pdf.drawCentredString(x + ancho / 2, y + alto / 2 - 15, f"Ubicación buscada: {script_path}")
         return
 
-    # Obtener parámetros del gráfico
-    raw_params = graph_data["configuracion"].get("parametros", {})
-    params = resolve_placeholders(raw_params, data_source)
-
-    # Generar el gráfico
-    print(f"[PDF] Generando gráfico: {script_name}")
-    temp_graph_path = render_matplotlib_graph(script_path, params, data_source,
-                                              graph_data["geometria"]["ancho"], graph_data["geometria"]["alto"],
-                                              formato)
-    if not temp_graph_path:
+    # Generar el gráfico (si no se ha renderizado ya en el pool)
+    if resultado is _SIN_RESULTADO:
+        print(f"[PDF] Generando gráfico: {script_name}")
+        imagen = _ejecutar_trabajo(trabajo_grafico(graph_data, data_source, biblioteca_graficos_path), data_source)
+    else:
+        imagen = resultado
+    if not imagen:
         print(f"[PDF] ERROR: render_matplotlib_graph retornó None para {script_name}")
 
-    if temp_graph_path:
+    if imagen:
         try:
-            # Verificar el tipo de archivo generado realmente
-            actual_formato = os.path.splitext(temp_graph_path)[1].lower()[1:]
+            # Formato de la imagen generada realmente
+            actual_formato, contenido = imagen
 
-            if actual_formato == 'svg':
+            if actual_formato in ('svg', 'drawing'):
                 try:
-                    # Usar svglib para convertir SVG a elementos ReportLab
-                    drawing = svg2rlg(temp_graph_path)
+                    # Usar svglib para convertir SVG a elementos ReportLab (salvo que el script ya dé un Drawing)
+                    drawing = contenido if actual_formato == 'drawing' else svg2rlg(io.BytesIO(contenido))
 
                     # Ajustar tamaño del dibujo al tamaño deseado
                     if drawing.width > 0 and drawing.height > 0:  # Evitar división por cero
@@ -695,7 +755,7 @@ def draw_graph(pdf, graph_data, page_height, data_source, biblioteca_graficos_pa
                         pdf.setFillAlpha(opacidad)
 
                     pdf.drawImage(
-                        temp_graph_path,
+                        ImageReader(io.BytesIO(contenido)),
                         x, y,
                         width=ancho,
                         height=alto,
@@ -712,7 +772,7 @@ def draw_graph(pdf, graph_data, page_height, data_source, biblioteca_graficos_pa
                     pdf.setFillAlpha(opacidad)
 
                 pdf.drawImage(
-                    temp_graph_path,
+                    ImageReader(io.BytesIO(contenido)),
                     x, y,
                     width=ancho,
                     height=alto,
@@ -723,11 +783,6 @@ def draw_graph(pdf, graph_data, page_height, data_source, biblioteca_graficos_pa
                 if opacidad < 1.0:
                     pdf.restoreState()
 
-            # Eliminar el archivo temporal
-            try:
-                os.unlink(temp_graph_path)
-            except:
-                print(f"No se pudo eliminar el archivo temporal: {temp_graph_path}")
 
         except Exception as e:
             # Error al generar gráfico
@@ -760,7 +815,8 @@ def draw_graph(pdf, graph_data, page_height, data_source, biblioteca_graficos_pa
         pdf.drawCentredString(x + ancho / 2, y + alto / 2, "Error al generar gráfico")
 
 
-def draw_table_from_grid(pdf, table_data, page_height, data_source, biblioteca_tablas_path=None):
+def draw_table_from_grid(pdf, table_data, page_height, data_source, biblioteca_tablas_path=None,
+                         resultado=_SIN_RESULTADO):
     """
     Dibuja una tabla basada en la estructura de cuadrícula (niveles/columnas).
     
@@ -784,39 +840,8 @@ def draw_table_from_grid(pdf, table_data, page_height, data_source, biblioteca_t
     y_actual = page_height - y
     x_inicial = x
     
-    # Obtener script y parámetros si existen
-    script_name = table_data.get("configuracion", {}).get("script", "")
-    raw_params = table_data.get("configuracion", {}).get("parametros", {})
-    params = resolve_placeholders(raw_params, data_source)
-    
     # Datos del script (diccionario con encabezados_nivel_1 y filas)
-    datos_script = None
-    if script_name and biblioteca_tablas_path:
-        try:
-            # Lógica de carga de script
-            script_name_original = script_name
-            if not script_name.endswith('.py'):
-                script_name = script_name + '.py'
-                
-            script_path = biblioteca_tablas_path / script_name
-            if not script_path.exists():
-                script_basename = Path(script_name).stem
-                script_path = biblioteca_tablas_path / script_basename / script_name
-            
-            if script_path.exists():
-                module = load_module_dynamically(str(script_path))
-                if module:
-                    # Buscar la función con el nombre del archivo
-                    main_func_name = Path(script_path).stem
-                    if hasattr(module, main_func_name):
-                        main_function = getattr(module, main_func_name)
-                        datos_script = main_function(data_source, params)
-            else:
-                print(f"Script de tabla no encontrado: {script_path}")
-        except Exception as e:
-            print(f"Error cargando script de tabla {script_name}: {e}")
-            import traceback
-            traceback.print_exc()
+    datos_script = _resultado_tabla(table_data, data_source, biblioteca_tablas_path, resultado)
     
     # Extraer datos del script si es un diccionario con estructura esperada
     encabezados_fechas = []
@@ -1007,13 +1032,13 @@ def draw_table_from_grid(pdf, table_data, page_height, data_source, biblioteca_t
                 x_celda += ancho
 
 
-def draw_table(pdf, table_data, page_height, data_source, biblioteca_tablas_path=None):
+def draw_table(pdf, table_data, page_height, data_source, biblioteca_tablas_path=None, resultado=_SIN_RESULTADO):
     """
     Dibuja una tabla en el PDF
     """
     # Detectar si es una tabla basada en cuadrícula (nuevo formato)
     if "cuadricula" in table_data and "niveles" in table_data["cuadricula"] and table_data["cuadricula"]["niveles"]:
-        draw_table_from_grid(pdf, table_data, page_height, data_source, biblioteca_tablas_path)
+        draw_table_from_grid(pdf, table_data, page_height, data_source, biblioteca_tablas_path, resultado)
         return
 
     # Extraer geometría
@@ -1050,34 +1075,7 @@ def draw_table(pdf, table_data, page_height, data_source, biblioteca_tablas_path
     
     # Obtener datos de la tabla desde el script
     script_name = table_data.get("configuracion", {}).get("script", "")
-    raw_params = table_data.get("configuracion", {}).get("parametros", {})
-    params = resolve_placeholders(raw_params, data_source)
-    
-    # Intentar obtener datos del script
-    tabla_datos = None
-    if script_name and biblioteca_tablas_path:
-        try:
-            # Buscar el script
-            if not script_name.endswith('.py'):
-                script_name_py = script_name + '.py'
-            else:
-                script_name_py = script_name
-                
-            script_path = biblioteca_tablas_path / script_name_py
-            if not script_path.exists():
-                # Intentar buscar en subdirectorio
-                script_basename = Path(script_name).stem
-                script_path = biblioteca_tablas_path / script_basename / script_name_py
-            
-            if script_path.exists():
-                module = load_module_dynamically(str(script_path))
-                if module:
-                    main_func_name = Path(script_path).stem
-                    if hasattr(module, main_func_name):
-                        main_function = getattr(module, main_func_name)
-                        tabla_datos = main_function(data_source, params)
-        except Exception as e:
-            print(f"Error al obtener datos de tabla: {str(e)}")
+    tabla_datos = _resultado_tabla(table_data, data_source, biblioteca_tablas_path, resultado)
     
     # Si no hay datos, crear datos de ejemplo
     if tabla_datos is None:
@@ -1211,7 +1209,8 @@ def draw_table(pdf, table_data, page_height, data_source, biblioteca_tablas_path
             pdf.drawCentredString(x + ancho_maximo / 2, y_centro, "Tabla sin script asignado")
 
 
-def draw_multilevel_table(pdf, table_data, page_height, data_source, biblioteca_tablas_path=None):
+def draw_multilevel_table(pdf, table_data, page_height, data_source, biblioteca_tablas_path=None,
+                          resultado=_SIN_RESULTADO):
     """
     Dibuja una tabla multinivel en el PDF con título, encabezados agrupados y subcolumnas.
     
@@ -1275,32 +1274,7 @@ def draw_multilevel_table(pdf, table_data, page_height, data_source, biblioteca_
     
     # Obtener datos del script
     script_name = table_data.get("configuracion", {}).get("script", "")
-    raw_params = table_data.get("configuracion", {}).get("parametros", {})
-    params = resolve_placeholders(raw_params, data_source)
-    
-    # Intentar obtener datos del script
-    tabla_datos = None
-    if script_name and biblioteca_tablas_path:
-        try:
-            if not script_name.endswith('.py'):
-                script_name_py = script_name + '.py'
-            else:
-                script_name_py = script_name
-                
-            script_path = biblioteca_tablas_path / script_name_py
-            if not script_path.exists():
-                script_basename = Path(script_name).stem
-                script_path = biblioteca_tablas_path / script_basename / script_name_py
-            
-            if script_path.exists():
-                module = load_module_dynamically(str(script_path))
-                if module:
-                    main_func_name = Path(script_path).stem
-                    if hasattr(module, main_func_name):
-                        main_function = getattr(module, main_func_name)
-                        tabla_datos = main_function(data_source, params)
-        except Exception as e:
-            print(f"Error al obtener datos de tabla multinivel: {str(e)}")
+    tabla_datos = _resultado_tabla(table_data, data_source, biblioteca_tablas_path, resultado)
     
     # Si no hay datos, crear datos de ejemplo
     if tabla_datos is None:
@@ -1479,9 +1453,142 @@ def draw_multilevel_table(pdf, table_data, page_height, data_source, biblioteca_
         pdf.drawCentredString(x + ancho_maximo / 2, y_centro, f"Tabla multinivel: {script_name} (sin datos)")
 
 
+def trabajo_grafico(graph_data, data_source, biblioteca_graficos_path):
+    """
+    Trabajo de renderizado de un elemento gráfico: ("grafico", script, parámetros, ancho_cm, alto_cm, formato).
+
+    Returns:
+        tuple o None si el elemento no tiene script o no se encuentra (se dibuja su marcador)
+    """
+    script_name = graph_data["configuracion"].get("script", "")
+    if not script_name:
+        return None
+    script_basename = Path(script_name).stem
+    script_path = Path(biblioteca_graficos_path) / script_basename / (script_basename + '.py')
+    if not script_path.exists():
+        return None
+
+    params = resolve_placeholders(graph_data["configuracion"].get("parametros", {}), data_source)
+    return ("grafico", str(script_path), params, graph_data["geometria"]["ancho"], graph_data["geometria"]["alto"],
+            graph_data["configuracion"].get("formato", "png"))
+
+
+def trabajo_tabla(table_data, data_source, biblioteca_tablas_path):
+    """
+    Trabajo de una tabla: ("tabla", script, parámetros).
+
+    Returns:
+        tuple o None si la tabla no tiene script o no se encuentra
+    """
+    script_path = ruta_script_tabla(table_data.get("configuracion", {}).get("script", ""), biblioteca_tablas_path)
+    if script_path is None:
+        return None
+    params = resolve_placeholders(table_data.get("configuracion", {}).get("parametros", {}), data_source)
+    return ("tabla", str(script_path), params)
+
+
+def _resultado_tabla(table_data, data_source, biblioteca_tablas_path, resultado):
+    # datos del script de la tabla: los precalculados en el pool o, si no los hay, ejecutándolo aquí
+    if resultado is not _SIN_RESULTADO:
+        return resultado
+    trabajo = trabajo_tabla(table_data, data_source, biblioteca_tablas_path)
+    return _ejecutar_trabajo(trabajo, data_source) if trabajo else None
+
+
+def _ejecutar_trabajo_pool(argumentos):
+    # en los procesos del pool los datos del informe sólo se deserializan la primera vez
+    global _data_source_proceso
+    trabajo, informe, datos = argumentos
+    if _data_source_proceso[0] != informe:
+        _data_source_proceso = (informe, pickle.loads(datos))
+    return _ejecutar_trabajo(trabajo, _data_source_proceso[1])
+
+
+def _ejecutar_trabajo(trabajo, data_source):
+    tipo, script_path, params = trabajo[:3]
+    if tipo == "grafico":
+        ancho, alto, formato = trabajo[3:]
+        return render_matplotlib_graph(script_path, params, data_source, ancho, alto, formato)
+    return ejecutar_script_tabla(script_path, params, data_source)
+
+
+def ejecutar_trabajos(trabajos, data_source, procesos=None, cache=True):
+    """
+    Ejecuta los trabajos de gráficos y tablas de un informe, en paralelo si hay más de uno y más de un núcleo.
+
+    Args:
+        trabajos: diccionario {clave: trabajo} (ver trabajo_grafico y trabajo_tabla)
+        data_source: datos del informe (cada proceso del pool los deserializa una vez)
+        procesos: número máximo de procesos (por defecto MAX_PROCESOS_RENDER; 1 = sin pool)
+        cache: leer y guardar los resultados en la caché de render (utils/cache_render.py)
+
+    Returns:
+        Diccionario {clave: resultado}: imagen del gráfico (ver imagen_grafico) o datos de la tabla (None si falló)
+    """
+    resultados = {}
+    claves_cache = {}
+    if cache and trabajos:
+        # las claves se calculan antes de ejecutar: render_matplotlib_graph añade entradas a params
+        huella = huella_datos(data_source)
+        claves_cache = {clave: clave_render(trabajo, huella) for clave, trabajo in trabajos.items()}
+        for clave, clave_cache in claves_cache.items():
+            resultado = leer_render(clave_cache)
+            if resultado is not None:
+                resultados[clave] = resultado
+        if resultados:
+            print(f"[PDF] {len(resultados)} de {len(trabajos)} gráficos y tablas leídos de la caché de render")
+        trabajos = {clave: trabajo for clave, trabajo in trabajos.items() if clave not in resultados}
+
+    resultados.update(_ejecutar_trabajos(trabajos, data_source, procesos))
+
+    if claves_cache and trabajos:
+        for clave in trabajos:
+            if resultados.get(clave) is not None:
+                guardar_render(claves_cache[clave], resultados[clave])
+        recortar_cache_render()
+    return resultados
+
+
+def _obtener_pool_render(procesos):
+    """Devuelve el pool de render del proceso, creándolo (o recreándolo si cambia su tamaño) si hace falta."""
+    global _pool_render
+    with _lock_pool_render:
+        if _pool_render is None or _pool_render[0] != procesos:
+            if _pool_render is not None:
+                _pool_render[1].shutdown(wait=False)
+            _pool_render = (procesos, ProcessPoolExecutor(max_workers=procesos))
+        return _pool_render[1]
+
+
+def _descartar_pool_render(pool):
+    global _pool_render
+    with _lock_pool_render:
+        if _pool_render is not None and _pool_render[1] is pool:
+            _pool_render = None
+    pool.shutdown(wait=False)
+
+
+def _ejecutar_trabajos(trabajos, data_source, procesos):
+    procesos = procesos or MAX_PROCESOS_RENDER
+    if procesos > 1 and len(trabajos) > 1:
+        pool = None
+        try:
+            pool = _obtener_pool_render(procesos)
+            datos = pickle.dumps(data_source, protocol=pickle.HIGHEST_PROTOCOL)
+            informe = (os.getpid(), next(_informes))
+            argumentos = [(trabajo, informe, datos) for trabajo in trabajos.values()]
+            return dict(zip(trabajos, pool.map(_ejecutar_trabajo_pool, argumentos)))
+        except Exception as e:
+            # p. ej. un proceso del pool ha muerto o los datos no se pueden enviar
+            print(f"[PDF] No se pudo renderizar en paralelo ({e}), se renderiza en este proceso")
+            if isinstance(e, BrokenProcessPool):
+                _descartar_pool_render(pool)
+    return {clave: _ejecutar_trabajo(trabajo, data_source) for clave, trabajo in trabajos.items()}
+
+
 def generate_pdf_from_template(template_data, data_source, output_buffer=None,
                                biblioteca_path=None, biblioteca_graficos_path=None,
-                               biblioteca_tablas_path=None):
+                               biblioteca_tablas_path=None, procesos=None, cache=True):
     """
     Genera un PDF completo a partir de una plantilla JSON
 
@@ -1492,6 +1599,8 @@ def generate_pdf_from_template(template_data, data_source, output_buffer=None,
         biblioteca_path: Ruta base a la biblioteca de plantillas (opcional)
         biblioteca_graficos_path: Ruta a la biblioteca de gráficos (opcional)
         biblioteca_tablas_path: Ruta a la biblioteca de scripts de tablas (opcional)
+        procesos: Número máximo de procesos para renderizar gráficos y tablas (opcional, 1 = sin pool)
+        cache: Reutilizar los gráficos y tablas ya renderizados con los mismos datos y parámetros
     """
     if output_buffer is None:
         output_buffer = io.BytesIO()
@@ -1514,7 +1623,27 @@ def generate_pdf_from_template(template_data, data_source, output_buffer=None,
     if nombre_plantilla and biblioteca_path:
         plantilla_dir = biblioteca_path / nombre_plantilla
 
-    # Procesar cada página
+    # Fase 1: ejecutar los scripts de gráficos y tablas de todas las páginas, en paralelo
+    trabajos = {}
+    resultados_tablas = {}  # tablas sin script: se dibujan con datos de ejemplo
+    for page_key, page_data in template_data.get('paginas', {}).items():
+        for nombre, elemento in page_data.get('elementos', {}).items():
+            if not elemento["metadata"].get("visible", True):
+                continue
+            if elemento["tipo"] == "grafico":
+                trabajo = trabajo_grafico(elemento, data_source, biblioteca_graficos_path)
+            elif elemento["tipo"] == "tabla":
+                trabajo = trabajo_tabla(elemento, data_source, biblioteca_tablas_path)
+                resultados_tablas[(page_key, nombre)] = None
+            else:
+                continue
+            if trabajo:
+                trabajos[(page_key, nombre)] = trabajo
+    if trabajos:
+        print(f"[PDF] Renderizando {len(trabajos)} gráficos y tablas")
+    resultados = {**resultados_tablas, **ejecutar_trabajos(trabajos, data_source, procesos, cache)}
+
+    # Fase 2: componer cada página
     primera_pagina = True
     for page_key, page_data in template_data.get('paginas', {}).items():
         # Si no es la primera página, añadir una nueva
@@ -1541,6 +1670,7 @@ def generate_pdf_from_template(template_data, data_source, output_buffer=None,
                 continue
 
             # Dibujar según el tipo de elemento
+            resultado = resultados.get((page_key, nombre), _SIN_RESULTADO)
             if elemento["tipo"] == "linea":
                 draw_line(pdf, elemento, page_height)
             elif elemento["tipo"] == "rectangulo":
@@ -1550,15 +1680,15 @@ def generate_pdf_from_template(template_data, data_source, output_buffer=None,
             elif elemento["tipo"] == "imagen":
                 draw_image(pdf, elemento, page_height, plantilla_dir, biblioteca_path)
             elif elemento["tipo"] == "grafico":
-                draw_graph(pdf, elemento, page_height, data_source, biblioteca_graficos_path)
+                draw_graph(pdf, elemento, page_height, data_source, biblioteca_graficos_path, resultado)
             elif elemento["tipo"] == "tabla":
                 # Verificar si es tabla multinivel
                 tipo_tabla = elemento.get("configuracion", {}).get("tipo_tabla", "simple")
                 if tipo_tabla == "multinivel":
-                    draw_multilevel_table(pdf, elemento, page_height, data_source, biblioteca_tablas_path)
+                    draw_multilevel_table(pdf, elemento, page_height, data_source, biblioteca_tablas_path, resultado)
                 else:
                     # Para tablas simples, usamos biblioteca_tablas_path
-                    draw_table(pdf, elemento, page_height, data_source, biblioteca_tablas_path)
+                    draw_table(pdf, elemento, page_height, data_source, biblioteca_tablas_path, resultado)
 
     # Guardar el PDF
     pdf.save()
@@ -0,0 +1,188 @@
+# utils/render_vectorial.py
+
+import numpy as np
+from PIL import Image as ImagenPIL
+from matplotlib.backend_bases import FigureCanvasBase, RendererBase, register_backend
+from matplotlib.path import Path as RutaMpl
+from reportlab.graphics.shapes import Drawing, Group, Image, Path, FILL_NON_ZERO
+from reportlab.lib.colors import Color
+
+# Salida vectorial de los gráficos de matplotlib para el PDF.
+# Se registra en matplotlib el formato "rlg": fig.savefig(destino, format="rlg", ...) dibuja la figura
+# con un renderer que, en lugar de escribir un archivo, construye un Drawing de ReportLab (trazos,
+# rellenos, recortes e imágenes incrustadas). El texto se convierte en trazados, como hace el SVG de
+# matplotlib por defecto, así que no depende de las fuentes de ReportLab. El Drawing se dibuja en el
+# canvas con renderPDF, sin rasterizar a PNG ni pasar por SVG y svglib.
+# Se usa a través de figura_a_drawing(fig, **opciones_savefig); savefig admite las mismas opciones
+# que con png o svg (bbox_inches, pad_inches, transparent, facecolor...).
+
+FORMATO_VECTORIAL = "vectorial"  # valor de "formato" de los gráficos en las plantillas
+
+_UNIONES = {"miter": 0, "round": 1, "bevel": 2}
+_EXTREMOS = {"butt": 0, "round": 1, "projecting": 2}
+
+
+class DestinoDrawing:
+    """Destino de fig.savefig(format="rlg"): tras guardar, drawing tiene el Drawing de la figura."""
+
+    def __init__(self):
+        self.drawing = None
+
+
+def _color(rgba, alpha=None):
+    """Color de ReportLab a partir de un RGB(A) de matplotlib; alpha sustituye al del color."""
+    if alpha is None:
+        alpha = rgba[3] if len(rgba) > 3 else 1
+    return Color(rgba[0], rgba[1], rgba[2], alpha)
+
+
+class RendererReportLab(RendererBase):
+    """Renderer de matplotlib que añade cada elemento de la figura a un Drawing (unidades: puntos)."""
+
+    def __init__(self, ancho, alto):
+        super().__init__()
+        self.width = ancho
+        self.height = alto
+        self.drawing = Drawing(ancho, alto)
+        self._grupo = self.drawing
+        self._clave_recorte = None
+
+    def flipy(self):
+        return False
+
+    def get_canvas_width_height(self):
+        return self.width, self.height
+
+    def points_to_pixels(self, points):
+        return points  # 72 puntos por pulgada, igual que la figura
+
+    # Recortes ---------------------------------------------------------------------------------------
+    def _grupo_recorte(self, gc):
+        """Grupo donde añadir el elemento: los consecutivos con el mismo recorte comparten grupo."""
+        rectangulo = gc.get_clip_rectangle()
+        trazado, transformacion = gc.get_clip_path()
+        clave = (None if rectangulo is None else tuple(rectangulo.bounds),
+                 None if trazado is None else (id(trazado), transformacion.frozen().to_values()))
+        if clave == self._clave_recorte:
+            return self._grupo
+        self._clave_recorte = clave
+        if clave == (None, None):
+            self._grupo = self.drawing
+            return self._grupo
+
+        self._grupo = Group()
+        if rectangulo is not None:
+            x0, y0, x1, y1 = rectangulo.extents
+            vertices = [(x0, y0), (x1, y0), (x1, y1), (x0, y1), (x0, y0)]
+            self._grupo.add(self._recorte(RutaMpl(vertices, closed=True)))
+        if trazado is not None:
+            self._grupo.add(self._recorte(trazado.get_fully_transformed_path()))
+        self.drawing.add(self._grupo)
+        return self._grupo
+
+    def _recorte(self, trazado):
+        ruta = self._ruta(trazado.iter_segments(simplify=False))
+        ruta.isClipPath = 1
+        ruta.strokeColor = None
+        ruta.fillColor = None
+        return ruta
+
+    # Dibujo -----------------------------------------------------------------------------------------
+    @staticmethod
+    def _ruta(segmentos):
+        ruta = Path(fillMode=FILL_NON_ZERO, autoclose="svg")
+        actual = (0, 0)
+        for puntos, codigo in segmentos:
+            if codigo == RutaMpl.MOVETO:
+                ruta.moveTo(*puntos)
+            elif codigo == RutaMpl.LINETO:
+                ruta.lineTo(*puntos)
+            elif codigo == RutaMpl.CURVE3:
+                # cuadrática -> cúbica con los mismos extremos
+                (cx, cy), (x, y) = puntos[:2], puntos[2:]
+                ruta.curveTo(actual[0] + 2 / 3 * (cx - actual[0]), actual[1] + 2 / 3 * (cy - actual[1]),
+                             x + 2 / 3 * (cx - x), y + 2 / 3 * (cy - y), x, y)
+            elif codigo == RutaMpl.CURVE4:
+                ruta.curveTo(*puntos)
+            elif codigo == RutaMpl.CLOSEPOLY:
+                ruta.closePath()
+                continue
+            actual = tuple(puntos[-2:])
+        return ruta
+
+    def draw_path(self, gc, path, transform, rgbFace=None):
+        recortar = rgbFace is None and gc.get_hatch_path() is None
+        segmentos = path.iter_segments(transform, remove_nans=True,
+                                       clip=(0, 0, self.width, self.height) if recortar else None,
+                                       simplify=path.should_simplify and recortar,
+                                       sketch=gc.get_sketch_params())
+        ruta = self._ruta(segmentos)
+        if not ruta.operators:
+            return
+
+        forzar_alpha = gc.get_forced_alpha()
+        if rgbFace is None:
+            ruta.fillColor = None
+        else:
+            ruta.fillColor = _color(rgbFace, gc.get_alpha() if forzar_alpha else None)
+        if gc.get_linewidth() > 0:
+            ruta.strokeColor = _color(gc.get_rgb(), gc.get_alpha() if forzar_alpha else None)
+            ruta.strokeWidth = gc.get_linewidth()
+            ruta.strokeLineJoin = _UNIONES.get(gc.get_joinstyle(), 0)
+            ruta.strokeLineCap = _EXTREMOS.get(gc.get_capstyle(), 0)
+            desfase, guiones = gc.get_dashes()
+            if guiones is not None:
+                ruta.strokeDashArray = (desfase or 0, list(guiones)) if desfase else list(guiones)
+        else:
+            ruta.strokeColor = None
+        self._grupo_recorte(gc).add(ruta)
+
+    def draw_image(self, gc, x, y, im, transform=None):
+        alto, ancho = im.shape[:2]
+        if ancho == 0 or alto == 0:
+            return
+        imagen = ImagenPIL.fromarray(np.asarray(im), "RGBA")
+        if gc.get_alpha() < 1:
+            imagen.putalpha(imagen.getchannel("A").point(lambda a: int(a * gc.get_alpha())))
+        self._grupo_recorte(gc).add(Image(x, y, ancho, alto, imagen))
+
+    def option_scale_image(self):
+        return False
+
+
+class FigureCanvasReportLab(FigureCanvasBase):
+    """Canvas de matplotlib para el formato "rlg" (Drawing de ReportLab)."""
+
+    filetypes = {"rlg": "Drawing de ReportLab"}
+    fixed_dpi = 72
+
+    def get_default_filetype(self):
+        return "rlg"
+
+    def print_rlg(self, filename_or_obj, *, bbox_inches_restore=None, **kwargs):
+        self.figure.dpi = 72  # coordenadas en puntos, como el PDF
+        ancho, alto = self.figure.get_size_inches()
+        renderer = RendererReportLab(ancho * 72, alto * 72)
+        self.figure.draw(renderer)
+        # en la pasada previa de bbox_inches="tight" el destino es un BytesIO y se descarta
+        if isinstance(filename_or_obj, DestinoDrawing):
+            filename_or_obj.drawing = renderer.drawing
+
+
+FigureCanvas = FigureCanvasReportLab
+register_backend("rlg", __name__, "Drawing de ReportLab")
+
+
+def figura_a_drawing(fig, **opciones_savefig):
+    """
+    Drawing de ReportLab con la figura de matplotlib, en puntos (tamaño de la figura o de bbox_inches).
+
+    Args:
+        fig: figura de matplotlib.
+        **opciones_savefig: opciones de savefig (bbox_inches, pad_inches, transparent, facecolor...).
+    """
+    opciones_savefig.pop("dpi", None)
+    opciones_savefig.pop("format", None)
+    destino = DestinoDrawing()
+    fig.savefig(destino, format="rlg", **opciones_savefig)
+    return destino.drawing
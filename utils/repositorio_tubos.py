@@ -0,0 +1,598 @@
+# utils/repositorio_tubos.py
+
+import contextlib
+import json
+import os
+import re
+import threading
+
+from sqlalchemy import (Boolean, Column, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text,
+                        create_engine, delete, event, func, insert, select, update)
+from sqlalchemy.types import UserDefinedType
+
+from utils.diario_tubo import ruta_diario
+from utils.funciones_comunes import evaluar_umbrales
+from utils.tubo_array import CLAVES_NO_CAMPANA
+from utils.tubo_binario import cargar_tubo, DIRECTORIO_DATA, EXTENSIONES_TUBO
+
+# Repositorio SQLite de los tubos de data/ (data/tubos.sqlite).
+# Los archivos de data/ (JSON o binario) siguen siendo el original; el repositorio es una copia
+# consultable que se mantiene al día de dos formas:
+#   - sincronizar_repositorio compara tamaño y fecha de modificación de cada archivo (y de su diario)
+#     con los guardados y sólo vuelve a leer los que han cambiado, así que listar los tubos de un
+#     proyecto no parsea ningún JSON si no ha cambiado nada;
+#   - guardar_tubo y guardar_campanas (utils/tubo_binario.py) escriben en el repositorio, si existe,
+#     las campañas que guardan, sin volver a leer el archivo.
+# Tablas: tubos (info), umbrales, campanas (campaign_info y resto de la campaña, raw), lecturas (una
+# fila por punto de calc, con una columna por clave), correcciones (spike y bias) y alarmas (nivel de
+# campaign_info.alarm). Los índices (tubo, fecha) y (tubo, index, fecha) de lecturas permiten obtener
+# p. ej. las últimas N campañas activas a una profundidad con una sola consulta (ultimas_lecturas).
+# cargar_tubo_repositorio devuelve el tubo en el mismo esquema que cargar_tubo.
+# La tabla resumen guarda por tubo lo que muestra la página proyecto (última campaña, referencia,
+# máximo |desp| y umbral superado por la última campaña activa); se recalcula en cada escritura del
+# tubo a partir de esa campaña, así que la página lee una fila por tubo sea cual sea su tamaño.
+# El orden de las claves del tubo se guarda en extras (CLAVE_ORDEN) para devolverlo igual que el archivo;
+# como en el formato binario, las claves nuevas de un guardado parcial se añaden al final.
+
+RUTA_REPOSITORIO = os.path.join(DIRECTORIO_DATA, "tubos.sqlite")
+
+# claves de los puntos de calc con columna propia en lecturas
+CLAVES_LECTURA = ['index', 'cota_abs', 'depth', 'a0', 'a180', 'b0', 'b180', 'checksum_a', 'checksum_b',
+                  'dev_a', 'dev_b', 'incr_checksum_a', 'incr_checksum_b', 'incr_dev_a', 'incr_dev_b',
+                  'incr_dev_abs_a', 'incr_dev_abs_b', 'abs_dev_a', 'abs_dev_b', 'desp_a', 'desp_b']
+TIPOS_CORRECCION = ('spike', 'bias')
+CLAVE_ORDEN = "__orden_claves__"  # en extras: orden de las claves del tubo
+
+
+class _Valor(UserDefinedType):
+    # columna sin afinidad de tipo: SQLite devuelve cada valor con el tipo con el que se guardó, así que
+    # el 0 entero y el 0.0 real de calc no se confunden (como en el JSON)
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return "BLOB"
+
+
+metadata = MetaData()
+
+tubos = Table(
+    "tubos", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("nombre", String, nullable=False, unique=True),  # nombre del archivo en data/
+    Column("firma", String),  # tamaño y fecha de modificación del archivo y de su diario
+    Column("nom_sensor", String),
+    Column("info", Text),  # JSON
+    Column("extras", Text),  # JSON: claves del tubo que no son info, umbrales ni campañas
+    Column("error", Text),  # motivo si el archivo no se pudo leer
+)
+
+umbrales = Table(
+    "umbrales", metadata,
+    Column("tubo_id", Integer, ForeignKey("tubos.id"), primary_key=True),
+    Column("datos", Text, nullable=False),  # JSON de tubo['umbrales']
+)
+
+campanas = Table(
+    "campanas", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("tubo_id", Integer, ForeignKey("tubos.id"), nullable=False),
+    Column("fecha", String, nullable=False),
+    Column("activa", Boolean, nullable=False),  # campaign_info.active == True
+    Column("referencia", Boolean, nullable=False),
+    Column("cuarentena", Boolean, nullable=False),
+    Column("con_calc", Boolean, nullable=False),  # calc está en lecturas (si no, en datos)
+    Column("datos", Text, nullable=False),  # JSON de la campaña sin calc, raw ni correcciones
+    Column("raw", Text),  # JSON; NULL si la campaña no tiene raw
+    Index("ix_campanas_tubo_fecha", "tubo_id", "fecha", unique=True),
+)
+
+lecturas = Table(
+    "lecturas", metadata,
+    Column("campana_id", Integer, ForeignKey("campanas.id"), primary_key=True),
+    Column("posicion", Integer, primary_key=True),  # orden del punto en calc
+    Column("tubo_id", Integer, nullable=False),
+    Column("fecha", String, nullable=False),
+    *[Column(clave, _Valor) for clave in CLAVES_LECTURA],  # NULL: el punto no tiene la clave
+    Column("otros", Text),  # JSON de las claves sin columna o con valores que no son números ni texto
+    Index("ix_lecturas_tubo_index", "tubo_id", "index", "fecha"),
+    Index("ix_lecturas_tubo_fecha", "tubo_id", "fecha"),
+)
+
+correcciones = Table(
+    "correcciones", metadata,
+    Column("tubo_id", Integer, ForeignKey("tubos.id"), primary_key=True),
+    Column("fecha", String, primary_key=True),
+    Column("tipo", String, primary_key=True),  # 'spike' o 'bias'
+    Column("datos", Text, nullable=False),  # JSON
+)
+
+alarmas = Table(
+    "alarmas", metadata,
+    Column("tubo_id", Integer, ForeignKey("tubos.id"), primary_key=True),
+    Column("fecha", String, primary_key=True),
+    Column("nivel", Integer, nullable=False),  # campaign_info.alarm cuando es un nivel
+)
+
+resumen = Table(
+    "resumen", metadata,
+    Column("tubo_id", Integer, ForeignKey("tubos.id"), primary_key=True),
+    Column("num_campanas", Integer, nullable=False),
+    Column("num_activas", Integer, nullable=False),
+    Column("ultima_fecha", String),  # última campaña
+    Column("fecha_actual", String),  # última campaña activa, la que se resume
+    Column("fecha_referencia", String),  # última campaña de referencia
+    Column("max_desp_a", Float),  # máximo |desp_a| de la campaña actual
+    Column("max_desp_b", Float),
+    Column("alarma", Text),  # evaluar_umbrales de la campaña actual
+    Column("nivel", Integer),  # nivel del umbral superado
+    Column("umbral", String),  # deformada superada
+    Column("color", String),  # color de esa deformada en los umbrales del tubo
+)
+
+PATRON_ALARMA = re.compile(r'umbral "(?P<umbral>[^"]*)", nivel: (?P<nivel>-?\d+)')
+
+_motores = {}
+_lock_motores = threading.Lock()
+
+
+def _configurar_conexion(conexion, _):
+    # WAL: las lecturas de la aplicación no se bloquean mientras se guarda un tubo
+    cursor = conexion.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def motor_repositorio(ruta=None):
+    """Engine de SQLAlchemy del repositorio (uno por ruta y proceso); crea las tablas si no existen."""
+    ruta = os.path.abspath(ruta or RUTA_REPOSITORIO)
+    with _lock_motores:
+        motor = _motores.get(ruta)
+        if motor is None:
+            motor = create_engine(f"sqlite:///{ruta}")
+            event.listen(motor, "connect", _configurar_conexion)
+            metadata.create_all(motor)
+            _motores[ruta] = motor
+    return motor
+
+
+def firma_archivo(ruta):
+    """Tamaño y fecha de modificación del archivo del tubo y de su diario, o None si no existe."""
+    partes = []
+    for archivo in (ruta, ruta_diario(ruta)):
+        try:
+            estado = os.stat(archivo)
+        except FileNotFoundError:
+            continue
+        partes.append(f"{estado.st_size}:{estado.st_mtime_ns}")
+    return "|".join(partes) or None
+
+
+def _json(valor):
+    return json.dumps(valor, ensure_ascii=False, default=lambda o: o.item() if hasattr(o, 'item') else str(o))
+
+
+def _fila_lectura(punto):
+    # las claves de CLAVES_LECTURA con números o texto van a su columna y el resto a 'otros'
+    # (NaN también, porque SQLite lo guardaría como NULL)
+    fila = dict.fromkeys(CLAVES_LECTURA)
+    otros = {}
+    for clave, valor in punto.items():
+        if clave in fila and type(valor) in (int, float, str) and valor == valor:
+            fila[clave] = valor
+        else:
+            otros[clave] = valor
+    fila['otros'] = _json(otros) if otros else None
+    return fila
+
+
+def _punto(fila, claves, todas):
+    # punto de calc desde su fila de lecturas; con todas=False sólo las claves pedidas
+    valores = fila._mapping
+    punto = {clave: valores[clave] for clave in claves if valores[clave] is not None}
+    if fila.otros is not None:
+        otros = json.loads(fila.otros)
+        punto.update(otros if todas else {clave: valor for clave, valor in otros.items() if clave in claves})
+    return punto
+
+
+def _es_campana(clave, valor):
+    # mismo criterio que utils.tubo_binario para separar las campañas del resto de claves
+    return isinstance(valor, dict) and clave not in CLAVES_NO_CAMPANA
+
+
+def _insertar_campana(con, tubo_id, fecha, campana):
+    datos = dict(campana)
+    calc = datos.pop('calc', None)
+    con_calc = isinstance(calc, list) and all(isinstance(punto, dict) for punto in calc)
+    if 'calc' in campana and not con_calc:
+        datos['calc'] = calc  # calc con otro formato: se guarda tal cual con la campaña
+    raw = _json(datos.pop('raw')) if 'raw' in datos else None
+    corregidas = {tipo: datos.pop(tipo) for tipo in TIPOS_CORRECCION if tipo in datos}
+    campaign_info = datos.get('campaign_info') if isinstance(datos.get('campaign_info'), dict) else {}
+
+    campana_id = con.execute(insert(campanas).values(
+        tubo_id=tubo_id, fecha=fecha, activa=campaign_info.get('active') == True,
+        referencia=bool(campaign_info.get('reference')), cuarentena=bool(campaign_info.get('quarentine')),
+        con_calc=con_calc, datos=_json(datos), raw=raw)).inserted_primary_key[0]
+    if con_calc and calc:
+        con.execute(insert(lecturas), [{**_fila_lectura(punto), 'campana_id': campana_id, 'posicion': posicion,
+                                        'tubo_id': tubo_id, 'fecha': fecha}
+                                       for posicion, punto in enumerate(calc)])
+    if corregidas:
+        con.execute(insert(correcciones), [{'tubo_id': tubo_id, 'fecha': fecha, 'tipo': tipo, 'datos': _json(valor)}
+                                           for tipo, valor in corregidas.items()])
+    alarma = campaign_info.get('alarm')
+    if type(alarma) is int:
+        con.execute(insert(alarmas).values(tubo_id=tubo_id, fecha=fecha, nivel=alarma))
+
+
+def _borrar_campanas(con, tubo_id, fechas=None):
+    # borra las campañas (todas si fechas es None) con sus lecturas, correcciones y alarmas
+    for tabla in (lecturas, correcciones, alarmas, campanas):
+        sentencia = delete(tabla).where(tabla.c.tubo_id == tubo_id)
+        if fechas is not None:
+            sentencia = sentencia.where(tabla.c.fecha.in_(list(fechas)))
+        con.execute(sentencia)
+
+
+def _vaciar_tubo(con, tubo_id):
+    # borra todo lo que cuelga del tubo, salvo su fila en tubos
+    _borrar_campanas(con, tubo_id)
+    for tabla in (umbrales, resumen):
+        con.execute(delete(tabla).where(tabla.c.tubo_id == tubo_id))
+
+
+def _actualizar_resumen(con, tubo_id):
+    # recalcula la fila de resumen del tubo con consultas sobre los índices (tubo, fecha)
+    num_campanas, num_activas, ultima_fecha = con.execute(
+        select(func.count(), func.coalesce(func.sum(campanas.c.activa), 0, type_=Integer), func.max(campanas.c.fecha))
+        .where(campanas.c.tubo_id == tubo_id)).one()
+    fecha_actual = con.execute(select(func.max(campanas.c.fecha))
+                               .where(campanas.c.tubo_id == tubo_id, campanas.c.activa.is_(True))).scalar()
+    fecha_referencia = con.execute(select(func.max(campanas.c.fecha))
+                                   .where(campanas.c.tubo_id == tubo_id, campanas.c.referencia.is_(True))).scalar()
+    fila = {'tubo_id': tubo_id, 'num_campanas': num_campanas, 'num_activas': num_activas,
+            'ultima_fecha': ultima_fecha, 'fecha_actual': fecha_actual, 'fecha_referencia': fecha_referencia,
+            'max_desp_a': None, 'max_desp_b': None, 'alarma': None, 'nivel': None, 'umbral': None, 'color': None}
+
+    if fecha_actual is not None:
+        calc = [dict(punto._mapping) for punto in con.execute(
+            select(lecturas.c.cota_abs, lecturas.c.desp_a, lecturas.c.desp_b)
+            .where(lecturas.c.tubo_id == tubo_id, lecturas.c.fecha == fecha_actual)
+            .order_by(lecturas.c.posicion))]
+        calc = [punto for punto in calc if all(type(v) in (int, float) for v in punto.values())]
+        for eje in 'ab':
+            if calc:
+                fila[f'max_desp_{eje}'] = max(abs(punto[f'desp_{eje}']) for punto in calc)
+
+        datos_umbrales = con.execute(select(umbrales.c.datos).where(umbrales.c.tubo_id == tubo_id)).scalar()
+        datos_umbrales = json.loads(datos_umbrales) if datos_umbrales is not None else {}
+        if calc and isinstance(datos_umbrales, dict) and datos_umbrales.get('deformadas') and datos_umbrales.get('valores'):
+            try:
+                fila['alarma'] = evaluar_umbrales(calc, datos_umbrales)
+            except Exception as e:
+                print(f"No se pudieron evaluar los umbrales del tubo {tubo_id}: {e}")
+            coincidencia = PATRON_ALARMA.search(fila['alarma'] or "")
+            if coincidencia:
+                fila['umbral'] = coincidencia['umbral']
+                fila['nivel'] = int(coincidencia['nivel'])
+                deformada = datos_umbrales['deformadas'].get(fila['umbral'])
+                fila['color'] = deformada.get('color') if isinstance(deformada, dict) else None
+
+    con.execute(delete(resumen).where(resumen.c.tubo_id == tubo_id))
+    con.execute(insert(resumen).values(**fila))
+
+
+def _escribir_tubo(con, nombre, tubo, firma):
+    # sustituye el tubo completo dentro de la transacción con
+    info = tubo.get('info')
+    nom_sensor = info.get('nom_sensor') if isinstance(info, dict) else None
+    extras = {clave: valor for clave, valor in tubo.items()
+              if clave not in ('info', 'umbrales') and not _es_campana(clave, valor)}
+    extras[CLAVE_ORDEN] = list(tubo)
+    valores = {'firma': firma, 'nom_sensor': nom_sensor, 'error': None,
+               'info': _json(info) if 'info' in tubo else None, 'extras': _json(extras)}
+
+    tubo_id = con.execute(select(tubos.c.id).where(tubos.c.nombre == nombre)).scalar()
+    if tubo_id is None:
+        tubo_id = con.execute(insert(tubos).values(nombre=nombre, **valores)).inserted_primary_key[0]
+    else:
+        con.execute(update(tubos).where(tubos.c.id == tubo_id).values(**valores))
+        _vaciar_tubo(con, tubo_id)
+
+    if 'umbrales' in tubo:
+        con.execute(insert(umbrales).values(tubo_id=tubo_id, datos=_json(tubo['umbrales'])))
+    for clave, valor in tubo.items():
+        if _es_campana(clave, valor):
+            _insertar_campana(con, tubo_id, clave, valor)
+    _actualizar_resumen(con, tubo_id)
+    return tubo_id
+
+
+def guardar_tubo_repositorio(nombre, tubo, firma=None, motor=None):
+    """
+    Guarda (o sustituye) el tubo completo en el repositorio.
+
+    Args:
+        nombre (str): nombre del archivo del tubo en data/.
+        tubo (dict): tubo en el esquema JSON.
+        firma (str): firma_archivo del archivo del que procede (None si no procede de un archivo).
+    """
+    with (motor or motor_repositorio()).begin() as con:
+        _escribir_tubo(con, nombre, tubo, firma)
+
+
+def importar_tubo_archivo(ruta, motor=None):
+    """Lee el archivo del tubo (JSON con su diario o binario) y lo guarda en el repositorio. Devuelve el error o None."""
+    nombre = os.path.basename(ruta)
+    firma = firma_archivo(ruta)
+    try:
+        tubo = cargar_tubo(ruta)
+        if not isinstance(tubo, dict):
+            raise ValueError("el archivo no contiene un tubo")
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        # se anota para no volver a leerlo mientras no cambie
+        with (motor or motor_repositorio()).begin() as con:
+            tubo_id = con.execute(select(tubos.c.id).where(tubos.c.nombre == nombre)).scalar()
+            if tubo_id is None:
+                con.execute(insert(tubos).values(nombre=nombre, firma=firma, error=error))
+            else:
+                _vaciar_tubo(con, tubo_id)
+                con.execute(update(tubos).where(tubos.c.id == tubo_id).values(
+                    firma=firma, error=error, info=None, extras=None, nom_sensor=None))
+        return error
+    guardar_tubo_repositorio(nombre, tubo, firma, motor)
+    return None
+
+
+def sincronizar_repositorio(directorio=None, motor=None):
+    """
+    Pone el repositorio al día con los tubos del directorio (por defecto data/, sin subcarpetas): lee
+    sólo los archivos nuevos o modificados y quita los que ya no existen.
+
+    Returns:
+        dict: {"importados": [nombres], "eliminados": [nombres], "errores": {nombre: motivo}}
+    """
+    directorio = directorio or DIRECTORIO_DATA
+    motor = motor or motor_repositorio()
+    archivos = {nombre: os.path.join(directorio, nombre) for nombre in sorted(os.listdir(directorio))
+                if nombre.endswith(EXTENSIONES_TUBO) and os.path.isfile(os.path.join(directorio, nombre))}
+    with motor.connect() as con:
+        guardadas = {fila.nombre: fila.firma for fila in con.execute(select(tubos.c.nombre, tubos.c.firma))}
+
+    resultado = {"importados": [], "eliminados": [], "errores": {}}
+    for nombre, ruta in archivos.items():
+        if nombre not in guardadas or guardadas[nombre] != firma_archivo(ruta):
+            error = importar_tubo_archivo(ruta, motor)
+            if error:
+                resultado["errores"][nombre] = error
+            else:
+                resultado["importados"].append(nombre)
+
+    eliminados = [nombre for nombre in guardadas if nombre not in archivos]
+    if eliminados:
+        with motor.begin() as con:
+            for nombre in eliminados:
+                tubo_id = con.execute(select(tubos.c.id).where(tubos.c.nombre == nombre)).scalar()
+                _vaciar_tubo(con, tubo_id)
+                con.execute(delete(tubos).where(tubos.c.id == tubo_id))
+        resultado["eliminados"] = eliminados
+
+    # tubos sin resumen (p. ej. de un repositorio creado antes de que existiera la tabla)
+    with motor.begin() as con:
+        sin_resumen = con.execute(select(tubos.c.id).where(
+            tubos.c.error.is_(None), tubos.c.id.not_in(select(resumen.c.tubo_id)))).scalars().all()
+        for tubo_id in sin_resumen:
+            _actualizar_resumen(con, tubo_id)
+    return resultado
+
+
+def en_repositorio(ruta):
+    """True si el tubo de ruta se refleja en el repositorio: está en data/ y el repositorio existe."""
+    return (str(ruta).endswith(EXTENSIONES_TUBO) and os.path.exists(RUTA_REPOSITORIO)
+            and os.path.dirname(os.path.abspath(ruta)) == DIRECTORIO_DATA)
+
+
+def actualizar_repositorio(ruta, tubo, fechas=None, firma_previa=None, motor=None):
+    """
+    Refleja en el repositorio un guardado del archivo ruta, sin volver a leerlo.
+
+    Args:
+        ruta (str): archivo del tubo recién guardado.
+        tubo (dict): tubo guardado.
+        fechas (iterable): campañas guardadas (y 'umbrales' si también se han guardado); None si se ha
+            guardado el tubo completo.
+        firma_previa (str): firma del archivo antes de guardar. Si no coincide con la del repositorio, el
+            repositorio no estaba al día y se vuelve a leer el archivo completo.
+    """
+    nombre = os.path.basename(ruta)
+    motor = motor or motor_repositorio()
+    firma = firma_archivo(ruta)
+    if fechas is None:
+        guardar_tubo_repositorio(nombre, tubo, firma, motor)
+        return
+    with motor.begin() as con:
+        fila = con.execute(select(tubos.c.id, tubos.c.firma, tubos.c.error, tubos.c.extras)
+                           .where(tubos.c.nombre == nombre)).first()
+        if fila is not None and fila.error is None and fila.firma == firma_previa:
+            if 'umbrales' in fechas:
+                con.execute(delete(umbrales).where(umbrales.c.tubo_id == fila.id))
+                if 'umbrales' in tubo:
+                    con.execute(insert(umbrales).values(tubo_id=fila.id, datos=_json(tubo['umbrales'])))
+            fechas = set(fechas)
+            guardadas = [clave for clave in tubo if clave in fechas]  # en el orden del tubo
+            fechas = [fecha for fecha in guardadas if _es_campana(fecha, tubo[fecha])]
+            _borrar_campanas(con, fila.id, fechas)
+            for fecha in fechas:
+                _insertar_campana(con, fila.id, fecha, tubo[fecha])
+            _actualizar_resumen(con, fila.id)
+            valores = {'firma': firma}
+            extras = json.loads(fila.extras) if fila.extras is not None else {}
+            nuevas = [clave for clave in guardadas if clave not in extras.get(CLAVE_ORDEN, [])]
+            if CLAVE_ORDEN in extras and nuevas:
+                extras[CLAVE_ORDEN] += nuevas
+                valores['extras'] = _json(extras)
+            con.execute(update(tubos).where(tubos.c.id == fila.id).values(**valores))
+            return
+    importar_tubo_archivo(ruta, motor)
+
+
+@contextlib.contextmanager
+def al_guardar(ruta, tubo, fechas=None):
+    """
+    Envuelve la escritura del archivo de un tubo de data/ y después la refleja en el repositorio (si
+    existe). Un fallo del repositorio no afecta al guardado: se avisa y se corregirá al sincronizar.
+    """
+    if not en_repositorio(ruta):
+        yield
+        return
+    firma_previa = firma_archivo(ruta)
+    yield
+    try:
+        actualizar_repositorio(ruta, tubo, fechas, firma_previa)
+    except Exception as e:
+        print(f"No se pudo actualizar el repositorio con {ruta}: {e}")
+
+
+def listar_tubos(motor=None):
+    """
+    Tubos del repositorio que se han podido leer, por nombre.
+
+    Returns:
+        list: [{"nombre", "nom_sensor", "campanas", "activas", "ultima_fecha"}]
+    """
+    consulta = (select(tubos.c.nombre, tubos.c.nom_sensor, func.count(campanas.c.id).label("campanas"),
+                       func.coalesce(func.sum(campanas.c.activa), 0, type_=Integer).label("activas"),
+                       func.max(campanas.c.fecha).label("ultima_fecha"))
+                .select_from(tubos.outerjoin(campanas, campanas.c.tubo_id == tubos.c.id))
+                .where(tubos.c.error.is_(None))
+                .group_by(tubos.c.id)
+                .order_by(tubos.c.nombre))
+    with (motor or motor_repositorio()).connect() as con:
+        return [dict(fila._mapping) for fila in con.execute(consulta)]
+
+
+def resumen_proyecto(motor=None):
+    """
+    Resumen de todos los tubos del repositorio (una fila de la tabla resumen por tubo), primero los de
+    mayor nivel de alarma.
+
+    Returns:
+        list: [{"nombre", "nom_sensor", "num_campanas", "num_activas", "ultima_fecha", "fecha_actual",
+        "fecha_referencia", "max_desp_a", "max_desp_b", "alarma", "nivel", "umbral", "color"}]
+    """
+    columnas = [columna for columna in resumen.c if columna.name != 'tubo_id']
+    consulta = (select(tubos.c.nombre, tubos.c.nom_sensor, *columnas)
+                .join(resumen, resumen.c.tubo_id == tubos.c.id)
+                .order_by(resumen.c.nivel.is_(None), resumen.c.nivel.desc(), tubos.c.nombre))
+    with (motor or motor_repositorio()).connect() as con:
+        return [dict(fila._mapping) for fila in con.execute(consulta)]
+
+
+def cargar_tubo_repositorio(nombre, solo_activas=False, claves_calc=None, motor=None):
+    """
+    Tubo del repositorio en el esquema JSON (el mismo dict que devuelve cargar_tubo).
+
+    Args:
+        nombre (str): nombre del archivo del tubo en data/.
+        solo_activas (bool): sólo las campañas activas.
+        claves_calc (list): si se indica, cada campaña es sólo {"calc": [...]} con esas claves de
+            CLAVES_LECTURA, leídas de sus columnas (p. ej. para graficar).
+
+    Returns:
+        dict o None si el tubo no está en el repositorio.
+    """
+    completo = claves_calc is None
+    claves = CLAVES_LECTURA if completo else [clave for clave in claves_calc if clave in CLAVES_LECTURA]
+    with (motor or motor_repositorio()).connect() as con:
+        fila_tubo = con.execute(select(tubos).where(tubos.c.nombre == nombre, tubos.c.error.is_(None))).first()
+        if fila_tubo is None:
+            return None
+        tubo = {}
+        if fila_tubo.info is not None:
+            tubo['info'] = json.loads(fila_tubo.info)
+        datos_umbrales = con.execute(select(umbrales.c.datos).where(umbrales.c.tubo_id == fila_tubo.id)).scalar()
+        if datos_umbrales is not None:
+            tubo['umbrales'] = json.loads(datos_umbrales)
+
+        condiciones = [campanas.c.tubo_id == fila_tubo.id]
+        if solo_activas:
+            condiciones.append(campanas.c.activa.is_(True))
+        columnas = [campanas.c.id, campanas.c.fecha, campanas.c.con_calc]
+        if completo:
+            columnas += [campanas.c.datos, campanas.c.raw]
+        calc = {}
+        for fila in con.execute(select(*columnas).where(*condiciones).order_by(campanas.c.id)):
+            campana = json.loads(fila.datos) if completo else {}
+            if fila.con_calc:
+                campana['calc'] = calc[fila.id] = []
+            if completo and fila.raw is not None:
+                campana['raw'] = json.loads(fila.raw)
+            tubo[fila.fecha] = campana
+
+        consulta = (select(lecturas.c.campana_id, *[lecturas.c[clave] for clave in claves], lecturas.c.otros)
+                    .join(campanas, campanas.c.id == lecturas.c.campana_id)
+                    .where(*condiciones)
+                    .order_by(lecturas.c.campana_id, lecturas.c.posicion))
+        for fila in con.execute(consulta):
+            calc[fila.campana_id].append(_punto(fila, claves, completo))
+
+        if completo:
+            for fila in con.execute(select(correcciones).where(correcciones.c.tubo_id == fila_tubo.id)):
+                if fila.fecha in tubo:
+                    tubo[fila.fecha][fila.tipo] = json.loads(fila.datos)
+        extras = json.loads(fila_tubo.extras) if fila_tubo.extras is not None else {}
+        orden = extras.pop(CLAVE_ORDEN, None)
+        if completo:
+            tubo.update(extras)
+    if orden is not None:
+        # mismo orden de claves que el archivo (las que no estén en el orden guardado, al final)
+        tubo = {**{clave: tubo[clave] for clave in orden if clave in tubo}, **tubo}
+    return tubo
+
+
+def ultimas_lecturas(nombre, n, index=None, depth=None, claves=('cota_abs', 'depth', 'desp_a', 'desp_b'),
+                     solo_activas=True, motor=None):
+    """
+    Lecturas de las últimas n campañas en un punto del tubo (o en todos si no se indica index ni
+    depth), de la más reciente a la más antigua. Una consulta sobre el índice (tubo, index, fecha) de
+    lecturas; el límite se aplica a las campañas, no a las filas.
+
+    Args:
+        nombre (str): nombre del archivo del tubo en data/.
+        n (int): número de campañas.
+        index (int): posición en el índice del tubo (y/o depth, profundidad).
+        claves (iterable): claves de CLAVES_LECTURA a devolver.
+        solo_activas (bool): sólo campañas activas.
+
+    Returns:
+        list: [{"fecha", **claves}], por fecha descendente y en el orden de calc dentro de cada campaña.
+    """
+    condiciones = [lecturas.c.tubo_id == select(tubos.c.id).where(tubos.c.nombre == nombre).scalar_subquery()]
+    if index is not None:
+        condiciones.append(lecturas.c['index'] == index)
+    if depth is not None:
+        condiciones.append(lecturas.c.depth == depth)
+    if solo_activas:
+        condiciones.append(campanas.c.activa.is_(True))
+    fechas = (select(lecturas.c.fecha).distinct()
+              .join(campanas, campanas.c.id == lecturas.c.campana_id)
+              .where(*condiciones)
+              .order_by(lecturas.c.fecha.desc()).limit(n))
+    consulta = (select(lecturas.c.fecha, *[lecturas.c[clave] for clave in claves])
+                .join(campanas, campanas.c.id == lecturas.c.campana_id)
+                .where(*condiciones, lecturas.c.fecha.in_(fechas))
+                .order_by(lecturas.c.fecha.desc(), lecturas.c.posicion))
+    with (motor or motor_repositorio()).connect() as con:
+        return [dict(fila._mapping) for fila in con.execute(consulta)]
+
+
+if __name__ == "__main__":
+    # python -m utils.repositorio_tubos: crea o pone al día data/tubos.sqlite
+    resultado = sincronizar_repositorio()
+    print(f"{len(resultado['importados'])} tubos importados, {len(resultado['eliminados'])} eliminados, "
+          f"{len(resultado['errores'])} con error")
+    for nombre_tubo, motivo in resultado["errores"].items():
+        print(f"  {nombre_tubo}: {motivo}")
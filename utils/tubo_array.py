@@ -0,0 +1,319 @@
+# utils/tubo_array.py
+
+import copy
+
+import numpy as np
+
+# Representación columnar del tubo.
+# En el JSON cada campaña guarda 'calc' y 'raw' como listas de puntos (un dict por profundidad).
+# TuboArray guarda cada variable como un array float de forma (campañas x índices de profundidad),
+# más una tabla de metadatos por campaña (campaign_info, info_readout, spike, bias...).
+# La conversión a/desde el JSON es sin pérdidas: se conservan el orden de claves y de puntos,
+# el tipo int/float de cada valor y cualquier valor no numérico.
+
+BLOQUES = ("calc", "raw")
+CLAVES_NO_CAMPANA = ("info", "umbrales")
+
+# tipo de cada celda de un bloque
+SIN_VALOR = 0
+ENTERO = 1
+REAL = 2
+OTRO = 3  # bool, None, str... se guarda tal cual en 'otros'
+
+MAX_ENTERO_EXACTO = 2 ** 53  # enteros que un float64 representa sin pérdida
+_SIN_VALOR = object()
+
+MAX_ARRAYS_EN_CACHE = 4
+_cache = []  # [(tubo, huella, listas, tubo_array)], el más reciente al final
+
+
+def _tipo(valor):
+    if isinstance(valor, bool):
+        return OTRO
+    if isinstance(valor, int):
+        return ENTERO if abs(valor) < MAX_ENTERO_EXACTO else OTRO
+    if isinstance(valor, float):
+        return REAL
+    return OTRO
+
+
+def _es_rejilla(puntos):
+    # un bloque cabe en la rejilla si es una lista de dicts con 'index' numérico y sin repetir
+    if not isinstance(puntos, list):
+        return False
+    vistos = set()
+    for punto in puntos:
+        if not isinstance(punto, dict) or _tipo(punto.get('index')) not in (ENTERO, REAL):
+            return False
+        if punto['index'] in vistos:
+            return False
+        vistos.add(punto['index'])
+    return True
+
+
+def _huella(tubo):
+    # identifica el contenido del tubo sin recorrer los puntos: listas calc/raw y su longitud.
+    # Devuelve también las listas, que se guardan con la huella para que su id no se reutilice.
+    huella, listas = [], []
+    for clave, valor in tubo.items():
+        if isinstance(valor, dict) and clave not in CLAVES_NO_CAMPANA:
+            bloques = [valor.get(b) for b in BLOQUES]
+            listas.extend(bloques)
+            huella.append((clave, tuple((id(b), len(b or ())) for b in bloques)))
+    return tuple(huella), listas
+
+
+class TuboArray:
+    """
+    Tubo en formato columnar.
+
+    Atributos:
+        fechas (list): claves de las campañas, en el orden del JSON.
+        indices (np.ndarray): valores de 'index' de todas las campañas, ordenados (columnas).
+        campanas (list): metadatos de cada campaña (todo lo que no es calc/raw).
+        valores (dict): por bloque ('calc', 'raw'), {variable: array float campañas x índices}.
+            NaN donde la campaña no tiene ese punto o esa variable.
+        derivados (dict): resultados calculados a partir de los arrays que otros módulos guardan con
+            el TuboArray (p. ej. los umbrales remuestreados en la rejilla); se descartan con él.
+
+    Se obtiene con TuboArray.desde_json(tubo) o, reutilizando el ya construido para el mismo
+    dict, con TuboArray.de_tubo(tubo). a_json() devuelve el tubo original.
+    """
+
+    def __init__(self, tubo):
+        self.orden_claves = list(tubo.keys())
+        self.extras = {}
+        self.fechas = []
+        self.campanas = []
+        self._posicion = {}
+        self.derivados = {}
+
+        campanas_json = []
+        for clave, valor in tubo.items():
+            if isinstance(valor, dict) and clave not in CLAVES_NO_CAMPANA:
+                self._posicion[clave] = len(self.fechas)
+                self.fechas.append(clave)
+                campanas_json.append(valor)
+            else:
+                self.extras[clave] = valor
+
+        # columnas: todos los 'index' de las campañas que caben en la rejilla
+        todos = set()
+        for valor in campanas_json:
+            for bloque in BLOQUES:
+                if _es_rejilla(valor.get(bloque)):
+                    todos.update(punto['index'] for punto in valor[bloque])
+        self.indices = np.array(sorted(todos), dtype=float)
+        columna_de = {index: j for j, index in enumerate(self.indices.tolist())}
+
+        n_campanas, n_indices = len(self.fechas), len(self.indices)
+        self.valores = {bloque: {} for bloque in BLOQUES}
+        self.tipos = {bloque: {} for bloque in BLOQUES}
+        self.otros = {bloque: {} for bloque in BLOQUES}
+
+        for i, valor in enumerate(campanas_json):
+            campana = {'claves': list(valor.keys()),
+                       'meta': {k: v for k, v in valor.items() if k not in BLOQUES},
+                       'bloques': {}}
+            for bloque in BLOQUES:
+                if bloque not in valor:
+                    continue
+                puntos = valor[bloque]
+                if not _es_rejilla(puntos):
+                    # p. ej. índices repetidos: el bloque se conserva tal cual
+                    campana['bloques'][bloque] = {'original': puntos}
+                    continue
+
+                posiciones = np.fromiter((columna_de[float(p['index'])] for p in puntos), dtype=np.intp,
+                                         count=len(puntos))
+                claves_punto = [tuple(p.keys()) for p in puntos]
+                comunes = claves_punto[0] if claves_punto and all(c == claves_punto[0] for c in claves_punto) else None
+                campana['bloques'][bloque] = {
+                    'posiciones': posiciones,
+                    'tramo': self._tramo(posiciones),
+                    'claves_punto': comunes if comunes is not None else claves_punto,
+                    'claves_comunes': comunes is not None,
+                }
+
+                variables = dict.fromkeys(c for claves in claves_punto for c in claves)
+                for variable in variables:
+                    if variable not in self.valores[bloque]:
+                        self.valores[bloque][variable] = np.full((n_campanas, n_indices), np.nan)
+                        self.tipos[bloque][variable] = np.zeros((n_campanas, n_indices), dtype=np.int8)
+                    datos = [p.get(variable, _SIN_VALOR) for p in puntos]
+                    tipos = np.fromiter((SIN_VALOR if d is _SIN_VALOR else _tipo(d) for d in datos), dtype=np.int8,
+                                        count=len(datos))
+                    numericos = (tipos == ENTERO) | (tipos == REAL)
+                    self.tipos[bloque][variable][i, posiciones] = tipos
+                    self.valores[bloque][variable][i, posiciones[numericos]] = np.array(
+                        [d for d, n in zip(datos, numericos.tolist()) if n], dtype=float)
+                    for k in np.flatnonzero(tipos == OTRO).tolist():
+                        self.otros[bloque][(i, int(posiciones[k]), variable)] = datos[k]
+            self.campanas.append(campana)
+
+    @staticmethod
+    def _tramo(posiciones):
+        # si los puntos ocupan columnas consecutivas y ordenadas, el perfil es un slice (vista sin copia)
+        if posiciones.size and np.array_equal(posiciones, np.arange(posiciones[0], posiciones[0] + posiciones.size)):
+            return slice(int(posiciones[0]), int(posiciones[0]) + posiciones.size)
+        return None
+
+    # Construcción ---------------------------------------------------------------------------------
+    @classmethod
+    def desde_json(cls, tubo):
+        """Construye el TuboArray de un tubo en el esquema JSON."""
+        return cls(tubo)
+
+    @classmethod
+    def de_tubo(cls, tubo):
+        """
+        Devuelve el TuboArray del dict tubo, reutilizando el último construido para ese mismo dict
+        mientras no se sustituyan sus listas calc/raw.
+        """
+        huella, listas = _huella(tubo)
+        for k, (tubo_cache, huella_cache, _, tubo_array) in enumerate(_cache):
+            if tubo_cache is tubo and huella_cache == huella:
+                _cache.append(_cache.pop(k))
+                return tubo_array
+        tubo_array = cls(tubo)
+        _cache[:] = [entrada for entrada in _cache if entrada[0] is not tubo]
+        _cache.append((tubo, huella, listas, tubo_array))
+        del _cache[:-MAX_ARRAYS_EN_CACHE]
+        return tubo_array
+
+    @classmethod
+    def en_cache(cls, tubo):
+        """TuboArray ya construido para el dict tubo (ver de_tubo), o None si no lo hay. No construye ninguno."""
+        huella, _ = _huella(tubo)
+        for tubo_cache, huella_cache, _, tubo_array in _cache:
+            if tubo_cache is tubo and huella_cache == huella:
+                return tubo_array
+        return None
+
+    def a_json(self):
+        """Devuelve el tubo en el esquema JSON original."""
+        tubo = {}
+        for clave in self.orden_claves:
+            if clave in self._posicion:
+                tubo[clave] = self._campana_json(self._posicion[clave])
+            else:
+                tubo[clave] = copy.deepcopy(self.extras[clave])
+        return tubo
+
+    def _campana_json(self, i):
+        campana = self.campanas[i]
+        resultado = {}
+        for clave in campana['claves']:
+            if clave in campana['bloques']:
+                resultado[clave] = self._bloque_json(i, clave)
+            else:
+                resultado[clave] = copy.deepcopy(campana['meta'][clave])
+        return resultado
+
+    def _bloque_json(self, i, bloque):
+        datos = self.campanas[i]['bloques'][bloque]
+        if 'original' in datos:
+            return copy.deepcopy(datos['original'])
+
+        posiciones = datos['posiciones'].tolist()
+        claves_punto = [datos['claves_punto']] * len(posiciones) if datos['claves_comunes'] else datos['claves_punto']
+        variables = set(c for claves in claves_punto for c in claves)
+        filas = {v: (self.valores[bloque][v][i].tolist(), self.tipos[bloque][v][i].tolist()) for v in variables}
+        otros = self.otros[bloque]
+
+        puntos = []
+        for j, claves in zip(posiciones, claves_punto):
+            punto = {}
+            for variable in claves:
+                valores, tipos = filas[variable]
+                tipo = tipos[j]
+                if tipo == ENTERO:
+                    punto[variable] = int(valores[j])
+                elif tipo == REAL:
+                    punto[variable] = valores[j]
+                else:
+                    punto[variable] = otros[(i, j, variable)]
+            puntos.append(punto)
+        return puntos
+
+    # Lectura --------------------------------------------------------------------------------------
+    def __len__(self):
+        return len(self.fechas)
+
+    def __contains__(self, fecha):
+        return fecha in self._posicion
+
+    def posicion(self, fecha):
+        """Fila de la campaña fecha en los arrays."""
+        return self._posicion[fecha]
+
+    def tiene_bloque(self, fecha, bloque="calc"):
+        """La campaña existe y tiene el bloque (calc/raw) con algún punto."""
+        i = self._posicion.get(fecha)
+        if i is None or bloque not in self.campanas[i]['bloques']:
+            return False
+        datos = self.campanas[i]['bloques'][bloque]
+        return bool(datos['original']) if 'original' in datos else datos['posiciones'].size > 0
+
+    def en_rejilla(self, fecha, bloque="calc"):
+        """La campaña tiene el bloque y sus valores están en los arrays (no se conserva tal cual)."""
+        i = self._posicion.get(fecha)
+        return i is not None and 'posiciones' in self.campanas[i]['bloques'].get(bloque, {})
+
+    def variable(self, variable, bloque="calc"):
+        """Array campañas x índices de una variable (la referencia interna, sin copia)."""
+        return self.valores[bloque][variable]
+
+    def perfil(self, fecha, variable, bloque="calc", defecto=None):
+        """
+        Valores de una variable en una campaña, en el orden de sus puntos.
+
+        Si los puntos de la campaña ocupan índices consecutivos (el caso normal) devuelve una vista
+        del array, sin copiar. Donde un punto no tiene la variable queda NaN, o defecto si se indica
+        (en ese caso sí se copia, y sólo si falta algún valor).
+        """
+        i = self._posicion[fecha]
+        datos = self.campanas[i]['bloques'][bloque]
+        if 'original' in datos:
+            valores = np.array([p.get(variable, np.nan) if isinstance(p, dict) else np.nan
+                                for p in datos['original']], dtype=float)
+        elif variable not in self.valores[bloque]:
+            valores = np.full(datos['posiciones'].size, np.nan)
+        else:
+            valores = self._recortar(self.valores[bloque][variable][i], datos)
+
+        if defecto is not None and np.isnan(valores).any():
+            valores = np.where(np.isnan(valores), defecto, valores)
+        return valores
+
+    def perfil_matriz(self, fecha, matriz, bloque="calc"):
+        """
+        Fila de la campaña fecha de una matriz campañas x índices calculada a partir de valores
+        (p. ej. el desplazamiento total), en el orden de sus puntos. None si el bloque no está en la
+        rejilla (se conserva tal cual en el JSON).
+        """
+        i = self._posicion[fecha]
+        datos = self.campanas[i]['bloques'][bloque]
+        if 'original' in datos:
+            return None
+        return self._recortar(matriz[i], datos)
+
+    @staticmethod
+    def _recortar(fila, datos):
+        return fila[datos['tramo']] if datos['tramo'] is not None else fila[datos['posiciones']]
+
+    def perfiles(self, fechas, variable, bloque="calc"):
+        """Array fechas x índices de una variable para un subconjunto de campañas."""
+        filas = [self._posicion[fecha] for fecha in fechas]
+        if variable not in self.valores[bloque]:
+            return np.full((len(filas), len(self.indices)), np.nan)
+        return self.valores[bloque][variable][filas]
+
+    def meta(self, fecha, clave, defecto=None):
+        """Dato de la tabla de metadatos de una campaña (campaign_info, info_readout, spike...)."""
+        return self.campanas[self._posicion[fecha]]['meta'].get(clave, defecto)
+
+
+def invalidar_tubo(tubo):
+    """Descarta el TuboArray cacheado de un tubo que se ha modificado en el sitio."""
+    _cache[:] = [entrada for entrada in _cache if entrada[0] is not tubo]
@@ -0,0 +1,512 @@
+# utils/tubo_binario.py
+
+import json
+import os
+import struct
+import sys
+import tempfile
+
+import numpy as np
+
+from utils.diario_tubo import (aplicar_diario, anotar_campanas, borrar_diario, compactar_tubo_json,
+                               escribir_json_atomico, necesita_compactar)
+from utils.tubo_array import BLOQUES, CLAVES_NO_CAMPANA, ENTERO, REAL, OTRO, _SIN_VALOR, _tipo, _es_rejilla
+
+# Formato binario del tubo (.tubo), alternativo al JSON de data/.
+#
+#   MAGIA | segmentos de campaña ... | cabecera JSON | longitud de la cabecera (uint64) | MAGIA
+#
+# Cada bloque calc/raw de una campaña es un segmento: una matriz float64 (variables x puntos) seguida
+# de una matriz int8 con el tipo de cada valor (sin valor, entero, real u otro), alineado a 8 bytes.
+# La cabecera guarda info, umbrales, los metadatos de cada campaña y dónde empieza cada segmento.
+# Añadir o sustituir campañas escribe sólo sus segmentos y una cabecera parcial al final, con esas
+# campañas y las claves nuevas, encadenada a la cabecera anterior ('anterior': dónde termina su cola).
+# Al leer se recorre la cadena hasta la cabecera completa. Cada cabecera lleva los bytes que han
+# quedado sin usar (segmentos y entradas de campañas sustituidas) y la longitud de la cadena; cuando
+# pasan de FRACCION_MAX_MUERTOS del archivo o de MAX_CABECERAS_ENCADENADAS, guardar_campanas compacta
+# el tubo (como el diario de los tubos JSON, ver utils/diario_tubo.py).
+# TuboBinario da vistas memmap de los segmentos (matrices, perfil) sin leer el resto del archivo;
+# cargar_tubo y cargar_tubo_binario construyen el dict JSON completo y leen todos los segmentos.
+
+MAGIA = b"TUBOBIN1"
+VERSION = 2  # 2: cabeceras parciales encadenadas; las de la versión 1 son siempre completas
+VERSIONES_LEGIBLES = (1, 2)
+EXTENSION_BINARIA = ".tubo"
+EXTENSIONES_TUBO = (".json", EXTENSION_BINARIA)
+DIRECTORIO_DATA = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+
+MAX_CABECERAS_ENCADENADAS = 50  # guardados de campañas antes de compactar
+FRACCION_MAX_MUERTOS = 0.5  # o si los bytes sin usar superan esta fracción del archivo
+
+_COLA = struct.Struct("<Q8s")  # longitud de la cabecera + MAGIA
+
+
+def es_tubo_binario(origen):
+    """True si origen (ruta o bytes) es un tubo en formato binario."""
+    if isinstance(origen, (bytes, bytearray, memoryview)):
+        return bytes(origen[:len(MAGIA)]) == MAGIA
+    try:
+        with open(origen, "rb") as f:
+            return f.read(len(MAGIA)) == MAGIA
+    except OSError:
+        return False
+
+
+# Escritura ------------------------------------------------------------------------------------------
+def _codificar_bloque(puntos):
+    # devuelve (descriptor del bloque para la cabecera, bytes del segmento o None)
+    if not _es_rejilla(puntos):
+        return {'original': puntos}, None
+
+    claves_punto = [list(p.keys()) for p in puntos]
+    comunes = all(c == claves_punto[0] for c in claves_punto) if claves_punto else True
+    variables = list(dict.fromkeys(c for claves in claves_punto for c in claves))
+
+    valores = np.full((len(variables), len(puntos)), np.nan)
+    tipos = np.zeros((len(variables), len(puntos)), dtype=np.int8)
+    otros = []
+    for v, variable in enumerate(variables):
+        for k, punto in enumerate(puntos):
+            dato = punto.get(variable, _SIN_VALOR)
+            if dato is _SIN_VALOR:
+                continue
+            tipo = _tipo(dato)
+            tipos[v, k] = tipo
+            if tipo == OTRO:
+                otros.append([k, variable, dato])
+            else:
+                valores[v, k] = dato
+
+    descriptor = {
+        'n_puntos': len(puntos),
+        'variables': variables,
+        'claves_punto': claves_punto[0] if comunes and claves_punto else claves_punto,
+        'claves_comunes': comunes,
+        'otros': otros,
+    }
+    segmento = valores.astype('<f8').tobytes() + tipos.tobytes()
+    segmento += b"\0" * (-len(segmento) % 8)
+    return descriptor, segmento
+
+
+def _escribir_campanas(f, campanas, cabecera):
+    # escribe en f (posicionado al final de los datos) los segmentos de las campañas y sus entradas en
+    # la cabecera (el orden de claves lo pone quien llama)
+    for fecha, campana in campanas.items():
+        entrada = {'claves': list(campana.keys()),
+                   'meta': {k: v for k, v in campana.items() if k not in BLOQUES},
+                   'bloques': {}}
+        for bloque in BLOQUES:
+            if bloque not in campana:
+                continue
+            descriptor, segmento = _codificar_bloque(campana[bloque])
+            if segmento is not None:
+                descriptor['offset'] = f.tell()
+                f.write(segmento)
+            entrada['bloques'][bloque] = descriptor
+        cabecera['campanas'][fecha] = entrada
+
+
+def _escribir_cabecera(f, cabecera):
+    cabecera['fin_datos'] = f.tell()
+    contenido = json.dumps(cabecera, ensure_ascii=False).encode("utf-8")
+    f.write(contenido)
+    f.write(_COLA.pack(len(contenido), MAGIA))
+
+
+def _bytes_entrada(entrada):
+    # bytes que deja sin usar una campaña al sustituirla: sus segmentos y su entrada en la cabecera
+    total = len(json.dumps(entrada, ensure_ascii=False).encode("utf-8"))
+    for descriptor in entrada['bloques'].values():
+        if 'offset' in descriptor:
+            n = len(descriptor['variables']) * descriptor['n_puntos'] * 9
+            total += n + (-n % 8)
+    return total
+
+
+def _separar(tubo):
+    # separa las campañas del resto de claves (info, umbrales...)
+    campanas = {k: v for k, v in tubo.items() if isinstance(v, dict) and k not in CLAVES_NO_CAMPANA}
+    extras = {k: v for k, v in tubo.items() if k not in campanas}
+    return campanas, extras
+
+
+def guardar_tubo_binario(tubo, ruta):
+    """
+    Escribe el tubo completo en formato binario. Se escribe en un temporal y se sustituye el archivo
+    de forma atómica (os.replace), así que también sirve para compactar.
+    """
+    campanas, extras = _separar(tubo)
+    cabecera = {'version': VERSION, 'orden_claves': [], 'extras': extras, 'campanas': {},
+                'bytes_muertos': 0, 'encadenadas': 0}
+
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    fd, temporal = tempfile.mkstemp(dir=directorio, suffix=EXTENSION_BINARIA + ".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIA)
+            _escribir_campanas(f, campanas, cabecera)
+            cabecera['orden_claves'] = list(tubo.keys())
+            _escribir_cabecera(f, cabecera)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def agregar_campanas_binario(ruta, campanas, extras=None):
+    """
+    Añade (o sustituye) campañas de un tubo binario sin reescribir el resto: se escriben sus segmentos
+    y una cabecera parcial encadenada a la anterior.
+
+    Args:
+        ruta (str): archivo .tubo existente.
+        campanas (dict): {fecha: campaña} en el esquema JSON.
+        extras (dict, optional): claves no campaña (info, umbrales...) a actualizar.
+    """
+    with open(ruta, "r+b") as f:
+        def leer(n, desde):
+            f.seek(desde)
+            return f.read(n)
+        # se escribe detrás de la cabecera vigente (descartando lo que haya dejado una escritura cortada);
+        # si algo falla se recorta el archivo a ese tamaño y sigue valiendo la cabecera anterior. Los
+        # segmentos se sincronizan a disco antes de escribir la cabecera que los referencia, así que si
+        # el proceso muere a mitad la cola anterior sigue siendo válida (ver _buscar_cabecera)
+        ultima, tamano_original = _buscar_cabecera(leer, os.path.getsize(ruta))
+        cabecera = _resolver_cadena(leer, ultima)
+        extras = extras or {}
+
+        muertos = sum(_bytes_entrada(cabecera['campanas'][fecha]) for fecha in campanas
+                      if fecha in cabecera['campanas'])
+        muertos += sum(len(json.dumps(cabecera['extras'][clave], ensure_ascii=False).encode("utf-8"))
+                       for clave in extras if clave in cabecera['extras'])
+        existentes = set(cabecera['orden_claves'])
+        parcial = {'version': VERSION, 'anterior': tamano_original,
+                   'orden_claves': [clave for clave in list(campanas) + list(extras) if clave not in existentes],
+                   'extras': extras, 'campanas': {},
+                   'bytes_muertos': cabecera.get('bytes_muertos', 0) + muertos,
+                   'encadenadas': cabecera.get('encadenadas', 0) + 1}
+
+        f.truncate(tamano_original)
+        f.seek(tamano_original)
+        try:
+            _escribir_campanas(f, campanas, parcial)
+            f.flush()
+            os.fsync(f.fileno())
+            _escribir_cabecera(f, parcial)
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.truncate(tamano_original)
+            raise
+
+
+def necesita_compactar_binario(ruta):
+    """
+    El tubo binario tiene más de MAX_CABECERAS_ENCADENADAS cabeceras parciales o sus bytes sin usar
+    superan FRACCION_MAX_MUERTOS del archivo. Sólo lee la última cabecera.
+    """
+    tamano = os.path.getsize(ruta)
+    with open(ruta, "rb") as f:
+        def leer(n, desde):
+            f.seek(desde)
+            return f.read(n)
+        cabecera = _buscar_cabecera(leer, tamano)[0]
+    return (cabecera.get('encadenadas', 0) > MAX_CABECERAS_ENCADENADAS
+            or cabecera.get('bytes_muertos', 0) > FRACCION_MAX_MUERTOS * tamano)
+
+
+def compactar_tubo_binario(ruta):
+    """Reescribe el tubo binario con una sola cabecera, descartando los segmentos que ya no se usan."""
+    guardar_tubo_binario(cargar_tubo_binario(ruta), ruta)
+
+
+# Lectura --------------------------------------------------------------------------------------------
+def _cabecera_en(leer_final, fin):
+    # cabecera cuya cola termina en fin, o None si ahí no hay una cola y una cabecera válidas
+    if fin < len(MAGIA) + _COLA.size:
+        return None
+    longitud, magia = _COLA.unpack(leer_final(_COLA.size, fin - _COLA.size))
+    inicio = fin - _COLA.size - longitud
+    if magia != MAGIA or inicio < len(MAGIA):
+        return None
+    try:
+        cabecera = json.loads(leer_final(longitud, inicio).decode("utf-8"))
+    except ValueError:
+        return None
+    if not isinstance(cabecera, dict) or cabecera.get('fin_datos') != inicio:
+        return None
+    return cabecera
+
+
+def _buscar_cabecera(leer_final, tamano):
+    # (cabecera, fin) de la última cabecera válida. Si la escritura de unas campañas se cortó (el proceso
+    # murió o se fue la luz a mitad), al final queda un segmento o una cabecera a medias: se busca hacia
+    # atrás la cola (MAGIA) anterior, que sigue intacta
+    if tamano < len(MAGIA) + _COLA.size:
+        raise ValueError("Archivo de tubo binario incompleto")
+    cabecera = _cabecera_en(leer_final, tamano)
+    fin = tamano
+    if cabecera is None:
+        bloque = 1 << 20
+        hasta = tamano - 1  # se busca MAGIA que termine antes de hasta
+        while cabecera is None and hasta > len(MAGIA):
+            desde = max(0, hasta - bloque)
+            datos = leer_final(hasta - desde, desde)
+            posicion = datos.rfind(MAGIA)
+            while posicion >= 0 and cabecera is None:
+                fin = desde + posicion + len(MAGIA)
+                cabecera = _cabecera_en(leer_final, fin)
+                posicion = datos.rfind(MAGIA, 0, posicion + len(MAGIA) - 1)
+            hasta = desde + len(MAGIA) - 1  # solapa para no perder una MAGIA partida entre bloques
+            if desde == 0:
+                break
+        if cabecera is None:
+            raise ValueError("Archivo de tubo binario incompleto o dañado")
+        print(f"Tubo binario con una escritura incompleta al final ({tamano - fin} bytes), se usa la cabecera anterior")
+    if cabecera.get('version') not in VERSIONES_LEGIBLES:
+        raise ValueError(f"Versión de tubo binario no soportada: {cabecera.get('version')}")
+    return cabecera, fin
+
+
+def _resolver_cadena(leer_final, cabecera):
+    # cabecera completa a partir de la última: se aplican, de la más antigua a la más reciente, las
+    # cabeceras parciales sobre la completa en la que empieza la cadena
+    cadena = [cabecera]
+    while cadena[-1].get('anterior') is not None:
+        anterior = _cabecera_en(leer_final, cadena[-1]['anterior'])
+        if anterior is None or anterior.get('version') not in VERSIONES_LEGIBLES:
+            raise ValueError("Archivo de tubo binario dañado: falta una cabecera de la cadena")
+        cadena.append(anterior)
+    if len(cadena) == 1:
+        return cabecera
+
+    completa = cadena.pop()
+    for parcial in reversed(cadena):
+        completa['campanas'].update(parcial['campanas'])
+        completa['extras'].update(parcial['extras'])
+        completa['orden_claves'].extend(parcial['orden_claves'])
+    completa['bytes_muertos'] = cabecera.get('bytes_muertos', 0)
+    completa['encadenadas'] = cabecera.get('encadenadas', 0)
+    return completa
+
+
+def _leer_cabecera(leer_final, tamano):
+    # leer_final(n, desde): bytes [desde, desde + n)
+    return _resolver_cadena(leer_final, _buscar_cabecera(leer_final, tamano)[0])
+
+
+class TuboBinario:
+    """
+    Tubo binario abierto para lectura. Con memmap (por defecto) sólo se leen del disco los segmentos
+    que se consultan.
+
+    Uso:
+        with TuboBinario(ruta) as tubo_bin:
+            desp_a = tubo_bin.perfil(fecha, 'desp_a')
+            tubo = tubo_bin.a_json()
+    """
+
+    def __init__(self, origen, mmap=True):
+        if isinstance(origen, (bytes, bytearray, memoryview)):
+            self._datos = np.frombuffer(origen, dtype=np.uint8)
+        elif mmap:
+            self._datos = np.memmap(origen, dtype=np.uint8, mode="r")
+        else:
+            self._datos = np.fromfile(origen, dtype=np.uint8)
+        if bytes(self._datos[:len(MAGIA)]) != MAGIA:
+            raise ValueError("No es un archivo de tubo binario")
+        self.cabecera = _leer_cabecera(lambda n, desde: bytes(self._datos[desde:desde + n]), self._datos.size)
+        self.fechas = [clave for clave in self.cabecera['orden_claves'] if clave in self.cabecera['campanas']]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self):
+        """Libera el memmap (en Windows el archivo queda bloqueado mientras está abierto)."""
+        self._datos = None
+
+    def matrices(self, fecha, bloque="calc"):
+        """(variables, valores, tipos) de un bloque: vistas variables x puntos sobre el archivo."""
+        descriptor = self.cabecera['campanas'][fecha]['bloques'][bloque]
+        variables = descriptor['variables']
+        n = len(variables) * descriptor['n_puntos']
+        inicio = descriptor['offset']
+        forma = (len(variables), descriptor['n_puntos'])
+        valores = self._datos[inicio:inicio + 8 * n].view('<f8').reshape(forma)
+        tipos = self._datos[inicio + 8 * n:inicio + 9 * n].view(np.int8).reshape(forma)
+        return variables, valores, tipos
+
+    def perfil(self, fecha, variable, bloque="calc"):
+        """Valores de una variable en una campaña (vista sobre el archivo, NaN donde no hay valor)."""
+        descriptor = self.cabecera['campanas'][fecha]['bloques'][bloque]
+        if 'original' in descriptor:
+            return np.array([p.get(variable, np.nan) for p in descriptor['original']], dtype=float)
+        variables, valores, _ = self.matrices(fecha, bloque)
+        if variable not in variables:
+            return np.full(descriptor['n_puntos'], np.nan)
+        return valores[variables.index(variable)]
+
+    def _bloque_json(self, fecha, bloque):
+        descriptor = self.cabecera['campanas'][fecha]['bloques'][bloque]
+        if 'original' in descriptor:
+            return descriptor['original']
+
+        variables, valores, tipos = self.matrices(fecha, bloque)
+        columnas = {variable: (valores[v].tolist(), tipos[v].tolist()) for v, variable in enumerate(variables)}
+        otros = {(k, variable): dato for k, variable, dato in descriptor['otros']}
+        n_puntos = descriptor['n_puntos']
+        claves_punto = ([descriptor['claves_punto']] * n_puntos if descriptor['claves_comunes']
+                        else descriptor['claves_punto'])
+
+        puntos = []
+        for k, claves in enumerate(claves_punto):
+            punto = {}
+            for variable in claves:
+                datos, tipos_variable = columnas[variable]
+                tipo = tipos_variable[k]
+                if tipo == ENTERO:
+                    punto[variable] = int(datos[k])
+                elif tipo == REAL:
+                    punto[variable] = datos[k]
+                else:
+                    punto[variable] = otros[(k, variable)]
+            puntos.append(punto)
+        return puntos
+
+    def campana_json(self, fecha):
+        """Campaña en el esquema JSON."""
+        entrada = self.cabecera['campanas'][fecha]
+        return {clave: self._bloque_json(fecha, clave) if clave in entrada['bloques'] else entrada['meta'][clave]
+                for clave in entrada['claves']}
+
+    def a_json(self):
+        """Tubo completo en el esquema JSON."""
+        tubo = {}
+        for clave in self.cabecera['orden_claves']:
+            if clave in self.cabecera['campanas']:
+                tubo[clave] = self.campana_json(clave)
+            else:
+                tubo[clave] = self.cabecera['extras'][clave]
+        return tubo
+
+
+def cargar_tubo_binario(origen):
+    """Tubo (dict en el esquema JSON) desde una ruta o unos bytes en formato binario."""
+    with TuboBinario(origen) as tubo_bin:
+        return tubo_bin.a_json()
+
+
+# Acceso indistinto a JSON y binario -----------------------------------------------------------------
+# Los tubos JSON llevan además el diario de campañas añadidas (utils/diario_tubo.py).
+# Los guardados de tubos de data/ se reflejan en el repositorio SQLite (utils/repositorio_tubos.py).
+def _al_guardar(ruta, tubo, fechas=None):
+    from utils.repositorio_tubos import al_guardar  # import local: el repositorio importa este módulo
+    return al_guardar(ruta, tubo, fechas)
+
+
+def cargar_tubo(ruta):
+    """Carga un tubo de data/ detectando el formato (JSON o binario)."""
+    if es_tubo_binario(ruta):
+        return cargar_tubo_binario(ruta)
+    with open(ruta, "r", encoding="utf-8") as f:
+        tubo = json.load(f)
+    return aplicar_diario(tubo, ruta)
+
+
+def _es_contenido_de(ruta, contenido):
+    # el archivo ruta tiene exactamente ese contenido
+    if isinstance(contenido, str):
+        contenido = contenido.encode("utf-8")
+    try:
+        if os.path.getsize(ruta) != len(contenido):
+            return False
+        with open(ruta, "rb") as f:
+            return f.read() == bytes(contenido)
+    except OSError:
+        return False
+
+
+def cargar_tubo_bytes(contenido, nombre_archivo=None):
+    """
+    Carga un tubo desde el contenido de un archivo subido (dcc.Upload), JSON o binario.
+    Si se indica el nombre y lo subido es el propio tubo JSON de data/ (mismo contenido), se le aplica
+    su diario; a otro archivo que sólo comparta el nombre no se le mezclan esas campañas.
+    """
+    if es_tubo_binario(contenido):
+        return cargar_tubo_binario(contenido)
+    tubo = json.loads(contenido)
+    if nombre_archivo and isinstance(tubo, dict):
+        ruta = os.path.join(DIRECTORIO_DATA, os.path.basename(nombre_archivo))
+        if _es_contenido_de(ruta, contenido):
+            aplicar_diario(tubo, ruta)
+    return tubo
+
+
+def guardar_tubo(tubo, ruta):
+    """
+    Escribe el tubo completo en ruta, en binario si el archivo ya lo es o tiene extensión .tubo,
+    y si no en JSON (indent=4, como el resto de la aplicación). La escritura es atómica y en JSON
+    deja el diario vacío.
+    """
+    with _al_guardar(ruta, tubo):
+        if es_tubo_binario(ruta) or str(ruta).endswith(EXTENSION_BINARIA):
+            guardar_tubo_binario(tubo, ruta)
+        else:
+            escribir_json_atomico(tubo, ruta, ensure_ascii=False, indent=4,
+                                  default=lambda o: o.item() if hasattr(o, 'item') else str(o))
+            borrar_diario(ruta)
+
+
+def guardar_campanas(ruta, tubo, fechas):
+    """
+    Guarda en el archivo ruta las claves 'fechas' de tubo (campañas) sin reescribir el resto: en
+    binario se añaden sus segmentos y en JSON se anotan en el diario; ambos se compactan al crecer.
+    """
+    seleccion = {fecha: tubo[fecha] for fecha in fechas if fecha in tubo}
+    with _al_guardar(ruta, tubo, list(seleccion)):
+        if es_tubo_binario(ruta):
+            campanas, extras = _separar(seleccion)
+            agregar_campanas_binario(ruta, campanas, extras)
+            if necesita_compactar_binario(ruta):
+                compactar_tubo_binario(ruta)
+        elif not os.path.exists(ruta):
+            escribir_json_atomico(seleccion, ruta, indent=4)
+        else:
+            anotar_campanas(ruta, seleccion)
+            if necesita_compactar(ruta):
+                compactar_tubo_json(ruta)
+
+
+def convertir_tubo(origen, destino=None):
+    """
+    Convierte un tubo de JSON a binario o de binario a JSON (según el formato de origen).
+    Si no se indica destino, se usa el mismo nombre con la otra extensión. Devuelve la ruta destino.
+    """
+    binario = es_tubo_binario(origen)
+    if destino is None:
+        base = os.path.splitext(origen)[0]
+        destino = base + (".json" if binario else EXTENSION_BINARIA)
+
+    tubo = cargar_tubo(origen)
+    if binario:
+        escribir_json_atomico(tubo, destino, ensure_ascii=False, indent=4)
+        borrar_diario(destino)
+    else:
+        guardar_tubo_binario(tubo, destino)
+    return destino
+
+
+if __name__ == "__main__":
+    # python -m utils.tubo_binario <origen> [destino]
+    if len(sys.argv) not in (2, 3):
+        print("Uso: python -m utils.tubo_binario <origen.json|origen.tubo> [destino]")
+        sys.exit(1)
+    ruta_destino = convertir_tubo(*sys.argv[1:])
+    print(f"Tubo convertido: {sys.argv[1]} -> {ruta_destino}")
@@ -0,0 +1,306 @@
+# utils/umbrales_compilados.py
+
+import json
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.tubo_array import CLAVES_NO_CAMPANA, TuboArray
+
+# Umbrales de un tubo preparados para evaluar muchas campañas a la vez.
+# Las curvas de umbrales['deformadas'] se construyen una vez por tubo a partir de umbrales['valores']:
+# cotas ordenadas y valores del umbral en arrays. Para evaluar, cada curva se interpola con np.interp
+# en las cotas de todos los puntos de una matriz campañas x profundidades y se compara con desp_a o
+# desp_b (según el sufijo _a/_b de la deformada) en una sola operación por curva.
+# Las reglas son las de evaluar_umbrales: una curva se supera si algún punto queda por encima
+# (flanco_positivo) o por debajo (flanco_negativo) del umbral; las 'sin_flanco' nunca se superan (se
+# compilan para dibujarlas) y, de las superadas, vale la de mayor nivel (la primera en el orden de
+# deformadas si empatan).
+# Se cachean por el contenido de los umbrales, así que cambiar los umbrales genera curvas nuevas.
+# umbrales_en_rejilla remuestrea además las curvas una sola vez en la rejilla de índices del tubo
+# (TuboArray) y lo guarda con él: los gráficos de umbrales (umbrales_campana) y evaluar_tubo (si el
+# TuboArray ya está construido) sólo recortan esos arrays mientras no cambien ni el tubo ni sus umbrales.
+
+MAX_UMBRALES_EN_CACHE = 16
+_compilados = OrderedDict()
+
+SIGNO_FLANCO = {'flanco_positivo': 1.0, 'flanco_negativo': -1.0}
+
+# variables de calc que usa evaluar_tubo
+VARIABLES_EVALUACION = ('cota_abs', 'depth', 'desp_a', 'desp_b')
+
+
+def texto_alarma(nombre, nivel):
+    """Texto de alarma de evaluar_umbrales (lo que se guarda en campaign_info.alarm tras parse_alarm_val)."""
+    return f'Supera umbral "{nombre}", nivel: {nivel}'
+
+
+def _prioridad(nivel):
+    # nivel de una curva para elegir la superada de mayor nivel. Un nivel que no es un número (p. ej.
+    # null desde importar_umbrales) queda por debajo de todos los numéricos, pero por encima de -inf
+    # (curva no superada), así que sigue pudiendo ser la alarma si es la única superada
+    valor = _numero(nivel)
+    return valor if valor == valor else np.finfo(float).min
+
+
+class UmbralesCompilados:
+    """
+    Curvas de umbral de un tubo.
+
+    Atributos:
+        nombres (list): deformadas con algún punto, en el orden de deformadas.
+        niveles (list): nivel de cada curva, como está en los umbrales (aunque no sea un número).
+        ejes (list): 'a' o 'b', el desplazamiento con el que se compara cada curva.
+        signos (np.ndarray): +1 (flanco_positivo), -1 (flanco_negativo) o NaN (nunca se supera) por curva.
+        cotas (list): por curva, cotas_abs ordenadas (np.ndarray).
+        valores (list): por curva, valor del umbral en esas cotas (np.ndarray).
+
+    Se obtiene con UmbralesCompilados.de_umbrales(umbrales), que reutiliza las curvas mientras los
+    umbrales no cambien.
+    """
+
+    def __init__(self, umbrales):
+        self.nombres, self.niveles, self.ejes, signos, self.cotas, self.valores = [], [], [], [], [], []
+        prioridades = []
+        valores_umbral = umbrales.get('valores') or []
+        for nombre, info in (umbrales.get('deformadas') or {}).items():
+            puntos = [(v['cota_abs'], v[nombre]) for v in valores_umbral if nombre in v]
+            if not puntos:
+                continue
+            cotas = np.array([p[0] for p in puntos], dtype=float)
+            orden = np.argsort(cotas, kind='stable')
+            self.nombres.append(nombre)
+            self.niveles.append(info.get('nivel', 0))
+            self.ejes.append('a' if nombre.endswith('_a') else 'b')
+            signo = SIGNO_FLANCO.get(info.get('flanco'), np.nan)  # sin_flanco u otro: nunca se supera
+            signos.append(signo)
+            prioridades.append(_prioridad(info.get('nivel', 0)) if signo == signo else -np.inf)
+            self.cotas.append(cotas[orden])
+            self.valores.append(np.array([p[1] for p in puntos], dtype=float)[orden])
+        self.signos = np.array(signos, dtype=float)
+        self._prioridades = np.array(prioridades, dtype=float)
+
+    @classmethod
+    def de_umbrales(cls, umbrales):
+        """Devuelve las curvas de los umbrales, construyéndolas sólo si no están ya en caché."""
+        firma = json.dumps(umbrales, sort_keys=True, default=str)
+        compilados = _compilados.get(firma)
+        if compilados is None:
+            compilados = cls(umbrales)
+            _compilados[firma] = compilados
+            if len(_compilados) > MAX_UMBRALES_EN_CACHE:
+                _compilados.popitem(last=False)
+        else:
+            _compilados.move_to_end(firma)
+        return compilados
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def umbral_en(self, cotas):
+        """Valor de cada curva en las cotas dadas: array curvas x forma de cotas (NaN donde la cota es NaN)."""
+        cotas = np.asarray(cotas, dtype=float)
+        return np.stack([np.interp(cotas, xp, fp) for xp, fp in zip(self.cotas, self.valores)]) \
+            if self.nombres else np.empty((0,) + cotas.shape)
+
+    def en_cotas(self, cotas):
+        """Curvas en las cotas dadas: {deformada: np.ndarray con la forma de cotas}."""
+        return dict(zip(self.nombres, self.umbral_en(cotas)))
+
+    def evaluar(self, cotas, desp_a, desp_b, umbral=None):
+        """
+        Evalúa todas las curvas sobre una matriz campañas x profundidades.
+
+        Args:
+            cotas, desp_a, desp_b (array-like): campañas x profundidades (NaN donde no hay punto), en el
+                orden de los puntos de cada campaña.
+            umbral (np.ndarray, optional): valor de cada curva en esas cotas (curvas x campañas x
+                profundidades, o difundible a esa forma) si ya se tiene, p. ej. de umbrales_en_rejilla.
+
+        Returns:
+            dict de arrays por campaña:
+                "curva" (int): curva superada de mayor nivel (posición en nombres), -1 si ninguna.
+                "posicion" (int): primer punto (columna) en que se supera esa curva, -1 si ninguna.
+                "cota" (float): cota_abs de ese punto, NaN si ninguna.
+                "margen" (float): menor distancia al umbral de todas las curvas y puntos, en mm (negativa
+                    si se supera), NaN si no hay nada que evaluar.
+                "superadas" (bool): campañas x curvas, qué curvas supera cada campaña.
+        """
+        cotas = np.atleast_2d(np.asarray(cotas, dtype=float))
+        desp = {'a': np.atleast_2d(np.asarray(desp_a, dtype=float)),
+                'b': np.atleast_2d(np.asarray(desp_b, dtype=float))}
+        n_campanas = cotas.shape[0]
+        resultado = {"curva": np.full(n_campanas, -1, dtype=np.intp),
+                     "posicion": np.full(n_campanas, -1, dtype=np.intp),
+                     "cota": np.full(n_campanas, np.nan),
+                     "margen": np.full(n_campanas, np.nan),
+                     "superadas": np.zeros((n_campanas, len(self.nombres)), dtype=bool)}
+        if not self.nombres or cotas.size == 0:
+            return resultado
+
+        # margen[c, i, j] = distancia de la campaña i al umbral c en el punto j, positiva si no lo supera
+        if umbral is None:
+            umbral = self.umbral_en(cotas)
+        margen = np.stack([(umbral[c] - desp[eje]) * signo
+                           for c, (eje, signo) in enumerate(zip(self.ejes, self.signos))])
+        supera = margen < 0  # NaN (sin punto o sin flanco) no supera
+        supera_curva = supera.any(axis=2)  # curvas x campañas
+
+        # de las superadas, la de mayor nivel (np.argmax devuelve la primera si empatan)
+        nivel_superado = np.where(supera_curva, self._prioridades[:, None], -np.inf)
+        curva = np.argmax(nivel_superado, axis=0)
+        alguna = supera_curva.any(axis=0)
+        filas = np.arange(n_campanas)
+        posicion = np.argmax(supera[curva, filas], axis=1)
+
+        resultado["superadas"] = supera_curva.T
+        resultado["curva"] = np.where(alguna, curva, -1)
+        resultado["posicion"] = np.where(alguna, posicion, -1)
+        resultado["cota"] = np.where(alguna, cotas[filas, posicion], np.nan)
+        con_margen = ~np.isnan(margen).all(axis=(0, 2))
+        resultado["margen"][con_margen] = np.nanmin(margen[:, con_margen], axis=(0, 2))
+        return resultado
+
+    def alarma(self, curva):
+        """Texto de alarma de una curva superada (resultado["curva"]), o None si es -1."""
+        return texto_alarma(self.nombres[curva], self.niveles[curva]) if curva >= 0 else None
+
+
+def umbrales_en_rejilla(tubo):
+    """
+    Curvas de umbral del tubo remuestreadas en su rejilla de índices (TuboArray.indices). Se calculan
+    una vez y se guardan con el TuboArray del tubo, así que se reutilizan mientras no cambien ni sus
+    campañas ni sus umbrales.
+
+    Returns:
+        dict: {"compilados", "cotas", "valores", "uniforme"}. cotas es la cota_abs de cada índice (la de
+        la primera campaña que lo tiene), valores el array curvas x índices de los umbrales en esas cotas
+        y uniforme, por campaña del TuboArray, si sus cotas son las de la rejilla (si no, sus umbrales se
+        interpolan en sus propias cotas).
+    """
+    compilados = UmbralesCompilados.de_umbrales(tubo.get('umbrales') or {})
+    tubo_array = TuboArray.de_tubo(tubo)
+    rejilla = tubo_array.derivados.get(('umbrales', compilados))
+    if rejilla is None and len(tubo_array) == 0:
+        # tubo sin campañas (p. ej. una plantilla con umbrales): rejilla vacía
+        rejilla = {"compilados": compilados,
+                   "cotas": np.empty(0),
+                   "valores": np.empty((len(compilados), 0)),
+                   "uniforme": np.empty(0, dtype=bool)}
+        tubo_array.derivados[('umbrales', compilados)] = rejilla
+    elif rejilla is None:
+        cotas = tubo_array.perfiles(tubo_array.fechas, 'cota_abs')
+        con_cota = ~np.isnan(cotas)
+        cotas_rejilla = cotas[np.argmax(con_cota, axis=0), np.arange(cotas.shape[1])]
+        rejilla = {"compilados": compilados,
+                   "cotas": cotas_rejilla,
+                   "valores": compilados.umbral_en(cotas_rejilla),
+                   "uniforme": np.all(~con_cota | (cotas == cotas_rejilla), axis=1)}
+        tubo_array.derivados[('umbrales', compilados)] = rejilla
+    return rejilla
+
+
+def umbrales_campana(tubo, fecha):
+    """
+    Curvas de umbral en los puntos de calc de la campaña fecha, para dibujarlas sobre su index o depth.
+
+    Returns:
+        dict: {deformada: np.ndarray} en el orden de los puntos (NaN donde el punto no tiene cota_abs);
+        vacío si la campaña no tiene calc.
+    """
+    rejilla = umbrales_en_rejilla(tubo)
+    compilados = rejilla["compilados"]
+    tubo_array = TuboArray.de_tubo(tubo)
+    if not tubo_array.tiene_bloque(fecha):
+        return {}
+    if tubo_array.en_rejilla(fecha) and rejilla["uniforme"][tubo_array.posicion(fecha)]:
+        forma = (len(tubo_array), len(tubo_array.indices))
+        return {nombre: tubo_array.perfil_matriz(fecha, np.broadcast_to(valores, forma))
+                for nombre, valores in zip(compilados.nombres, rejilla["valores"])}
+    return compilados.en_cotas(tubo_array.perfil(fecha, 'cota_abs'))
+
+
+def _numero(valor):
+    return float(valor) if isinstance(valor, (int, float)) and not isinstance(valor, bool) else np.nan
+
+
+def _matrices_calc(tubo, fechas):
+    # matrices campañas x puntos de calc (en su orden, NaN donde falta el punto o el valor) de las
+    # variables de evaluar_tubo, leídas directamente del JSON
+    calcs = []
+    for fecha in fechas:
+        calc = tubo[fecha].get('calc') if isinstance(tubo.get(fecha), dict) else None
+        calcs.append([p for p in calc if isinstance(p, dict)] if isinstance(calc, list) else [])
+    n_puntos = max((len(puntos) for puntos in calcs), default=0)
+    matrices = {variable: np.full((len(fechas), n_puntos), np.nan) for variable in VARIABLES_EVALUACION}
+    for i, puntos in enumerate(calcs):
+        for variable, matriz in matrices.items():
+            matriz[i, :len(puntos)] = [_numero(p.get(variable)) for p in puntos]
+    return matrices
+
+
+def evaluar_tubo(tubo, fechas=None):
+    """
+    Evalúa los umbrales del tubo en varias campañas a la vez.
+
+    Si el tubo ya tiene su TuboArray construido (p. ej. el de la página graficar) se usan sus arrays y
+    los umbrales remuestreados en la rejilla; si no (un dict recién leído o deserializado), las
+    campañas se apilan directamente desde sus calc, sin construir el TuboArray.
+
+    Args:
+        tubo (dict): tubo en el esquema JSON, con 'umbrales'.
+        fechas (list): campañas a evaluar (por defecto todas las que tienen calc).
+
+    Returns:
+        dict: {fecha: {"alarma", "umbral", "nivel", "cota", "depth", "margen", "superadas"}}. alarma es el
+        texto de evaluar_umbrales (None si no se supera ninguna curva), umbral y nivel los de la curva
+        superada, cota/depth el primer punto en que se supera y superadas todas las curvas superadas.
+    """
+    compilados = UmbralesCompilados.de_umbrales(tubo.get('umbrales') or {})
+    tubo_array = TuboArray.en_cache(tubo)
+    if tubo_array is None:
+        if fechas is None:
+            fechas = [clave for clave, valor in tubo.items()
+                      if isinstance(valor, dict) and clave not in CLAVES_NO_CAMPANA and valor.get('calc')]
+        fechas = list(fechas)
+        grupos = [(fechas, _matrices_calc(tubo, fechas), None)]
+    else:
+        if len(tubo_array) == 0:
+            return {}
+        rejilla = umbrales_en_rejilla(tubo)
+        if fechas is None:
+            fechas = [fecha for fecha in tubo_array.fechas if tubo_array.tiene_bloque(fecha)]
+        fechas = list(fechas)
+
+        # las campañas en la rejilla de índices se evalúan juntas (matrices campañas x índices), con los
+        # umbrales ya remuestreados si sus cotas son las de la rejilla; las que se conservan tal cual en
+        # el TuboArray, una a una desde su calc
+        en_rejilla = [fecha for fecha in fechas if tubo_array.en_rejilla(fecha)]
+        uniformes = [fecha for fecha in en_rejilla if rejilla["uniforme"][tubo_array.posicion(fecha)]]
+        otras = [fecha for fecha in en_rejilla if not rejilla["uniforme"][tubo_array.posicion(fecha)]]
+        grupos = [(uniformes, {variable: tubo_array.perfiles(uniformes, variable) for variable in VARIABLES_EVALUACION},
+                   rejilla["valores"][:, None, :]),
+                  (otras, {variable: tubo_array.perfiles(otras, variable) for variable in VARIABLES_EVALUACION}, None)]
+        grupos += [([fecha], _matrices_calc(tubo, [fecha]), None) for fecha in fechas
+                   if not tubo_array.en_rejilla(fecha)]
+
+    resultados = {}
+    for fechas_grupo, valores, umbral in grupos:
+        if not fechas_grupo:
+            continue
+        evaluacion = compilados.evaluar(valores['cota_abs'], valores['desp_a'], valores['desp_b'], umbral)
+        for k, fecha in enumerate(fechas_grupo):
+            curva = int(evaluacion["curva"][k])
+            posicion = int(evaluacion["posicion"][k])
+            margen = float(evaluacion["margen"][k])
+            resultados[fecha] = {
+                "alarma": compilados.alarma(curva),
+                "umbral": compilados.nombres[curva] if curva >= 0 else None,
+                "nivel": compilados.niveles[curva] if curva >= 0 else None,
+                "cota": float(valores['cota_abs'][k, posicion]) if curva >= 0 else None,
+                "depth": float(valores['depth'][k, posicion]) if curva >= 0 else None,
+                "margen": margen if margen == margen else None,
+                "superadas": [nombre for nombre, superada in zip(compilados.nombres, evaluacion["superadas"][k])
+                              if superada],
+            }
+    return {fecha: resultados[fecha] for fecha in fechas}